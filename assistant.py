@@ -1,4 +1,6 @@
 import os
+import queue
+import re
 import string
 import time
 
@@ -6,9 +8,16 @@ import markdown
 from bs4 import BeautifulSoup
 from colorama import Fore, Style
 
-from brain import get_assistant_model, get_response, greet_me
-from stt import stt
-from tts import tts
+import browser_pool
+from brain import get_assistant_model, get_response, get_response_events, greet_me
+from clients import warm_clients
+from config import PRELOAD_BROWSER, PRELOAD_TOOLS, WARM_CLIENTS_ON_STARTUP
+from streaming import SentenceSplitter
+from tool_registry import registry
+from tracing import tracer
+
+# Answers that are commands to the assistant, they are not spoken
+CONTROL_PATTERN = re.compile(r"CLEAR|SHUTDOWN|STOPPED|MODE:(VOICE|TEXT)")
 
 # Convert Markdown to plain text using BeautifulSoup
 def markdown_to_plaintext(md_text):
@@ -25,6 +34,36 @@ def play_audio_file(file_path):
         f"ffplay -nodisp -autoexit -hide_banner -loglevel panic -i {file_path} -volume 200"
     )
 
+# Speak a response, its TTS marks go to the turn it answers
+def speak_turn(speaker, text):
+    """
+    Speak a text, or the sentences of an iterable as they arrive.
+    Playback runs on its own thread and may start after the next turn is traced,
+    so the callbacks mark the turn that was current when speaking started.
+    """
+    trace = tracer.current()
+    if trace is None:
+        speaker.speak(text)
+        return
+
+    speaker.speak(
+        text,
+        on_first_byte=lambda: tracer.mark_once("tts_first_byte", trace=trace),
+        on_audio_start=lambda: tracer.audio_started(trace),
+    )
+
+# Print the fields of a response besides the spoken answer
+def print_fields(fields: dict):
+    for field, value in fields.items():
+        if not value:
+            continue
+        print(f"\n{field.capitalize()}:\n---")
+        if isinstance(value, list):
+            for item in value:
+                print(f"- {item}")
+        else:
+            print(value)
+
 if __name__ == "__main__":
     os.system("cls")
 
@@ -38,16 +77,26 @@ if __name__ == "__main__":
     INPUT_MODE = "VOICE"
     OUTPUT_MODE = "VOICE"
 
+    # Open the LLM connection pools while the audio stack loads
+    if WARM_CLIENTS_ON_STARTUP:
+        warm_clients()
+    if PRELOAD_TOOLS:
+        registry.preload()
+    if PRELOAD_BROWSER:
+        browser_pool.pool.preload()
+
     speaker = None
     if OUTPUT_MODE == "VOICE":
         # Initialize the speaker
         print(Fore.LIGHTYELLOW_EX + "Initializing TTS...", flush=True)
+        from tts import tts
         speaker = tts(**assistant["tts_config"])
 
     recorder = None
     if INPUT_MODE == "VOICE":
         # Initialize the recorder
         print(Fore.LIGHTYELLOW_EX + "Initializing STT...", flush=True)
+        from stt import stt
         recorder = stt(
             model="medium.en",
             language="en",
@@ -62,9 +111,15 @@ if __name__ == "__main__":
                 play_audio_file(on_sound),
                 # print(Fore.RED + "\n" + "VAD started 👂", flush=True),
             ),
-            # on_vad_detect_stop=lambda: (
-            #     print(Fore.RED + "\n" + "VAD stopped 🛑", flush=True)
-            # ),
+            on_wakeword_detected=lambda: (
+                # The previous turn is written now if its audio never started
+                tracer.end_pending(),
+                tracer.mark("wake_word"),
+            ),
+            on_vad_detect_stop=lambda: (
+                tracer.mark("vad_end"),
+                # print(Fore.RED + "\n" + "VAD stopped 🛑", flush=True)
+            ),
             # on_recording_start=lambda: (
             #     print(Fore.LIGHTBLUE_EX + "\n" + "Listening 🎤", flush=True)
             # ),
@@ -88,17 +143,25 @@ if __name__ == "__main__":
 
     try:
         while True:
+            # The previous turn is written once its audio starts, or at the next wake word or input
+            tracer.await_audio()
             if INPUT_MODE == "VOICE" and recorder:
                 command = ""
+                # The turn starts here, its spans are timed from the wake word on
+                tracer.start_turn(input="voice")
                 try:
                     command = recorder.text()
                 except Exception as e:
                     print(Fore.RED + f"Error: {e}")
                     continue
+                tracer.mark("transcription")
                 print(Fore.LIGHTGREEN_EX + "User: ", end="", flush=True)
                 print(f"{command}\n", flush=True)
             else:
                 command = input("User: ")
+                tracer.end_pending()
+                tracer.start_turn(input="text")
+                tracer.mark("input")
 
             if command:
                 if OUTPUT_MODE == "VOICE" and speaker:
@@ -127,12 +190,15 @@ if __name__ == "__main__":
                         }
                     ]
                     closing_response = ""
-                    for text in get_response(conversation=conversation):
+                    for text in get_response(conversation=conversation, assistant_name=assistant_name):
+                        print(text, end="", flush=True)
                         closing_response += text
                     print()
 
                     if OUTPUT_MODE == "VOICE" and speaker:
-                        speaker.speak(closing_response)
+                        speak_turn(speaker, closing_response)
+                    tracer.end_turn()
+                    tracer.end_pending()
                     if speaker:
                         speaker.shutdown()
                     if recorder:
@@ -142,15 +208,33 @@ if __name__ == "__main__":
 
                 print(Fore.CYAN + assistant_name + ": ", flush=True)
                 full_response = ""
-                stream = ""
+                fields = {}
+                # Complete sentences are spoken while the rest of the answer is generated
+                sentences = None
+                if OUTPUT_MODE == "VOICE" and speaker:
+                    sentences = queue.Queue()
+                    speak_turn(speaker, iter(sentences.get, None))
+                splitter = SentenceSplitter()
                 try:
-                    stream = get_response(conversation=conversation)
+                    for field, value in get_response_events(conversation=conversation, assistant_name=assistant_name):
+                        if field != "assistant_response":
+                            fields[field] = value
+                            continue
+                        print(value, end="", flush=True)
+                        full_response += value
+                        if sentences is not None and not CONTROL_PATTERN.search(full_response):
+                            for sentence in splitter.feed(value):
+                                sentences.put(markdown_to_plaintext(sentence))
+                    print()
+                    if sentences is not None and not CONTROL_PATTERN.search(full_response) and (rest := splitter.flush()):
+                        sentences.put(markdown_to_plaintext(rest))
                 except Exception as e:
                     print(Fore.RED + f"Error: {e}")
                     continue
-
-                for text in stream:
-                    full_response += text
+                finally:
+                    if sentences is not None:
+                        sentences.put(None)
+                print_fields(fields)
                 full_response = markdown_to_plaintext(full_response)
 
                 if "CLEAR" in full_response:
@@ -165,12 +249,15 @@ if __name__ == "__main__":
                         }
                     ]
                     closing_response = ""
-                    for text in get_response(conversation=conversation):
+                    for text in get_response(conversation=conversation, assistant_name=assistant_name):
+                        print(text, end="", flush=True)
                         closing_response += text
                     print()
 
                     if OUTPUT_MODE == "VOICE" and speaker:
-                        speaker.speak(closing_response)
+                        speak_turn(speaker, closing_response)
+                    tracer.end_turn()
+                    tracer.end_pending()
                     if speaker:
                         speaker.shutdown()
                     if recorder:
@@ -182,23 +269,24 @@ if __name__ == "__main__":
                     if "MODE:VOICE" in full_response:
                         OUTPUT_MODE = "VOICE"
                         if not speaker:
+                            from tts import tts
                             speaker = tts(**assistant["tts_config"])
-                        speaker.speak("Voice mode activated.")
+                        speak_turn(speaker, "Voice mode activated.")
                         continue
                     elif "MODE:TEXT" in full_response:
                         OUTPUT_MODE = "TEXT"
                         continue
-                    if OUTPUT_MODE == "VOICE" and speaker:
-                        speaker.speak(full_response)
                     if str(full_response).endswith("?"):
                         while speaker.is_playing:
                             time.sleep(0.5)
                         if INPUT_MODE == "VOICE" and recorder:
                             recorder.start()
             else:
-                speaker.speak(f"Not {assistant_name} - Ignoring")
+                speak_turn(speaker, f"Not {assistant_name} - Ignoring")
 
     except KeyboardInterrupt:
+        tracer.end_turn()
+        tracer.end_pending()
         os.system("cls")
         if speaker:
             speaker.shutdown()
@@ -0,0 +1,124 @@
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from config import *
+
+# Turns of the benchmark conversation, covering chat, routing and tool use
+DEFAULT_PROMPTS = [
+    "Hello there!",
+    "What is the difference between a list and a tuple in Python?",
+    "What's the weather like in London?",
+    "Search the web for the latest Python release and summarise what's new.",
+    "Thanks, that's all.",
+]
+
+
+def percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def print_summary(name: str, values: list[float]):
+    print(f"{name:<14} p50: {percentile(values, 50) * 1000:9.1f}ms  p95: {percentile(values, 95) * 1000:9.1f}ms  mean: {statistics.mean(values) * 1000:9.1f}ms")
+
+
+# Time brain turns against a cassette
+def bench_turns(args):
+    """
+    Time full brain.get_response turns. Record a cassette once against the live providers, then
+    replay it offline: with zero latency the measured time is the assistant's own overhead.
+    """
+    from cassette import cassette
+
+    cassette.use(args.mode, args.cassette, args.latency)
+    # The router audits a random sample of its decisions, the sample has to be the same in every run
+    random.seed(0)
+    import brain
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts, mode="r", encoding="utf-8") as file:
+            prompts = [line.strip() for line in file if line.strip()]
+
+    first_text, complete = [], []
+    for run in range(args.runs):
+        conversation = []
+        for prompt in prompts:
+            conversation.append({"role": "user", "content": prompt})
+            output = io.StringIO()
+            started = time.perf_counter()
+            first = None
+            with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+                for text in brain.get_response(conversation, stream=not args.no_stream):
+                    first = first or time.perf_counter()
+                    output.write(text)
+            finished = time.perf_counter()
+            first_text.append((first or finished) - started)
+            complete.append(finished - started)
+            print(f"[run {run + 1}] {complete[-1] * 1000:8.1f}ms  {prompt[:50]!r} -> {output.getvalue()[:60]!r}")
+
+    print()
+    print(f"Cassette: {args.cassette} ({args.mode}, {args.latency} latency), {len(complete)} turns")
+    print_summary("first text", first_text)
+    print_summary("complete", complete)
+
+
+# Time the cold start of a module
+def bench_startup(args):
+    """
+    Time importing a module in fresh interpreters, e.g. brain for the text REPL,
+    and list the imports that took the longest in the last run.
+    """
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.module}"], capture_output=True, text=True)
+        timings.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            print(result.stderr.strip().splitlines()[-1])
+            return
+
+    # Lines of -X importtime are "import time: self [us] | cumulative | imported package"
+    imports = []
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports.append((int(fields[1]), fields[2].rstrip()))
+
+    print(f"Cold start of 'import {args.module}', {args.runs} runs")
+    print_summary("startup", timings)
+    print(f"\nSlowest imports (cumulative):")
+    for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:9.1f}ms {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the assistant.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    turns = commands.add_parser("turns", help="Time brain.get_response turns against a recorded cassette.")
+    turns.add_argument("--mode", choices=["record", "replay", "off"], default="replay", help="Record the cassette against the live providers, or replay it.")
+    turns.add_argument("--cassette", default=CASSETTE_PATH, help="The cassette file.")
+    turns.add_argument("--latency", choices=["recorded", "zero"], default="zero", help="Replay with the recorded latencies, or none.")
+    turns.add_argument("--prompts", help="A file with one prompt per line, replacing the default conversation.")
+    turns.add_argument("--runs", type=int, default=3, help="Number of times the conversation is replayed.")
+    turns.add_argument("--no-stream", action="store_true", help="Request complete answers instead of streams.")
+    turns.add_argument("--verbose", action="store_true", help="Show the assistant's output.")
+    turns.set_defaults(run=bench_turns)
+
+    startup = commands.add_parser("startup", help="Time the import of a module in fresh interpreters.")
+    startup.add_argument("--module", default="brain", help="The module to import, brain for the text REPL.")
+    startup.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters to time.")
+    startup.add_argument("--top", type=int, default=15, help="Number of slowest imports to list.")
+    startup.set_defaults(run=bench_startup)
+
+    args = parser.parse_args()
+    args.run(args)
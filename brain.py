@@ -1,26 +1,53 @@
+import asyncio
+import concurrent.futures
+import contextvars
 import json
-from typing import Dict
+import queue
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict
 
-from openai import OpenAI
 from pydantic import BaseModel, Field
 
+import browser_pool
+import context
+import provider_router
+import response_cache
 import systemMsgs as sysmsg
+import tool_router
+from cascade import cascade, fast_messages, parse_confidence
+from clients import auto_tool_choice, warm_clients
 from config import *
-from tools import getCurrentDateTime, tools_dict, tools_list
+from streaming import AgentResponseStream, parse_agent_response
+from tool_output import cap_tool_output
+from tool_registry import registry
+from tool_schemas import tools_list
+from tracing import tracer
+from utils import getCurrentDateTime
 
+# Shared pool for running tool calls
+tool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+
+# Build the messages for a request
+def build_messages(system_prompt: Dict[str, str], conversation: list[Dict[str, str]]) -> list[Dict[str, str]]:
+    """
+    Put the system prompt in front of the conversation. The system prompt and the tool schemas
+    are the same on every request, so providers can reuse their cached prefix.
+    """
+    return [system_prompt] + context.manager.fit(conversation)
 
 # Greeting function
 def greet_me(name: str = "User", assistant_name: str = ASSISTANT_NAME):
-    global ASSISTANT_NAME
-    ASSISTANT_NAME = assistant_name
     greetings = [{
         "role": "user",
         "content": f"You are {assistant_name}, greet {name}. {name} is your requester and will be interacting with you. Provide a very-short but a warm greeting to initiate the conversation. The current date and time is {getCurrentDateTime()}."
     }]
 
-    client = OpenAI(base_url=GENERAL_BASE_URL, api_key=GENERAL_API_KEY)
-    response = client.chat.completions.create(
-        model=GENERAL_MODEL,
+    response = provider_router.router.chat(
+        "general",
         messages=greetings,      # type: ignore
         stream=True
     )
@@ -28,16 +55,17 @@ def greet_me(name: str = "User", assistant_name: str = ASSISTANT_NAME):
         if text := chunk.choices[0].delta.content:
             yield text
 
-# Function to check if search is required or not
-def toolRequired(conversation: list[Dict[str, str]]):
-    
-    client = OpenAI(base_url=DECISION_BASE_URL, api_key=DECISION_API_KEY)
-    response = client.chat.completions.create(
-        model=DECISION_MODEL,
-        messages=conversation + [sysmsg.tool_use_check_system_prompt.copy()],
+# Ask the decision model if a tool is required
+def llmToolRequired(conversation: list[Dict[str, str]]) -> bool:
+    response = provider_router.router.chat(
+        "decision",
+        messages=build_messages(sysmsg.tool_use_check_system_prompt.copy(), conversation),
         response_format={"type": "json_object"},
     ).choices[0].message.content
+    return parseDecision(response)
 
+# Parse the decision model's response
+def parseDecision(response: str | None) -> bool:
     try:
         content = sysmsg.Decision.model_validate_json(response)
     except Exception as e:
@@ -47,177 +75,1022 @@ def toolRequired(conversation: list[Dict[str, str]]):
     if content.decision:
         decision = content.decision
 
-    if str(decision).lower() == "true":
+    return str(decision).lower() == "true"
+
+# Compare a confident local decision against the decision model
+def auditRoute(conversation: list[Dict[str, str]], route):
+    try:
+        tool_router.router.log(conversation, route, llmToolRequired(conversation))
+    except Exception as e:
+        print(f"Error auditing the router decision: {e}")
+
+# Decide locally if a tool is required, None if the router is unsure
+def localToolRequired(conversation: list[Dict[str, str]]):
+    if not LOCAL_ROUTER:
+        return None
+    route = tool_router.router.route(conversation)
+    if route.confidence < ROUTER_CONFIDENCE_THRESHOLD:
+        return route
+
+    print(f"Routed locally ({route.reason}, confidence {route.confidence:.2f})")
+    if random.random() < ROUTER_AUDIT_RATE:
+        threading.Thread(target=auditRoute, args=(list(conversation), route), daemon=True).start()
+    else:
+        tool_router.router.log(conversation, route)
+    return route.decision
+
+# Decide locally in single pass mode, None leaves the decision to the tool model
+def singlePassToolRequired(conversation: list[Dict[str, str]]) -> bool | None:
+    decision = localToolRequired(conversation)
+    return decision if isinstance(decision, bool) else None
+
+# Function to check if search is required or not
+def toolRequired(conversation: list[Dict[str, str]]):
+    decision = localToolRequired(conversation)
+    if not isinstance(decision, bool):
+        route = decision
+        with tracer.span("decision"):
+            decision = llmToolRequired(conversation)
+        if route is not None:
+            tool_router.router.log(conversation, route, decision)
+
+    if decision:
         print("Using tools...")
         return True
     else:
         print("Not using tools...")
         return False
 
+# Select the tool schemas to offer for the current turn
+def selectTools(conversation: list[Dict[str, str]]) -> list[dict]:
+    if TOOL_SUBSET_SELECTION:
+        return tool_router.router.select_tools(conversation)
+    return tools_list
+
+# Step and time budget of the agent loop
+class AgentSteps:
+    """
+    Iterates over the steps of the agent loop, shared by toolResults and tool_results_async.
+    The loop ends once the model stops calling tools, or the step/time budget runs out.
+    """
+
+    def __init__(self, conversation: list[Dict[str, str]]):
+        self.conversation = conversation
+        self.started = time.monotonic()
+        self.step_times: list[float] = []
+        self.step = 0
+        self._step_started = self.started
+        self._stopped = False
+
+    def __iter__(self):
+        for self.step in range(1, AGENT_MAX_STEPS + 1):
+            self._step_started = time.monotonic()
+            yield self.step
+            if self._stopped:
+                break
+        else:
+            print(f"Agent stopped after the maximum of {AGENT_MAX_STEPS} steps")
+        print(f"Agent finished in {time.monotonic() - self.started:.2f}s over {len(self.step_times)} steps")
+
+    @property
+    def tool_choice(self) -> str:
+        # Later steps may stop calling tools once the task is complete
+        return "required" if self.step == 1 else "auto"
+
+    def done(self, message):
+        """
+        Finish a step, after the tool calls of its message were run.
+        """
+        if not message.tool_calls and self.step == 1:
+            print("No tool calls found in response")
+            self.conversation.append({
+                "role": "user",
+                "content": str(message.content)
+            })
+
+        self.step_times.append(time.monotonic() - self._step_started)
+        print(f"Agent step {self.step} took {self.step_times[-1]:.2f}s")
+
+        if not message.tool_calls:
+            self._stopped = True
+        elif time.monotonic() - self.started >= AGENT_TIME_BUDGET:
+            print(f"Agent time budget of {AGENT_TIME_BUDGET}s used up after {self.step} steps")
+            self._stopped = True
+
 # Function to get tool results
 def toolResults(conversation: list[Dict[str, str]]):
-    global ASSISTANT_NAME
+    """
+    Run the tool model in a loop, feeding the tool results back until it stops requesting tools
+    or the step/time budget runs out.
+
+    Args:
+        conversation (list): The conversation history, the tool calls and their results are added to it.
+
+    Returns:
+        list: The duration of every step in seconds.
+    """
     system_prompt = sysmsg.tool_use_results_system_prompt.copy()
 
-    client = OpenAI(base_url=TOOL_BASE_URL, api_key=TOOL_API_KEY)
-    message = client.chat.completions.create(
-        model=TOOL_MODEL,
-        messages=conversation + [system_prompt], # type: ignore
-        tools=tools_list, # type: ignore
-        tool_choice="required",
-        # parallel_tool_calls=False,
-    ).choices[0].message
-
-    # conversation.append(message)
-
-    if hasattr(message, 'tool_calls') and message.tool_calls:
-        # There may be multiple tool calls in the response
-        for tool in message.tool_calls:
-            # Ensure the function is available, and then call it
-            if function_to_call := tools_dict.get(tool.function.name):
-                print('Function:', tool.function.name)
-                arguments = json.loads(tool.function.arguments)
-                print('Arguments:', arguments)
-
-                tool_response = function_to_call(**arguments)
-                print(f'Function Output: \n---\n{tool_response}\n---')
-
-                # conversation.append({
-                #     "role": "user",
-                #     "content" : f"Tool: {tool.function.name}"
-                #                 f"Arguments: {tool.function.arguments}"
-                #                 f"content: {tool_response}"
-                # })
-
-                conversation.append({
-                    "role": "tool",
-                    "tool_call_id": tool.id,
-                    "content" : f"{tool_response}",
-                })
+    steps = AgentSteps(conversation)
+    for _ in steps:
+        message = provider_router.router.chat(
+            "tool",
+            messages=build_messages(system_prompt, conversation), # type: ignore
+            tools=selectTools(conversation), # type: ignore
+            tool_choice=steps.tool_choice,
+            # parallel_tool_calls=False,
+        ).choices[0].message
 
-            else:
-                print('Function', tool.function.name, 'not found')
-                tool_response += f"Function: {tool.function.name} not found\n"
-                conversation.append({
-                    "role": "user",
-                    "content": tool_response
-                })
-    else:
-        print("No tool calls found in response")
-        conversation.append({
-            "role": "user",
-            "content": str(message.content)
-        })
+        if message.tool_calls:
+            conversation.append(toolCallsMessage(message.tool_calls, message.content))
+            runToolCalls(conversation, message.tool_calls)
+        steps.done(message)
+    return steps.step_times
+
+# Assistant message recording the requested tool calls
+def toolCallsMessage(tool_calls: list, content: str | None = None) -> dict:
+    return {
+        "role": "assistant",
+        "content": content or "",
+        "tool_calls": [
+            {
+                "id": tool.id,
+                "type": "function",
+                "function": {"name": tool.function.name, "arguments": tool.function.arguments or "{}"},
+            }
+            for tool in tool_calls
+        ],
+    }
 
-# Get responses from ollama
-def get_response(conversation: list[Dict[str, str]]):
+# Turn a tool output into the text of its tool message
+def formatToolOutput(tool_response) -> str:
+    if isinstance(tool_response, list):
+        return "\n\n".join(f"{item}" for item in tool_response)
+    return f"{tool_response}"
+
+# Shorten a tool output to its cap, keeping what is relevant to the request
+def capToolOutput(conversation: list[Dict[str, str]], tool, tool_response: str) -> str:
+    query = f"{tool_router.last_user_message(conversation)} {tool.function.arguments or ''}"
+    return cap_tool_output(tool.function.name, tool_response, query)
+
+# Run a single tool call
+def runToolCall(tool) -> str:
+    function_to_call = registry[tool.function.name]
+    arguments = json.loads(tool.function.arguments or "{}")
+    print('Function:', tool.function.name)
+    print('Arguments:', arguments)
+
+    with tracer.span(f"tool:{tool.function.name}"):
+        tool_response = function_to_call(**arguments)
+    print(f'Function Output ({tool.function.name}): \n---\n{tool_response}\n---')
+    return formatToolOutput(tool_response)
+
+# Run the requested tool calls
+def runToolCalls(conversation: list[Dict[str, str]], tool_calls: list):
     """
-    Get a response from the chat model using tool calling.
+    Run the requested tool calls concurrently, each with its own timeout.
+    The results are added to the conversation in the order the calls were requested.
+    A call that times out keeps its tool_executor worker until the tool returns, threads cannot be stopped,
+    so a hanging tool holds one of the TOOL_MAX_WORKERS workers for later calls.
+    """
+    # There may be multiple tool calls in the response, start all of them before waiting on any.
+    # They are matched by position, streamed tool calls may come without ids.
+    futures = []
+    for tool in tool_calls:
+        # Ensure the function is available, and then call it
+        if tool.function.name in registry:
+            timeout = TOOL_TIMEOUTS.get(tool.function.name, TOOL_TIMEOUT)
+            futures.append((tool_executor.submit(contextvars.copy_context().run, runToolCall, tool), time.monotonic() + timeout))
+        else:
+            futures.append(None)
+
+    for tool, submitted in zip(tool_calls, futures):
+        if submitted is not None:
+            future, deadline = submitted
+            try:
+                tool_response = future.result(timeout=max(0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                # A call still queued behind busy workers never starts
+                future.cancel()
+                print(f"Function {tool.function.name} timed out")
+                tool_response = f"Function: {tool.function.name} timed out."
+            except Exception as e:
+                print(f"Error in {tool.function.name}: {e}")
+                tool_response = f"Function: {tool.function.name} failed with error: {e}"
+
+            # conversation.append({
+            #     "role": "user",
+            #     "content" : f"Tool: {tool.function.name}"
+            #                 f"Arguments: {tool.function.arguments}"
+            #                 f"content: {tool_response}"
+            # })
+
+            conversation.append({
+                "role": "tool",
+                "tool_call_id": tool.id,
+                "content" : capToolOutput(conversation, tool, tool_response),
+            })
+
+        else:
+            print('Function', tool.function.name, 'not found')
+            conversation.append({
+                "role": "tool",
+                "tool_call_id": tool.id,
+                "content": f"Function: {tool.function.name} not found\n",
+            })
+
+# Merge the tool call fragments of a streamed chunk
+def mergeToolCallDeltas(tool_calls: dict[int, SimpleNamespace], delta):
+    for call in delta.tool_calls or []:
+        tool = tool_calls.setdefault(call.index, SimpleNamespace(id="", function=SimpleNamespace(name="", arguments="")))
+        tool.id = call.id or tool.id
+        if call.function:
+            tool.function.name += call.function.name or ""
+            tool.function.arguments += call.function.arguments or ""
+
+class ToolAutoAnswer:
+    """
+    Collects a tool_choice="auto" response, which is either a direct answer or tool calls.
+
+    The model may write some text before its tool calls, e.g. "Let me look that up", which must not be
+    shown as the answer. The answer events are therefore held back until the response finishes without tool calls.
+    """
+
+    def __init__(self):
+        self.parser = AgentResponseStream()
+        self.calls: dict[int, SimpleNamespace] = {}
+        self.held: list[tuple[str, Any]] = []
+
+    @property
+    def tool_calls(self) -> list:
+        return [self.calls[index] for index in sorted(self.calls)]
+
+    def feed_chunk(self, chunk) -> list[tuple[str, Any]]:
+        """
+        Feed a streamed chunk, returns the answer events released by it.
+        """
+        if not chunk.choices:
+            return []
+        choice = chunk.choices[0]
+        mergeToolCallDeltas(self.calls, choice.delta)
+        if choice.delta.content and not self.calls:
+            self.held += [(field, value) for field, value in self.parser.feed(choice.delta.content) if value]
+        return self.release() if choice.finish_reason else []
+
+    def release(self) -> list[tuple[str, Any]]:
+        """
+        Get the held back answer events, none if the model called tools.
+        """
+        events, self.held = ([] if self.calls else self.held), []
+        return events
+
+    def feed_message(self, message) -> list[tuple[str, Any]]:
+        """
+        Feed a complete message, returns its answer events.
+        """
+        for index, call in enumerate(message.tool_calls or []):
+            self.calls[index] = call
+        if not message.content or self.calls:
+            return []
+        return [(field, value) for field, value in self.parser.feed(message.content) if value]
+
+    def result(self) -> sysmsg.AgentResponse:
+        return self.parser.result()
+
+# Single pass: let the tool model either answer directly or call tools
+def toolAuto(conversation: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, assistant_name: str = ASSISTANT_NAME):
+    """
+    Send one tool_choice="auto" request, which replaces the decision and the tool selection calls.
+    A direct answer is yielded as (field, value) events, tool calls are run and their results added to the conversation.
 
     Args:
         conversation (list): The conversation history.
-        tools (list): list of available tools.
-        model (str): The model to use for chatting.
-        system_prompt (str): System prompt to guide the assistant.
+        stream (bool): Stream a direct answer as it is generated.
 
     Returns:
-        str: The final response from the chat model.
+        AgentResponse | None: The direct answer, or None if tools were called, as the return value of the generator.
     """
-    global ASSISTANT_NAME
-    tool_use_reqd = toolRequired(conversation)
-    if tool_use_reqd:
+    system_prompt = sysmsg.get_assistant_system_prompt(assistant_name).copy()
+    response = provider_router.router.chat(
+        "tool",
+        messages=build_messages(system_prompt, conversation), # type: ignore
+        tools=selectTools(conversation), # type: ignore
+        tool_choice="auto",
+        stream=stream,
+    )
+
+    answer = ToolAutoAnswer()
+    if stream:
+        with response:
+            for chunk in response:
+                yield from answer.feed_chunk(chunk)
+        yield from answer.release()
+    else:
+        yield from answer.feed_message(response.choices[0].message)
+
+    if answer.tool_calls:
+        print("Using tools...")
+        conversation.append(toolCallsMessage(answer.tool_calls))
+        runToolCalls(conversation, answer.tool_calls)
+        return None
+
+    print("Not using tools...")
+    return answer.result()
+
+# Single pass answer, calling tools first if the model asks for them
+def singlePassAnswer(conversation: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, assistant_name: str = ASSISTANT_NAME):
+    response = yield from toolAuto(conversation, stream=stream, assistant_name=assistant_name)
+    if response is None:
+        print("Got tool results ✅")
+        system_prompt = sysmsg.get_assistant_system_prompt(assistant_name).copy()
+        response = yield from cascadeAnswer(build_messages(system_prompt, conversation), stream=stream)
+    return response
+
+# Format the agent response for the conversation history
+def format_agent_response(response: sysmsg.AgentResponse) -> str:
+    output = ""
+    if response.assistant_response:
+        output = "Assistant Response:\n---\n" + response.assistant_response + '\n'
+    if response.points:
+        output += "\nPoints:\n---\n"
+        for point in response.points:
+            output += f"- {point}\n"
+    if response.code:
+        output += f"\nCode:\n---\n{response.code}\n"
+    if response.error:
+        output += f"\n{response.error}\n"
+    if response.sources:
+        output += "\nSources:\n---\n"
+        for source in response.sources:
+            output += f"- {source}\n"
+    return output
+
+# Generate the answer from the general model
+def generate_answer(messages: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, role: str = "general"):
+    """
+    Generate the final answer, yielding (field, value) events.
+    The assistant_response text is yielded as it arrives when streaming, the other fields once they are complete.
+
+    Args:
+        messages (list): The messages to send to the model.
+        stream (bool): Stream the response from the model.
+        role (str): The provider router role answering, general or fast.
+
+    Returns:
+        AgentResponse: The complete response, as the return value of the generator.
+    """
+    if stream:
+        chunks = provider_router.router.chat(
+            role,
+            messages=messages,      # type: ignore
+            response_format={"type": "json_object"},
+            stream=True,
+        )
+        parser = AgentResponseStream()
+        with chunks:
+            for chunk in chunks:
+                if chunk.choices and (text := chunk.choices[0].delta.content):
+                    for field, value in parser.feed(text):
+                        # A confidence of 0 is still reported to the model cascade
+                        if value or field == "confidence":
+                            yield field, value
+        print("Response from the model received!!")
+        return parser.result()
+
+    content = provider_router.router.chat(
+        role,
+        messages=messages,      # type: ignore
+        response_format={"type": "json_object"},
+    ).choices[0].message.content
+
+    events, response = completionEvents(content)
+    yield from events
+    return response
+
+# Parse a complete answer into its events
+def completionEvents(content: str | None) -> tuple[list[tuple[str, Any]], sysmsg.AgentResponse]:
+    """
+    Parse the answer of a request that was not streamed.
+
+    Returns:
+        tuple: The (field, value) events of the answer, the confidence first if reported, and the AgentResponse.
+    """
+    if content is None:
+        raise Exception("No response from the model!!")
+    print("Validating the response...")
+    fields = json.loads(content)
+    events = []
+    if isinstance(fields, dict) and "confidence" in fields:
+        events.append(("confidence", fields.pop("confidence")))
+    response = parse_agent_response(fields)
+    print("Response validated successfully!!")
+    events += [(field, value) for field, value in response.model_dump().items() if value]
+    return events, response
+
+# Gate of the fast model's answer
+class FastAnswerGate:
+    """
+    Holds back the fast model's events until it reports its confidence, shared by cascadeAnswer and cascade_answer_async.
+    A low confidence, or a failure before anything was released, hands the answer to the general model.
+    """
+
+    def __init__(self):
+        self.held: list[tuple[str, Any]] | None = []
+        self.confidence = None
+        self.escalate = False
+
+    @property
+    def released(self) -> bool:
+        return self.held is None
+
+    def feed(self, field: str, value) -> list[tuple[str, Any]]:
+        """
+        Feed an event of the fast model, returns the events to pass on.
+        """
+        if field == "confidence":
+            if self.held is None:
+                return []
+            self.confidence = parse_confidence(value)
+            if self.confidence is not None and self.confidence < CASCADE_MIN_CONFIDENCE:
+                self.escalate = True
+                return []
+            events, self.held = self.held, None
+            return events
+        if self.held is None:
+            return [(field, value)]
+        self.held.append((field, value))
+        return []
+
+    def keep(self, response: sysmsg.AgentResponse | None) -> list[tuple[str, Any]] | None:
+        """
+        Get the events still held once the fast model finished, None if the answer is escalated.
+        """
+        if self.held is None:
+            return []
+        if not self.escalate and response is not None and response.assistant_response:
+            return self.held
+        return None
+
+# Generate the answer, from the fast model first when the request is simple
+def cascadeAnswer(messages: list[Dict[str, str]], stream: bool = STREAM_RESPONSES):
+    """
+    Generate the final answer through the model cascade, yielding (field, value) events like generate_answer.
+    The fast model's events are held back until it reports its confidence, a low confidence
+    or a failure before anything was yielded hands the answer to the general model.
+
+    Args:
+        messages (list): The messages to send to the model.
+        stream (bool): Stream the response from the model.
+
+    Returns:
+        AgentResponse: The complete response, as the return value of the generator.
+    """
+    started = time.monotonic()
+    decision = cascade.route(messages)
+    if decision.role == "general":
+        response = yield from generate_answer(messages, stream=stream)
+        cascade.log(messages, decision, time.monotonic() - started)
+        return response
+
+    print(f"Answering with the fast model ({decision.reason})")
+    events = generate_answer(fast_messages(messages), stream=stream, role="fast")
+    gate, response = FastAnswerGate(), None
+    try:
+        while not gate.escalate:
+            try:
+                field, value = next(events)
+            except StopIteration as stop:
+                response = stop.value
+                break
+            yield from gate.feed(field, value)
+    except Exception as e:
+        if gate.released:
+            raise
+        print(f"Fast model failed: {e}")
+    finally:
+        events.close()
+
+    if (held := gate.keep(response)) is not None:
+        yield from held
+        cascade.log(messages, decision, time.monotonic() - started, gate.confidence)
+        return response
+
+    print(f"Escalating to the general model (confidence: {gate.confidence})")
+    response = yield from generate_answer(messages, stream=stream)
+    cascade.log(messages, decision, time.monotonic() - started, gate.confidence, escalated=True)
+    return response
+
+# Speculative answer
+class SpeculativeAnswer:
+    """
+    Generate the no-tool answer in the background while the tool decision is still being made.
+    The events are buffered until the caller either consumes or cancels the answer.
+    """
+
+    def __init__(self, messages: list[Dict[str, str]], stream: bool = STREAM_RESPONSES):
+        self.cancelled = threading.Event()
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, args=(messages, stream), daemon=True)
+        self._thread.start()
+
+    def _run(self, messages: list[Dict[str, str]], stream: bool):
+        events = cascadeAnswer(messages, stream=stream)
         try:
+            while not self.cancelled.is_set():
+                try:
+                    self._events.put(("event", next(events)))
+                except StopIteration as stop:
+                    self._events.put(("done", stop.value))
+                    return
+        except Exception as e:
+            self._events.put(("error", e))
+        finally:
+            # Closing the generator closes the underlying stream and drops the request
+            events.close()
+
+    def cancel(self):
+        """
+        Cancel the speculative answer. A streamed request is closed at its next chunk.
+        """
+        self.cancelled.set()
+
+    def events(self):
+        """
+        Consume the answer, yielding (field, value) events.
+
+        Returns:
+            AgentResponse: The complete response, as the return value of the generator.
+        """
+        while True:
+            kind, value = self._events.get()
+            if kind == "event":
+                yield value
+            elif kind == "done":
+                return value
+            else:
+                raise value
+
+# Answer from the response cache
+def cachedAnswer(conversation: list[Dict[str, str]], assistant_name: str = ASSISTANT_NAME):
+    """
+    Get the cached answer to the latest question as (field, value) events, None on a miss.
+    The cached answer is added to the conversation.
+    """
+    if not RESPONSE_CACHE:
+        return None
+    response = response_cache.cache.get(conversation, assistant_name)
+    if response is None:
+        return None
+    print("Answering from the response cache")
+    conversation.append({"role": "assistant", "content": format_agent_response(response)})
+    return [(field, value) for field, value in response.model_dump().items() if value]
+
+# Mark the first token of the answer
+def markAnswered(field: str, answered: bool) -> bool:
+    if field == "assistant_response" and not answered:
+        tracer.mark("answer_first_token")
+        return True
+    return answered
+
+# Add the answer to the conversation and the response cache
+def addResponse(conversation: list[Dict[str, str]], response: sysmsg.AgentResponse, assistant_name: str = ASSISTANT_NAME):
+    # The caller shows the answer as it streams, it is not printed again here
+    output = format_agent_response(response)
+    conversation.append({"role": "assistant", "content": output})
+    if RESPONSE_CACHE:
+        response_cache.cache.put(conversation, response, assistant_name)
+
+# Answer event of a failed turn
+def errorEvent(error: Exception, tool_use_reqd: bool | None) -> tuple[str, str]:
+    if tool_use_reqd:
+        print(f"An error occurred while using tools: {error}")
+        return "assistant_response", "An error occurred while using tools!!"
+    print(f"{error}")
+    return "assistant_response", "An error occurred while generating the response!!"
+
+# Get response events
+def get_response_events(conversation: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, assistant_name: str = ASSISTANT_NAME):
+    """
+    Get a response from the chat model using tool calling, as (field, value) events.
+
+    Args:
+        conversation (list): The conversation history.
+        stream (bool): Stream the answer from the model.
+        assistant_name (str): The name of the assistant profile answering.
+
+    Yields:
+        tuple: The field of the AgentResponse and its value, assistant_response arrives in pieces when streaming.
+    """
+    if (cached := cachedAnswer(conversation, assistant_name)) is not None:
+        yield from cached
+        return
+
+    context.manager.compact(conversation)
+    system_prompt = sysmsg.get_assistant_system_prompt(assistant_name).copy()
+    single_pass = auto_tool_choice(TOOL_BASE_URL)
+
+    # Start the no-tool answer alongside the decision, it is used if no tool is required
+    speculation = None
+    if SPECULATIVE_ANSWER and not single_pass:
+        speculation = SpeculativeAnswer(build_messages(system_prompt, conversation), stream=stream)
+
+    try:
+        # In single pass mode only clear cases are decided up front, the tool model decides the rest itself
+        tool_use_reqd = singlePassToolRequired(conversation) if single_pass else toolRequired(conversation)
+    except BaseException:
+        if speculation:
+            speculation.cancel()
+        raise
+
+    try:
+        if tool_use_reqd is None:
+            events = singlePassAnswer(conversation, stream=stream, assistant_name=assistant_name)
+        elif tool_use_reqd:
+            if speculation:
+                speculation.cancel()
             print("Getting tool results...")
             toolResults(conversation)
             print("Got tool results ✅")
-            system_prompt = sysmsg.assistant_system_prompt.copy()
-            client = OpenAI(base_url=GENERAL_BASE_URL, api_key=GENERAL_API_KEY)
-            response = client.chat.completions.create(
-                model=GENERAL_MODEL,
-                messages=[system_prompt] + conversation,
-                response_format={"type": "json_object"},
-            )
-            print("Response from the model received!!")
-            print(response)
-            response = response.choices[0].message.content
-
-            if response is None:
-                raise Exception("No response from the model!!")
-            print("Validating the response...")
+            events = cascadeAnswer(build_messages(system_prompt, conversation), stream=stream)
+        elif speculation:
+            events = speculation.events()
+        else:
+            events = cascadeAnswer(build_messages(system_prompt, conversation), stream=stream)
+
+        answered = False
+        while True:
             try:
-                response = sysmsg.AgentResponse.model_validate_json(response)
-                print("Response validated successfully!!")
-            except Exception as e:
-                print(f"Error validating response: {e}")
-
-            output = ""
-            answer = "No descriptive answer available!"
-            if response.assistant_response:
-                answer = response.assistant_response
-                output = "Assistant Response:\n---\n" + response.assistant_response + '\n'
-            if response.points:
-                output += "\nPoints:\n---\n"
-                for point in response.points:
-                    output += f"- {point}\n"
-            if response.code:
-                output += f"\nCode:\n---\n{response.code}\n"
-            if response.error:
-                output += f"\n{response.error}\n"
-            if response.sources:
-                output += "\nSources:\n"
-                for source in response.sources:
-                    output += f"- {source}\n"
-            print(output)
-
-            conversation.append({"role": "assistant", "content": output})
-            yield answer
-        except KeyboardInterrupt:
-            print("Keyboard Interrupt!!")
-            yield "Keyboard Interrupt!!"
-        except Exception as e:
-            print(f"An error occurred while using tools: {e}")
-            yield f"An error occurred while using tools!!"
-    else:
+                field, value = next(events)
+            except StopIteration as stop:
+                response = stop.value
+                break
+            answered = markAnswered(field, answered)
+            yield field, value
+
+        if not answered:
+            yield "assistant_response", "No descriptive answer available!"
+        tracer.mark("answer_complete")
+        addResponse(conversation, response, assistant_name)
+    except KeyboardInterrupt:
+        print("Keyboard Interrupt!!")
+        yield "assistant_response", "Keyboard Interrupt!!"
+    except Exception as e:
+        yield errorEvent(e, tool_use_reqd)
+    finally:
+        # The caller may stop reading early, e.g. on barge-in, the speculative request is dropped with it
+        if speculation:
+            speculation.cancel()
+
+# Get responses from the model
+def get_response(conversation: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, assistant_name: str = ASSISTANT_NAME):
+    """
+    Get a response from the chat model using tool calling.
+
+    Args:
+        conversation (list): The conversation history.
+        stream (bool): Stream the answer text as it is generated.
+        assistant_name (str): The name of the assistant profile answering.
+
+    Yields:
+        str: The spoken answer from the chat model, in pieces when streaming.
+    """
+    for field, value in get_response_events(conversation, stream=stream, assistant_name=assistant_name):
+        if field == "assistant_response":
+            yield value
+
+## Async API
+# Async counterparts of the functions above, sharing one event loop between many turns and tool calls.
+# Blocking work, e.g. log writes and ranking tool outputs, runs in worker threads.
+
+# Return value of an async generator
+class AsyncResult:
+    """
+    Holds the AgentResponse of an async answer generator. Async generators cannot return a value,
+    so the generator sets it where the sync one returns it.
+    """
+
+    def __init__(self):
+        self.value: sysmsg.AgentResponse | None = None
+
+# Greeting function
+async def greet_me_async(name: str = "User", assistant_name: str = ASSISTANT_NAME):
+    greetings = [{
+        "role": "user",
+        "content": f"You are {assistant_name}, greet {name}. {name} is your requester and will be interacting with you. Provide a very-short but a warm greeting to initiate the conversation. The current date and time is {getCurrentDateTime()}."
+    }]
+
+    response = await provider_router.router.chat_async(
+        "general",
+        messages=greetings,      # type: ignore
+        stream=True
+    )
+    async for chunk in response:
+        if chunk.choices and (text := chunk.choices[0].delta.content):
+            yield text
+
+# Ask the decision model if a tool is required
+async def llm_tool_required_async(conversation: list[Dict[str, str]]) -> bool:
+    response = await provider_router.router.chat_async(
+        "decision",
+        messages=build_messages(sysmsg.tool_use_check_system_prompt.copy(), conversation),
+        response_format={"type": "json_object"},
+    )
+    return parseDecision(response.choices[0].message.content)
+
+# Function to check if a tool is required or not
+async def tool_required_async(conversation: list[Dict[str, str]]) -> bool:
+    decision = await asyncio.to_thread(localToolRequired, conversation)
+    if not isinstance(decision, bool):
+        route = decision
+        with tracer.span("decision"):
+            decision = await llm_tool_required_async(conversation)
+        if route is not None:
+            await asyncio.to_thread(tool_router.router.log, conversation, route, decision)
+
+    print("Using tools..." if decision else "Not using tools...")
+    return decision
+
+# Run a single tool call
+async def run_tool_call_async(tool) -> str:
+    arguments = json.loads(tool.function.arguments or "{}")
+    print('Function:', tool.function.name)
+    print('Arguments:', arguments)
+
+    with tracer.span(f"tool:{tool.function.name}"):
+        tool_response = await registry.call_async(tool.function.name, **arguments)
+    print(f'Function Output ({tool.function.name}): \n---\n{tool_response}\n---')
+    return formatToolOutput(tool_response)
+
+# Run the requested tool calls
+async def run_tool_calls_async(conversation: list[Dict[str, str]], tool_calls: list):
+    """
+    Run the requested tool calls concurrently on the event loop, each with its own timeout.
+    The results are added to the conversation in the order the calls were requested.
+    """
+    async def run(tool) -> str:
+        if tool.function.name not in registry:
+            print('Function', tool.function.name, 'not found')
+            return f"Function: {tool.function.name} not found\n"
         try:
-            system_prompt = sysmsg.assistant_system_prompt.copy()
-            client = OpenAI(base_url=GENERAL_BASE_URL, api_key=GENERAL_API_KEY)
-            response = client.chat.completions.create(
-                model=GENERAL_MODEL,
-                messages=conversation + [system_prompt],      # type: ignore
-                response_format={"type": "json_object"},
-            ).choices[0].message.content
-
-            if response is None:
-                print("No response from the model!!")
-
-            print("Validating the response...")
-            response = sysmsg.AgentResponse.model_validate_json(response)
-            print("Response validated successfully!!")
-
-            output = ""
-            answer = "No descriptive answer available!"
-            if response.assistant_response:
-                answer = response.assistant_response
-                output = "Assistant Response:\n---\n" + response.assistant_response + '\n'
-            if response.points:
-                output += "\nPoints:\n---\n"
-                for point in response.points:
-                    output += f"- {point}\n"
-            if response.code:
-                output += f"\nCode:\n---\n{response.code}\n"
-            if response.error:
-                output += f"\n{response.error}\n"
-            if response.sources:
-                output += "\nSources:\n---\n"
-                for source in response.sources:
-                    output += f"- {source}\n"
-            print(output)
-
-            conversation.append({"role": "assistant", "content": output})
-            yield answer
+            timeout = TOOL_TIMEOUTS.get(tool.function.name, TOOL_TIMEOUT)
+            return await asyncio.wait_for(run_tool_call_async(tool), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Function {tool.function.name} timed out")
+            return f"Function: {tool.function.name} timed out."
         except Exception as e:
-            print(f"{e}")
-            yield f"An error occurred while generating the response!!"
+            print(f"Error in {tool.function.name}: {e}")
+            return f"Function: {tool.function.name} failed with error: {e}"
+
+    results = await asyncio.gather(*(run(tool) for tool in tool_calls))
+    for tool, tool_response in zip(tool_calls, results):
+        conversation.append({
+            "role": "tool",
+            "tool_call_id": tool.id,
+            "content": await asyncio.to_thread(capToolOutput, conversation, tool, tool_response),
+        })
+
+# Function to get tool results
+async def tool_results_async(conversation: list[Dict[str, str]]) -> list[float]:
+    """
+    Run the tool model in a loop until it stops requesting tools or the step/time budget runs out.
+
+    Returns:
+        list: The duration of every step in seconds.
+    """
+    system_prompt = sysmsg.tool_use_results_system_prompt.copy()
+
+    steps = AgentSteps(conversation)
+    for _ in steps:
+        response = await provider_router.router.chat_async(
+            "tool",
+            messages=build_messages(system_prompt, conversation), # type: ignore
+            tools=selectTools(conversation), # type: ignore
+            tool_choice=steps.tool_choice,
+        )
+        message = response.choices[0].message
+
+        if message.tool_calls:
+            conversation.append(toolCallsMessage(message.tool_calls, message.content))
+            await run_tool_calls_async(conversation, message.tool_calls)
+        steps.done(message)
+    return steps.step_times
+
+# Generate the answer from the general model
+async def generate_answer_async(messages: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, role: str = "general", result: AsyncResult | None = None):
+    """
+    Generate the final answer, yielding (field, value) events like generate_answer.
+    The complete AgentResponse is set on the result.
+    """
+    result = result or AsyncResult()
+    if stream:
+        chunks = await provider_router.router.chat_async(
+            role,
+            messages=messages,      # type: ignore
+            response_format={"type": "json_object"},
+            stream=True,
+        )
+        parser = AgentResponseStream()
+        async with chunks:
+            async for chunk in chunks:
+                if chunk.choices and (text := chunk.choices[0].delta.content):
+                    for field, value in parser.feed(text):
+                        if value or field == "confidence":
+                            yield field, value
+        print("Response from the model received!!")
+        result.value = parser.result()
+        return
+
+    response = await provider_router.router.chat_async(
+        role,
+        messages=messages,      # type: ignore
+        response_format={"type": "json_object"},
+    )
+    events, response = completionEvents(response.choices[0].message.content)
+    for event in events:
+        yield event
+    result.value = response
+
+# Generate the answer, from the fast model first when the request is simple
+async def cascade_answer_async(messages: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, result: AsyncResult | None = None):
+    """
+    Async counterpart of cascadeAnswer, the complete AgentResponse is set on the result.
+    """
+    result = result or AsyncResult()
+    started = time.monotonic()
+    decision = cascade.route(messages)
+    if decision.role == "general":
+        async for event in generate_answer_async(messages, stream=stream, result=result):
+            yield event
+        await asyncio.to_thread(cascade.log, messages, decision, time.monotonic() - started)
+        return
+
+    print(f"Answering with the fast model ({decision.reason})")
+    fast = AsyncResult()
+    events = generate_answer_async(fast_messages(messages), stream=stream, role="fast", result=fast)
+    gate = FastAnswerGate()
+    try:
+        async for field, value in events:
+            for event in gate.feed(field, value):
+                yield event
+            if gate.escalate:
+                break
+    except Exception as e:
+        if gate.released:
+            raise
+        print(f"Fast model failed: {e}")
+    finally:
+        await events.aclose()
+
+    if (held := gate.keep(fast.value)) is not None:
+        for event in held:
+            yield event
+        result.value = fast.value
+        await asyncio.to_thread(cascade.log, messages, decision, time.monotonic() - started, gate.confidence)
+        return
+
+    print(f"Escalating to the general model (confidence: {gate.confidence})")
+    async for event in generate_answer_async(messages, stream=stream, result=result):
+        yield event
+    await asyncio.to_thread(cascade.log, messages, decision, time.monotonic() - started, gate.confidence, escalated=True)
+
+# Single pass answer, calling tools first if the model asks for them
+async def single_pass_answer_async(conversation: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, assistant_name: str = ASSISTANT_NAME, result: AsyncResult | None = None):
+    """
+    Async counterpart of toolAuto and singlePassAnswer, the complete AgentResponse is set on the result.
+    """
+    result = result or AsyncResult()
+    system_prompt = sysmsg.get_assistant_system_prompt(assistant_name).copy()
+    response = await provider_router.router.chat_async(
+        "tool",
+        messages=build_messages(system_prompt, conversation), # type: ignore
+        tools=selectTools(conversation), # type: ignore
+        tool_choice="auto",
+        stream=stream,
+    )
+
+    answer = ToolAutoAnswer()
+    if stream:
+        async with response:
+            async for chunk in response:
+                for event in answer.feed_chunk(chunk):
+                    yield event
+        for event in answer.release():
+            yield event
+    else:
+        for event in answer.feed_message(response.choices[0].message):
+            yield event
+
+    if not answer.tool_calls:
+        print("Not using tools...")
+        result.value = answer.result()
+        return
+
+    print("Using tools...")
+    conversation.append(toolCallsMessage(answer.tool_calls))
+    await run_tool_calls_async(conversation, answer.tool_calls)
+    print("Got tool results ✅")
+    async for event in cascade_answer_async(build_messages(system_prompt, conversation), stream=stream, result=result):
+        yield event
+
+# Buffer an answer in a background task, so it can run while the decision is being made
+async def speculate_async(messages: list[Dict[str, str]], stream: bool, buffer: asyncio.Queue):
+    result = AsyncResult()
+    try:
+        async for event in cascade_answer_async(messages, stream=stream, result=result):
+            await buffer.put(("event", event))
+        await buffer.put(("done", result.value))
+    except Exception as e:
+        await buffer.put(("error", e))
+
+# Replay a speculative answer
+async def speculation_events_async(buffer: asyncio.Queue, result: AsyncResult):
+    while True:
+        kind, value = await buffer.get()
+        if kind == "done":
+            result.value = value
+            return
+        if kind == "error":
+            raise value
+        yield value
+
+# Get response events
+async def get_response_events_async(conversation: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, assistant_name: str = ASSISTANT_NAME):
+    """
+    Get a response from the chat model using tool calling, as (field, value) events.
+    Async counterpart of get_response_events, a cancelled speculative answer cancels its request.
+    """
+    if (cached := await asyncio.to_thread(cachedAnswer, conversation, assistant_name)) is not None:
+        for event in cached:
+            yield event
+        return
+
+    context.manager.compact(conversation)
+    system_prompt = sysmsg.get_assistant_system_prompt(assistant_name).copy()
+    single_pass = auto_tool_choice(TOOL_BASE_URL)
+
+    # Start the no-tool answer alongside the decision, it is used if no tool is required
+    speculation = None
+    if SPECULATIVE_ANSWER and not single_pass:
+        buffer = asyncio.Queue()
+        speculation = asyncio.create_task(speculate_async(build_messages(system_prompt, conversation), stream, buffer))
+
+    try:
+        # In single pass mode only clear cases are decided up front, the tool model decides the rest itself
+        if single_pass:
+            tool_use_reqd = await asyncio.to_thread(singlePassToolRequired, conversation)
+        else:
+            tool_use_reqd = await tool_required_async(conversation)
+    except BaseException:
+        if speculation:
+            speculation.cancel()
+        raise
+
+    try:
+        result = AsyncResult()
+        if tool_use_reqd is None:
+            events = single_pass_answer_async(conversation, stream=stream, assistant_name=assistant_name, result=result)
+        elif tool_use_reqd:
+            if speculation:
+                speculation.cancel()
+            print("Getting tool results...")
+            await tool_results_async(conversation)
+            print("Got tool results ✅")
+            events = cascade_answer_async(build_messages(system_prompt, conversation), stream=stream, result=result)
+        elif speculation:
+            events = speculation_events_async(buffer, result)
+        else:
+            events = cascade_answer_async(build_messages(system_prompt, conversation), stream=stream, result=result)
+
+        answered = False
+        async for field, value in events:
+            answered = markAnswered(field, answered)
+            yield field, value
+
+        if not answered:
+            yield "assistant_response", "No descriptive answer available!"
+        tracer.mark("answer_complete")
+        await asyncio.to_thread(addResponse, conversation, result.value, assistant_name)
+    except KeyboardInterrupt:
+        print("Keyboard Interrupt!!")
+        yield "assistant_response", "Keyboard Interrupt!!"
+    except Exception as e:
+        yield errorEvent(e, tool_use_reqd)
+    finally:
+        # Cancelled or closed early, e.g. the server dropped the request, the speculative request is dropped with it
+        if speculation and not speculation.done():
+            speculation.cancel()
+
+# Get responses from the model
+async def get_response_async(conversation: list[Dict[str, str]], stream: bool = STREAM_RESPONSES, assistant_name: str = ASSISTANT_NAME):
+    """
+    Get a response from the chat model using tool calling, async counterpart of get_response.
+
+    Yields:
+        str: The spoken answer from the chat model, in pieces when streaming.
+    """
+    async for field, value in get_response_events_async(conversation, stream=stream, assistant_name=assistant_name):
+        if field == "assistant_response":
+            yield value
 
 # Main function
 if __name__ == "__main__":
@@ -225,6 +1098,13 @@ if __name__ == "__main__":
     ASSISTANT_NAME = "Jarvis"
     conversation = []
 
+    if WARM_CLIENTS_ON_STARTUP:
+        warm_clients()
+    if PRELOAD_TOOLS:
+        registry.preload()
+    if PRELOAD_BROWSER:
+        browser_pool.pool.preload()
+
     print("JARVIS: ", end="", flush=True)
     for _ in greet_me():
         print(_, end="", flush=True)
@@ -0,0 +1,177 @@
+import asyncio
+import atexit
+import threading
+import time
+
+from config import *
+from metrics import metrics
+
+
+# Browser settings of the scraper
+def scraper_browser_config():
+    # crawl4ai takes seconds to import, it is only loaded once a browser is started
+    from crawl4ai import BrowserConfig
+
+    return BrowserConfig(
+        user_agent_mode="random",
+        text_mode=True,
+        light_mode=True,
+        extra_args=["--disable-extensions", "--disable-infobars", "--disable-dev-tools", "--window-size=1920x1080"],
+        # verbose=True,
+    )
+
+
+class PooledBrowser:
+    """
+    A running crawler of the pool, with the number of pages it is scraping and has scraped.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.active = 0
+        self.pages = 0
+        self.retiring = False
+
+
+class BrowserPool:
+    """
+    Long-lived headless browsers shared by every scrape. The browsers run on their own event loop
+    in a background thread, so scrapes from any thread or event loop reuse them. A browser is
+    replaced after a number of pages, once its last page is done, to cap its memory.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, recycle_pages: int = BROWSER_RECYCLE_PAGES):
+        self.size = size
+        self.recycle_pages = recycle_pages
+        self.browsers: list[PooledBrowser] = []
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._start_lock: asyncio.Lock | None = None
+        self._stats = {"starts": 0, "recycled": 0, "pages": 0, "failures": 0, "start_seconds": 0.0}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self.loop is None:
+            with self._lock:
+                if self.loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True)
+                    self._thread.start()
+                    self.loop = loop
+                    atexit.register(self.close)
+        return self.loop
+
+    async def _start_browser(self) -> PooledBrowser:
+        from crawl4ai import AsyncWebCrawler
+
+        started = time.perf_counter()
+        crawler = AsyncWebCrawler(config=scraper_browser_config())
+        await crawler.start()
+        elapsed = time.perf_counter() - started
+        self._stats["starts"] += 1
+        self._stats["start_seconds"] += elapsed
+        metrics.increment("browser_pool.starts")
+        print(f"Started a browser in {elapsed:.2f}s")
+
+        browser = PooledBrowser(crawler)
+        self.browsers.append(browser)
+        return browser
+
+    async def _close_browser(self, browser: PooledBrowser):
+        if browser in self.browsers:
+            self.browsers.remove(browser)
+        try:
+            await browser.crawler.close()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+    async def _lease(self) -> PooledBrowser:
+        """
+        Get the least busy browser, starting one if the pool has room and every browser is busy.
+        """
+        self._start_lock = self._start_lock or asyncio.Lock()
+        async with self._start_lock:
+            available = [browser for browser in self.browsers if not browser.retiring]
+            idle = [browser for browser in available if browser.active == 0]
+            if not available or (not idle and len(available) < self.size):
+                browser = await self._start_browser()
+            else:
+                browser = min(available, key=lambda browser: browser.active)
+            browser.active += 1
+            return browser
+
+    async def _release(self, browser: PooledBrowser, ok: bool):
+        browser.active -= 1
+        browser.pages += 1
+        self._stats["pages"] += 1
+        if not ok:
+            self._stats["failures"] += 1
+        if browser.pages >= self.recycle_pages:
+            browser.retiring = True
+        if browser.retiring and browser.active == 0:
+            self._stats["recycled"] += 1
+            metrics.increment("browser_pool.recycled")
+            await self._close_browser(browser)
+
+    async def _run(self, function, *args):
+        browser = await self._lease()
+        ok = False
+        try:
+            result = await function(*args, crawler=browser.crawler)
+            ok = True
+            return result
+        finally:
+            await self._release(browser, ok)
+
+    async def run_async(self, function, *args):
+        """
+        Run function(*args, crawler=crawler) with a pooled crawler from any event loop,
+        e.g. tools.browser_scrape. Sync callers run their scrape with asyncio.run.
+        Cancelling the caller cancels the scrape.
+        """
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._run(function, *args), self._ensure_loop()))
+
+    def preload(self):
+        """
+        Start a browser in the background, e.g. at boot, so the first scrape does not wait for it.
+        """
+        async def start():
+            self._start_lock = self._start_lock or asyncio.Lock()
+            async with self._start_lock:
+                if not self.browsers:
+                    await self._start_browser()
+
+        def report(future):
+            if not future.cancelled() and future.exception():
+                print(f"Error starting browser: {future.exception()}")
+
+        asyncio.run_coroutine_threadsafe(start(), self._ensure_loop()).add_done_callback(report)
+
+    def close(self, timeout: float = 10):
+        """
+        Close every browser of the pool.
+        """
+        if self.loop is None or not self.browsers:
+            return
+
+        async def close_all():
+            await asyncio.gather(*(self._close_browser(browser) for browser in list(self.browsers)))
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_all(), self.loop).result(timeout=timeout)
+        except Exception as e:
+            print(f"Error closing the browser pool: {e}")
+
+    def stats(self) -> dict:
+        """
+        Get the number of browsers and pages in use, and the pages, starts and recycles so far.
+        """
+        stats = dict(self._stats)
+        stats["browsers"] = len(self.browsers)
+        stats["active_pages"] = sum(browser.active for browser in self.browsers)
+        stats["average_start_seconds"] = round(stats["start_seconds"] / stats["starts"], 2) if stats["starts"] else None
+        stats["start_seconds"] = round(stats["start_seconds"], 2)
+        return stats
+
+
+pool = BrowserPool()
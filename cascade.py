@@ -0,0 +1,167 @@
+import datetime
+import json
+import re
+import statistics
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+import systemMsgs as sysmsg
+from config import *
+from metrics import metrics
+from tool_router import CHAT_PATTERNS, last_user_message
+
+# Requests that need more than a short, factual answer
+COMPLEX_PATTERN = re.compile(
+    r"\b(explain|why|how (does|do|did|would|could|can)|compare|comparison|difference|versus|vs\.?|analy[sz]e|analysis|"
+    r"step by step|in detail|elaborate|pros and cons|summari[sz]e|summary|plan|strategy|design|debug|"
+    r"code|script|function|algorithm|calculate|solve|prove|derive|translate|essay|recommend)\b",
+    re.IGNORECASE,
+)
+# Code, maths and structured input
+STRUCTURE_PATTERN = re.compile(r"```|`[^`]+`|\d+\s*[-+*/^=]\s*\d+|[{}\[\]<>]|\n\s*[-*\d]")
+
+
+# Cascade decision class
+class CascadeDecision(BaseModel):
+    """
+    A class representing the model chosen by the cascade for an answer.
+    """
+    role: str = Field(description="The provider router role answering, fast or general.")
+    reason: str = Field(description="What the decision was based on.")
+
+
+# Get the tool outputs of the latest turn
+def current_tool_outputs(messages: list[Dict[str, str]]) -> list[str]:
+    outputs = []
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            break
+        if message.get("role") == "tool":
+            outputs.append(f"{message.get('content', '')}")
+    return outputs
+
+# Ask the fast model to report its confidence
+def fast_messages(messages: list[Dict[str, str]]) -> list[Dict[str, str]]:
+    """
+    Add the confidence instruction to the system prompt of the messages, for the fast model.
+    """
+    system_prompt = {"role": "system", "content": messages[0]["content"] + sysmsg.cascade_confidence_prompt}
+    return [system_prompt, *messages[1:]]
+
+# Read the confidence reported by the fast model
+def parse_confidence(value) -> float | None:
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+class ModelCascade:
+    """
+    Sends short, simple turns to the fast model and the rest to the general model.
+    The fast model reports its confidence before its answer, and a low confidence
+    escalates the turn to the general model.
+    """
+
+    def __init__(self, enabled: bool = MODEL_CASCADE, log_path: str = CASCADE_LOG_PATH):
+        self.enabled = enabled
+        self.log_path = Path(log_path)
+        self._lock = threading.Lock()
+        self.chat_patterns = [re.compile(rf"^\s*({pattern})\s*[.!?]*\s*$", re.IGNORECASE) for pattern in CHAT_PATTERNS]
+
+    def route(self, messages: list[Dict[str, str]]) -> CascadeDecision:
+        """
+        Choose the model answering the latest request.
+
+        Args:
+            messages (list): The messages of the answer request, including the tool outputs of the turn.
+
+        Returns:
+            CascadeDecision: The role answering and why.
+        """
+        if not self.enabled:
+            return CascadeDecision(role="general", reason="disabled")
+
+        text = last_user_message(messages)
+        if any(pattern.match(text) for pattern in self.chat_patterns):
+            return CascadeDecision(role="fast", reason="conversational")
+        if sum(len(output) for output in current_tool_outputs(messages)) > CASCADE_MAX_TOOL_CHARS:
+            return CascadeDecision(role="general", reason="tool output")
+        if len(text.split()) > CASCADE_MAX_WORDS:
+            return CascadeDecision(role="general", reason="length")
+        if text.count("?") > 1:
+            return CascadeDecision(role="general", reason="several questions")
+        if COMPLEX_PATTERN.search(text):
+            return CascadeDecision(role="general", reason="keyword")
+        if STRUCTURE_PATTERN.search(text):
+            return CascadeDecision(role="general", reason="structure")
+        return CascadeDecision(role="fast", reason="simple")
+
+    def log(self, messages: list[Dict[str, str]], decision: CascadeDecision, seconds: float, confidence: Optional[float] = None, escalated: bool = False):
+        """
+        Record a cascade decision in the metrics and the cascade log, along with how the answer went.
+        """
+        metrics.increment(f"cascade.{decision.role}")
+        if escalated:
+            metrics.increment("cascade.escalated")
+
+        record = {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "text": last_user_message(messages),
+            "role": decision.role,
+            "reason": decision.reason,
+            "confidence": confidence,
+            "escalated": escalated,
+            "seconds": round(seconds, 3),
+        }
+        try:
+            with self._lock:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log_path, mode="a", encoding="utf-8") as file:
+                    file.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing cascade log: {e}")
+
+
+# Summarise the cascade log
+def cascade_stats(log_path: str = CASCADE_LOG_PATH) -> dict:
+    """
+    Summarise the cascade decisions: the share of turns each model answered, the escalations
+    and the answer latency, overall and per reason.
+
+    Returns:
+        dict: The number of turns, the fast and escalation rates and the median latencies.
+    """
+    with open(log_path, mode="r", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file if line.strip()]
+
+    def summarise(records: list[dict]) -> dict:
+        fast = [record for record in records if record["role"] == "fast"]
+        escalated = [record for record in fast if record["escalated"]]
+        answered_fast = [record["seconds"] for record in fast if not record["escalated"]]
+        answered_general = [record["seconds"] for record in records if record["role"] == "general" or record["escalated"]]
+        return {
+            "turns": len(records),
+            "fast_rate": len(fast) / len(records) if records else None,
+            "escalation_rate": len(escalated) / len(fast) if fast else None,
+            "median_seconds": statistics.median(record["seconds"] for record in records) if records else None,
+            "median_seconds_fast": statistics.median(answered_fast) if answered_fast else None,
+            "median_seconds_general": statistics.median(answered_general) if answered_general else None,
+        }
+
+    summary = summarise(records)
+    reasons = {}
+    for record in records:
+        reasons.setdefault(record["reason"], []).append(record)
+    for reason, reason_records in reasons.items():
+        summary[reason] = summarise(reason_records)
+    return summary
+
+
+cascade = ModelCascade()
+
+if __name__ == "__main__":
+    print(json.dumps(cascade_stats(), indent=2))
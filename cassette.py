@@ -0,0 +1,372 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from config import *
+
+# Response headers not worth keeping in a cassette
+SKIPPED_HEADERS = {"set-cookie", "date", "cf-ray", "x-request-id"}
+# Headers of the body as sent, requests records it decoded and possibly cut short
+BODY_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+# Replay miss exception
+class CassetteMiss(httpx.TransportError):
+    """
+    Raised in replay mode when no recorded response matches a request.
+    It is a transport error, so callers handle it like a request that never reached the network.
+    """
+
+
+# Get the key of a request
+def request_key(method: str, url: str, body: bytes | str | None) -> str:
+    """
+    Hash a request by its method, url and body. JSON bodies are compared by their content, not their formatting.
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    body = body or b""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True).encode()
+    except ValueError:
+        pass
+    return hashlib.sha256(method.upper().encode() + b" " + str(url).encode() + b"\n" + body).hexdigest()
+
+
+class Cassette:
+    """
+    Records the HTTP traffic of the model clients and tools to a JSONL file, and replays it offline.
+
+    Modes:
+        off     Requests go to the network.
+        record  Requests go to the network, and every complete response is appended to the cassette,
+                including the arrival time of each streamed chunk.
+        replay  Requests are answered from the cassette, with the recorded latencies or none at all.
+                Requests are matched by their method, url and body, a request without a match fails.
+    """
+
+    def __init__(self, mode: str = CASSETTE_MODE, path: str = CASSETTE_PATH, latency: str = CASSETTE_LATENCY):
+        self._lock = threading.Lock()
+        self.use(mode, path, latency)
+
+    def use(self, mode: str, path: str | None = None, latency: str | None = None):
+        """
+        Switch the cassette mode, file or replay latency ("recorded" or "zero").
+        """
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        with self._lock:
+            self.mode = mode
+            self.path = Path(path or self.path)
+            self.latency = latency or self.latency
+            self._recordings: dict[str, list[dict]] = {}
+            self._played: dict[str, int] = {}
+            if mode == "replay":
+                self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            raise FileNotFoundError(f"No cassette at {self.path}, record one first")
+        with open(self.path, mode="r", encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                self._recordings.setdefault(record["key"], []).append(record)
+
+    def save(self, method: str, url: str, body: bytes | str | None, status: int, headers, latency: float, chunks: list[tuple[float, bytes]]):
+        """
+        Append a complete response to the cassette.
+        """
+        record = {
+            "key": request_key(method, url, body),
+            "method": method.upper(),
+            "url": str(url),
+            "status": status,
+            "headers": [[name, value] for name, value in headers.items() if name.lower() not in SKIPPED_HEADERS],
+            "latency": round(latency, 4),
+            "chunks": [[round(offset, 4), base64.b64encode(chunk).decode()] for offset, chunk in chunks],
+        }
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, mode="a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+
+    def find(self, method: str, url: str, body: bytes | str | None) -> dict:
+        """
+        Get the recorded response of a request. Repeated requests get the recordings in order, the last one is reused.
+        Only identical requests share a counter, so concurrent requests replay the same way in every run.
+
+        Raises:
+            CassetteMiss: If nothing was recorded for the request.
+        """
+        key = request_key(method, url, body)
+        with self._lock:
+            recordings = self._recordings.get(key)
+            if recordings is None:
+                raise CassetteMiss(f"No recorded response for {method.upper()} {url} with this body, record the cassette again")
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            return recordings[min(index, len(recordings) - 1)]
+
+    def chunks(self, record: dict) -> list[tuple[float, bytes]]:
+        offsets = self.latency == "recorded"
+        return [(offset if offsets else 0.0, base64.b64decode(chunk)) for offset, chunk in record["chunks"]]
+
+    def headers_latency(self, record: dict) -> float:
+        return record["latency"] if self.latency == "recorded" else 0.0
+
+
+## httpx transports
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream, started: float, on_complete):
+        self._stream = stream
+        self._started = started
+        self._on_complete = on_complete
+        self._chunks: list[tuple[float, bytes]] = []
+        self._complete = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._chunks.append((time.perf_counter() - self._started, chunk))
+            yield chunk
+        self._complete = True
+
+    def close(self):
+        self._stream.close()
+        # Responses abandoned half way, e.g. a cancelled hedge, are not recorded
+        if self._complete:
+            self._on_complete(self._chunks)
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, started: float, on_complete):
+        self._stream = stream
+        self._started = started
+        self._on_complete = on_complete
+        self._chunks: list[tuple[float, bytes]] = []
+        self._complete = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._chunks.append((time.perf_counter() - self._started, chunk))
+            yield chunk
+        self._complete = True
+
+    async def aclose(self):
+        await self._stream.aclose()
+        if self._complete:
+            self._on_complete(self._chunks)
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks: list[tuple[float, bytes]], started: float):
+        self._chunks = chunks
+        self._started = started
+
+    def __iter__(self):
+        for offset, chunk in self._chunks:
+            if (delay := self._started + offset - time.perf_counter()) > 0:
+                time.sleep(delay)
+            yield chunk
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[tuple[float, bytes]], started: float):
+        self._chunks = chunks
+        self._started = started
+
+    async def __aiter__(self):
+        for offset, chunk in self._chunks:
+            if (delay := self._started + offset - time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """
+    httpx transport passing requests through the cassette, wrapping the pooled transport.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, cassette: "Cassette"):
+        self._transport = transport
+        self._cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        mode = self._cassette.mode
+        started = time.perf_counter()
+        if mode == "replay":
+            record = self._cassette.find(request.method, str(request.url), request.read())
+            if (delay := self._cassette.headers_latency(record)) > 0:
+                time.sleep(delay)
+            return httpx.Response(record["status"], headers=record["headers"], stream=_ReplayStream(self._cassette.chunks(record), started), request=request)
+
+        response = self._transport.handle_request(request)
+        if mode != "record":
+            return response
+        latency = time.perf_counter() - started
+        save = lambda chunks: self._cassette.save(request.method, str(request.url), request.read(), response.status_code, response.headers, latency, chunks)
+        return httpx.Response(response.status_code, headers=response.headers, stream=_RecordingStream(response.stream, started, save), extensions=response.extensions, request=request)
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """
+    Async counterpart of CassetteTransport.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cassette: "Cassette"):
+        self._transport = transport
+        self._cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        mode = self._cassette.mode
+        started = time.perf_counter()
+        if mode == "replay":
+            record = self._cassette.find(request.method, str(request.url), await request.aread())
+            if (delay := self._cassette.headers_latency(record)) > 0:
+                await asyncio.sleep(delay)
+            return httpx.Response(record["status"], headers=record["headers"], stream=_AsyncReplayStream(self._cassette.chunks(record), started), request=request)
+
+        response = await self._transport.handle_async_request(request)
+        if mode != "record":
+            return response
+        latency = time.perf_counter() - started
+        body = await request.aread()
+        save = lambda chunks: self._cassette.save(request.method, str(request.url), body, response.status_code, response.headers, latency, chunks)
+        return httpx.Response(response.status_code, headers=response.headers, stream=_AsyncRecordingStream(response.stream, started, save), extensions=response.extensions, request=request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+cassette = Cassette()
+
+
+## requests sessions
+class _RecordingRaw:
+    """
+    Wraps the urllib3 response of requests, recording the decoded chunks as they are read.
+    The response is saved once its body is read to the end or it is closed, so a consumer that
+    stops reading early, e.g. at a size limit, records exactly what it read.
+    """
+
+    def __init__(self, raw, started: float, on_complete):
+        self._raw = raw
+        self._started = started
+        self._on_complete = on_complete
+        self._chunks: list[tuple[float, bytes]] = []
+        self._saved = False
+
+    def stream(self, *args, **kwargs):
+        for chunk in self._raw.stream(*args, **kwargs):
+            self._chunks.append((time.perf_counter() - self._started, chunk))
+            yield chunk
+        self._save()
+
+    def close(self):
+        self._raw.close()
+        self._save()
+
+    def _save(self):
+        if not self._saved:
+            self._saved = True
+            self._on_complete(self._chunks)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _ReplayReader(io.RawIOBase):
+    """
+    Readable body of a replayed requests response, handing out the recorded chunks at their recorded times.
+    """
+
+    def __init__(self, chunks: list[tuple[float, bytes]], started: float):
+        self._chunks = list(chunks)
+        self._started = started
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._pending and self._chunks:
+            offset, self._pending = self._chunks.pop(0)
+            if (delay := self._started + offset - time.perf_counter()) > 0:
+                time.sleep(delay)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+_session = None
+_session_lock = threading.Lock()
+
+# Get the shared requests session
+def http_session():
+    """
+    Get the shared requests session used by the tools, with the cassette mounted on it.
+    The session also keeps connections to the same hosts alive between tool calls.
+    """
+    global _session
+    if _session is not None:
+        return _session
+
+    with _session_lock:
+        if _session is not None:
+            return _session
+
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3 import HTTPResponse
+
+        class CassetteAdapter(HTTPAdapter):
+            def send(self, request, stream=False, **kwargs):
+                mode = cassette.mode
+                started = time.perf_counter()
+                if mode == "replay":
+                    try:
+                        record = cassette.find(request.method, request.url, request.body)
+                    except CassetteMiss as e:
+                        raise requests.exceptions.ConnectionError(e, request=request) from e
+                    if (delay := cassette.headers_latency(record)) > 0:
+                        time.sleep(delay)
+                    # A real urllib3 response, so streaming, iter_content and closing work as they do live
+                    raw = HTTPResponse(
+                        body=_ReplayReader(cassette.chunks(record), started),
+                        headers=[(name, value) for name, value in record["headers"] if name.lower() not in BODY_HEADERS],
+                        status=record["status"],
+                        preload_content=False,
+                    )
+                    response = self.build_response(request, raw)
+                    if not stream:
+                        response.content
+                    return response
+
+                if mode != "record":
+                    return super().send(request, stream=stream, **kwargs)
+
+                # The body is recorded as the caller reads it, so recorded runs read as much as live ones
+                response = super().send(request, stream=True, **kwargs)
+                latency = time.perf_counter() - started
+                save = lambda chunks: cassette.save(request.method, request.url, request.body, response.status_code, response.headers, latency, chunks)
+                response.raw = _RecordingRaw(response.raw, started, save)
+                if not stream:
+                    response.content
+                return response
+
+        session = requests.Session()
+        adapter = CassetteAdapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+        return _session
@@ -0,0 +1,190 @@
+import asyncio
+import atexit
+import threading
+import weakref
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from cassette import AsyncCassetteTransport, CassetteTransport, cassette
+from config import *
+
+# Registry of long-lived clients, keyed by (base_url, api_key)
+_clients: dict[tuple[str, str], OpenAI] = {}
+_clients_lock = threading.Lock()
+# Async clients are bound to the event loop they are used in, so every loop gets its own registry
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str], AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+
+
+# Get the provider name for a base url
+def provider_name(base_url: str, providers) -> str:
+    """
+    Get the configured provider whose name appears in the base url.
+
+    Args:
+        base_url (str): The base url of the provider.
+        providers (dict): The per-provider settings to match against.
+
+    Returns:
+        str: The matching provider name, or "default".
+    """
+    for provider in providers:
+        if provider != "default" and provider in str(base_url).lower():
+            return provider
+    return "default"
+
+# Get the connection limits for a provider
+def provider_limits(base_url: str) -> dict:
+    """
+    Get the connection pool limits for the provider serving the base url.
+
+    Args:
+        base_url (str): The base url of the provider.
+
+    Returns:
+        dict: The pool limits, falling back to the "default" entry of PROVIDER_LIMITS.
+    """
+    provider = provider_name(base_url, PROVIDER_LIMITS)
+    return {**PROVIDER_LIMITS["default"], **PROVIDER_LIMITS[provider]}
+
+# Check if single pass tool selection is enabled for a provider
+def auto_tool_choice(base_url: str) -> bool:
+    """
+    Check if the provider serving the base url is trusted with tool_choice="auto".
+    """
+    provider = provider_name(base_url, AUTO_TOOL_CHOICE_PROVIDERS)
+    return AUTO_TOOL_CHOICE_PROVIDERS.get(provider, False)
+
+# Get a shared client
+def get_client(base_url: str, api_key: str) -> OpenAI:
+    """
+    Get the shared client for a provider, creating it on first use.
+    The client keeps its keep-alive connection pool until the process exits.
+
+    Args:
+        base_url (str): The base url of the provider.
+        api_key (str): The api key for the provider.
+
+    Returns:
+        OpenAI: The pooled client.
+    """
+    key = (base_url, api_key)
+    if client := _clients.get(key):
+        return client
+
+    with _clients_lock:
+        if client := _clients.get(key):
+            return client
+        limits = provider_limits(base_url)
+        transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=limits["max_connections"],
+                max_keepalive_connections=limits["max_keepalive_connections"],
+                keepalive_expiry=limits["keepalive_expiry"],
+            ),
+        )
+        http_client = httpx.Client(
+            # The cassette records or replays the traffic when enabled, and passes it through otherwise
+            transport=CassetteTransport(transport, cassette),
+            timeout=httpx.Timeout(CLIENT_TIMEOUT, connect=CLIENT_CONNECT_TIMEOUT),
+        )
+        client = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client)
+        if not _clients:
+            atexit.register(close_clients)
+        _clients[key] = client
+        return client
+
+# Get a shared async client
+def get_async_client(base_url: str, api_key: str) -> AsyncOpenAI:
+    """
+    Get the shared async client for a provider on the running event loop, creating it on first use.
+
+    Args:
+        base_url (str): The base url of the provider.
+        api_key (str): The api key for the provider.
+
+    Returns:
+        AsyncOpenAI: The pooled async client.
+    """
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    key = (base_url, api_key)
+    if client := clients.get(key):
+        return client
+
+    limits = provider_limits(base_url)
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=limits["max_connections"],
+            max_keepalive_connections=limits["max_keepalive_connections"],
+            keepalive_expiry=limits["keepalive_expiry"],
+        ),
+    )
+    http_client = httpx.AsyncClient(
+        # The cassette records or replays the traffic when enabled, and passes it through otherwise
+        transport=AsyncCassetteTransport(transport, cassette),
+        timeout=httpx.Timeout(CLIENT_TIMEOUT, connect=CLIENT_CONNECT_TIMEOUT),
+    )
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client)
+    clients[key] = client
+    return client
+
+# Get the configured endpoints
+def configured_endpoints() -> list[tuple[str, str]]:
+    """
+    Get the unique (base_url, api_key) pairs used by the configured models.
+    """
+    endpoints = [
+        (GENERAL_BASE_URL, GENERAL_API_KEY),
+        (DECISION_BASE_URL, DECISION_API_KEY),
+        (TOOL_BASE_URL, TOOL_API_KEY),
+        (SUMMARISATION_BASE_URL, SUMMARISATION_API_KEY),
+        (VISION_BASE_URL, VISION_API_KEY),
+        (CODE_BASE_URL, CODE_API_KEY),
+    ]
+    return list(dict.fromkeys(endpoint for endpoint in endpoints if endpoint[0]))
+
+# Warm up a client
+def _warm_client(base_url: str, api_key: str):
+    try:
+        get_client(base_url, api_key).with_options(max_retries=0, timeout=CLIENT_CONNECT_TIMEOUT).models.list()
+    except Exception as e:
+        print(f"Could not warm connection to {base_url}: {e}")
+
+# Warm up all clients
+def warm_clients(endpoints: list[tuple[str, str]] | None = None, wait: bool = False):
+    """
+    Open the connection pools ahead of the first request, so the TCP and TLS
+    handshakes are not paid during the first conversation turn.
+
+    Args:
+        endpoints (list): The (base_url, api_key) pairs to warm. Defaults to all configured endpoints.
+        wait (bool): Block until all connections are warmed.
+    """
+    threads = []
+    for base_url, api_key in endpoints or configured_endpoints():
+        thread = threading.Thread(target=_warm_client, args=(base_url, api_key), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    if wait:
+        for thread in threads:
+            thread.join()
+
+# Close all clients
+def close_clients():
+    """
+    Close all pooled clients and their connections.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+# Close the async clients of the running event loop
+async def close_async_clients():
+    """
+    Close the pooled async clients of the running event loop.
+    """
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
@@ -52,6 +52,12 @@ GENERAL_BASE_URL = os.getenv("CEREBRAS_BASE_URL")
 GENERAL_API_KEY = os.getenv("CEREBRAS_API_KEY")
 GENERAL_MODEL = "llama-3.3-70b"
 
+# Fast
+# Small model answering the simple turns, see the model cascade below
+FAST_BASE_URL = os.getenv("CEREBRAS_BASE_URL")
+FAST_API_KEY = os.getenv("CEREBRAS_API_KEY")
+FAST_MODEL = "llama3.1-8b"
+
 # Decision
 DECISION_BASE_URL = os.getenv("CEREBRAS_BASE_URL")
 DECISION_API_KEY = os.getenv("CEREBRAS_API_KEY")
@@ -93,3 +99,219 @@ VISION_MODEL = "mistralai/mistral-small-3.1-24b-instruct:free"
 CODE_BASE_URL = os.getenv("GROQ_BASE_URL")
 CODE_API_KEY = os.getenv("GROQ_API_KEY")
 CODE_MODEL = "qwen-2.5-coder-32b"
+
+# Connection pooling
+# Limits are matched against the provider's base url, anything unmatched uses "default"
+PROVIDER_LIMITS = {
+    "default": {
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+        "keepalive_expiry": 120,
+    },
+    "cerebras": {
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+    },
+    "openrouter": {
+        "max_connections": 10,
+        "max_keepalive_connections": 5,
+    },
+    "groq": {
+        "max_connections": 10,
+        "max_keepalive_connections": 5,
+    },
+}
+CLIENT_TIMEOUT = 60
+CLIENT_CONNECT_TIMEOUT = 10
+WARM_CLIENTS_ON_STARTUP = True
+
+# Responses
+# Stream the answer text as soon as the model starts generating it
+STREAM_RESPONSES = True
+# Start the no-tool answer while the tool decision is still running.
+# It saves the decision time on turns without tools, but every tool turn also pays for a discarded
+# general model call, about doubling its general model requests and tokens. Off by default.
+SPECULATIVE_ANSWER = False
+
+# Tool routing
+# Decide clear-cut tool use locally, the decision model is only asked when the router is unsure
+LOCAL_ROUTER = True
+ROUTER_CONFIDENCE_THRESHOLD = 0.8
+# Fraction of local decisions also sent to the decision model, to compare the two in the router log
+ROUTER_AUDIT_RATE = 0.05
+ROUTER_LOG_PATH = "./work_dir/router_decisions.jsonl"
+
+# Model cascade
+# Short, simple turns are answered by the fast model, the rest by the general model
+MODEL_CASCADE = True
+# Longest request in words still considered simple
+CASCADE_MAX_WORDS = 20
+# Longest tool output of the turn in characters still considered simple, e.g. the time or the weather
+CASCADE_MAX_TOOL_CHARS = 1500
+# The fast model's answer is replaced by the general model's when it reports a lower confidence
+CASCADE_MIN_CONFIDENCE = 0.7
+CASCADE_LOG_PATH = "./work_dir/cascade_decisions.jsonl"
+
+# Single pass tool selection
+# One tool_choice="auto" request either answers or calls tools, replacing the decision call.
+# Enabled per provider, as some handle automatic tool choice better than others
+AUTO_TOOL_CHOICE_PROVIDERS = {
+    "default": False,
+    "cerebras": False,
+    "openrouter": False,
+    "groq": True,
+}
+
+# Tool execution
+# Tool calls in the same turn run concurrently, each with its own timeout in seconds.
+# A timed out call keeps its worker until the tool returns.
+TOOL_MAX_WORKERS = 4
+TOOL_TIMEOUT = 30
+TOOL_TIMEOUTS = {
+    "deepSearch": 180,
+    "analyseScreen": 60,
+    "webcamCapture": 60,
+    "codeAgent": 90,
+    "discuss_file": 60,
+}
+
+# Tool output caps
+# Tool outputs longer than their cap in characters (about 4 per token) are cut down to the passages
+# most relevant to the request, the full output stays readable by handle with fetchToolOutput
+TOOL_OUTPUT_MAX_CHARS = 4000
+TOOL_OUTPUT_CAPS = {
+    "deepSearch": 8000,
+    "read_file": 6000,
+    "fetchToolOutput": 4000,
+}
+# Number of full outputs kept for fetchToolOutput
+TOOL_OUTPUT_STORE_SIZE = 32
+
+# Web scraping
+# deepSearch scrapes the search results concurrently with the pooled browsers, this many pages at a time
+SCRAPER_CONCURRENCY = 3
+# Seconds a single page may take to scrape and extract before it is skipped
+SCRAPER_URL_TIMEOUT = 45
+# Headless browsers kept running between scrapes, each replaced after this many pages to cap its memory
+BROWSER_POOL_SIZE = 1
+BROWSER_RECYCLE_PAGES = 50
+# Elements left out of the scraped pages
+SCRAPER_EXCLUDED_TAGS = ["form", "header", "footer", "script", "style", "nav", "img", "a"]
+# Pages are first fetched with a plain HTTP GET, and only rendered in the browser if that finds no content
+STATIC_FETCH = True
+FETCHER_TIMEOUT = 10
+# Bytes of a page read by the plain fetch, and the characters of content below which the browser is used
+FETCHER_MAX_BYTES = 2_000_000
+FETCHER_MIN_CHARS = 500
+# Domains whose plain fetches succeed less often than this, over at least this many pages, go straight to the browser
+FETCHER_MIN_SUCCESS_RATE = 0.2
+FETCHER_MIN_ATTEMPTS = 3
+# "local" ranks the passages of a page against the query with BM25, without model calls.
+# "llm" has the scraper model filter and extract every page, slower and paid, for the best quality
+SCRAPER_EXTRACTION_MODE = "local"
+# Characters and passages kept per page in the local mode
+SCRAPER_LOCAL_MAX_CHARS = 3000
+SCRAPER_LOCAL_TOP_K = 6
+# Scraped pages are cached on disk by URL, and the content extracted from them by URL and query
+PAGE_CACHE = True
+PAGE_CACHE_PATH = "./work_dir/page_cache"
+# Seconds a cached page stays valid, and the cache size above which the least recently used entries are removed
+PAGE_CACHE_TTL = 86400
+PAGE_CACHE_MAX_BYTES = 200_000_000
+
+# Agent loop
+# The tool model keeps calling tools on their results until done, within these budgets
+AGENT_MAX_STEPS = 4
+AGENT_TIME_BUDGET = 120
+
+# Conversation context
+# Token budget for the conversation sent with every request, the system prompt comes on top of it
+CONTEXT_TOKEN_BUDGET = 8000
+# Number of latest turns whose tool outputs and responses are kept in full
+CONTEXT_KEEP_RECENT_TURNS = 3
+CONTEXT_TOOL_DIGEST_CHARS = 500
+# Fraction of the budget at which the oldest turns are summarised in the background
+CONTEXT_SUMMARY_THRESHOLD = 0.75
+
+# Tool subset selection
+# Only offer the tool categories relevant to the turn, based on the request and the recently used tools
+TOOL_SUBSET_SELECTION = True
+TOOL_SUBSET_RECENT_TURNS = 2
+
+# Server
+# Entry point hosting many sessions at once, see server.py
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8080
+# Turns answered at once, and turns allowed to wait for a slot before the server answers 503
+SERVER_MAX_CONCURRENT_TURNS = 16
+SERVER_MAX_QUEUED_TURNS = 64
+SERVER_QUEUE_TIMEOUT = 30
+SERVER_RETRY_AFTER = 5
+# Seconds of inactivity after which a session is dropped
+SERVER_SESSION_TTL = 1800
+
+# Response cache
+# Answers to repeated general knowledge questions are served from memory, opt-in.
+# Turns that used tools, depend on the time or refer to earlier turns are never cached
+RESPONSE_CACHE = False
+RESPONSE_CACHE_SIZE = 256
+# Seconds an answer stays valid
+RESPONSE_CACHE_TTL = 3600
+# Minimum trigram similarity for a reworded question to match a cached one,
+# which must also have the same content words in the same order
+RESPONSE_CACHE_THRESHOLD = 0.8
+
+# Provider routing
+# Fallback endpoints of every role as (base_url, api_key, model), used when the primary fails with 429/5xx or is slow
+PROVIDER_FALLBACKS = {
+    "general": [(os.getenv("GROQ_BASE_URL"), os.getenv("GROQ_API_KEY"), "llama-3.3-70b-versatile")],
+    "fast": [(os.getenv("GROQ_BASE_URL"), os.getenv("GROQ_API_KEY"), "llama-3.1-8b-instant")],
+    "decision": [(os.getenv("GROQ_BASE_URL"), os.getenv("GROQ_API_KEY"), "llama-3.3-70b-versatile")],
+    "tool": [(os.getenv("GROQ_BASE_URL"), os.getenv("GROQ_API_KEY"), "llama-3.3-70b-versatile")],
+    "summarisation": [(os.getenv("GROQ_BASE_URL"), os.getenv("GROQ_API_KEY"), "llama-3.1-8b-instant")],
+}
+# Send a duplicate request to the next endpoint once the first one takes longer than its p95 latency
+HEDGE_REQUESTS = True
+# Lower bound of the hedge delay in seconds, and the number of latencies needed before hedging
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MIN_SAMPLES = 20
+# Number of latest requests kept per provider and model
+LATENCY_WINDOW = 200
+# Seconds a provider is skipped after a 429/5xx, unless it sent a Retry-After
+PROVIDER_COOLDOWN = 30
+
+# Rate limits
+# Client side requests per minute and burst size, per "provider/model", "provider" or "default", None is unlimited
+RATE_LIMITS = {
+    "default": None,
+    "cerebras": {"requests_per_minute": 30, "burst": 10},
+    "openrouter": {"requests_per_minute": 20, "burst": 5},
+    "groq": {"requests_per_minute": 30, "burst": 10},
+}
+# Longest time a request waits for its turn before failing over or failing
+RATE_LIMIT_MAX_WAIT = 60
+# Seconds to back off after a 429 without Retry-After, and how often a rate limited request is retried
+RATE_LIMIT_BACKOFF = 10
+RATE_LIMIT_RETRIES = 2
+# Model requests reserved for every page crawl4ai extracts
+SCRAPER_CALLS_PER_PAGE = 2
+
+# Cassette
+# "record" saves every model and tool HTTP response to the cassette, "replay" answers from it offline, "off" does neither
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "./work_dir/cassettes/default.jsonl")
+# Replay with the "recorded" latencies, or with "zero" latency to measure the assistant's own overhead
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "recorded")
+
+# Tracing
+# Spans of every voice turn, from the wake word to the first audio played, see "python tracing.py report"
+TRACING = True
+TRACE_PATH = "./work_dir/traces/turns.jsonl"
+TRACE_MAX_BYTES = 5_000_000
+TRACE_BACKUPS = 3
+
+# Startup
+# Import the tool implementations in the background once the REPL is up, instead of on the first tool call
+PRELOAD_TOOLS = True
+# Start a pooled browser at boot, so the first web search does not wait seconds for it
+PRELOAD_BROWSER = False
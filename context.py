@@ -0,0 +1,236 @@
+import functools
+import threading
+from typing import Dict
+
+import provider_router
+from config import *
+from rate_limiter import BACKGROUND
+from tool_output import handles_note, output_handles
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+# Tokens added by the chat format for every message
+MESSAGE_OVERHEAD = 4
+
+
+# Get the tokenizer, loaded on first use as it slows down startup
+@functools.cache
+def get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except ImportError:
+        return None
+
+# Count the tokens in a text
+@functools.lru_cache(maxsize=4096)
+def count_text_tokens(text: str) -> int:
+    """
+    Count the tokens in a text, estimating 4 characters per token when tiktoken is not installed.
+    """
+    if (encoding := get_encoding()) is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+# Count the tokens in a message
+def count_tokens(message: dict) -> int:
+    tokens = MESSAGE_OVERHEAD + count_text_tokens(str(message.get("content") or ""))
+    for tool in message.get("tool_calls") or []:
+        tokens += count_text_tokens(tool["function"]["name"] + tool["function"]["arguments"])
+    return tokens
+
+# Count the tokens in a conversation
+def count_conversation_tokens(conversation: list[Dict[str, str]]) -> int:
+    return sum(count_tokens(message) for message in conversation)
+
+# Split a conversation into turns
+def split_turns(conversation: list[Dict[str, str]]) -> tuple[list[dict], list[list[dict]]]:
+    """
+    Split the conversation into its system messages and its turns.
+    A turn starts at a user message and holds everything up to the next one, so tool calls
+    always stay together with their results.
+
+    Returns:
+        tuple: The system messages and the list of turns.
+    """
+    system = []
+    turns: list[list[dict]] = []
+    for message in conversation:
+        if message.get("role") == "system":
+            system.append(message)
+        elif message.get("role") == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return system, turns
+
+# Shorten a tool output to a digest
+def digest_tool_output(content: str, max_chars: int = CONTEXT_TOOL_DIGEST_CHARS) -> str:
+    """
+    Shorten a tool output, keeping the handles of stored outputs it mentions, which are at its end.
+    """
+    if len(content) <= max_chars:
+        return content
+    digest = f"{content[:max_chars].rstrip()}\n... [tool output shortened, {len(content)} characters in total]"
+    if handles := output_handles(content):
+        digest += f"\n{handles_note(handles)}"
+    return digest
+
+# Shorten a formatted agent response to its spoken answer
+def digest_assistant_output(content: str) -> str:
+    if not content.startswith("Assistant Response:\n---\n"):
+        return content
+    answer = content.removeprefix("Assistant Response:\n---\n")
+    for section in ("\nPoints:\n", "\nCode:\n", "\nSources:\n"):
+        answer = answer.split(section)[0]
+    return answer.strip()
+
+# Get the handles of the stored tool outputs a summary replaces
+def summary_handles(job: dict) -> list[str]:
+    texts = [job["previous"]["content"]] if job["previous"] else []
+    texts += [str(message.get("content") or "") for message in job["messages"] if message.get("role") == "tool"]
+    return output_handles("\n".join(texts))
+
+
+class ContextManager:
+    """
+    Keeps conversations within a token budget.
+    Old tool outputs and agent responses are shortened in place, and once the conversation grows
+    past the summary threshold the oldest turns are summarised in the background into a rolling
+    summary. System messages are never dropped.
+    """
+
+    def __init__(
+            self,
+            budget: int = CONTEXT_TOKEN_BUDGET,
+            keep_recent_turns: int = CONTEXT_KEEP_RECENT_TURNS,
+            summary_threshold: float = CONTEXT_SUMMARY_THRESHOLD,
+        ):
+        self.budget = budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_threshold = summary_threshold
+
+        self._lock = threading.Lock()
+        # Summaries being generated, keyed by the id of the conversation
+        self._pending: dict[int, dict] = {}
+
+    def compact(self, conversation: list[Dict[str, str]]):
+        """
+        Shrink the conversation in place. Call this once per turn, before the new request is answered.
+
+        Args:
+            conversation (list): The conversation history.
+        """
+        system, turns = split_turns(conversation)
+        old_turns = turns[:-self.keep_recent_turns] if self.keep_recent_turns else turns
+
+        # Tool outputs and verbose agent responses are only kept in full for the recent turns
+        for turn in old_turns:
+            for message in turn:
+                content = message.get("content")
+                if not isinstance(content, str):
+                    continue
+                if message.get("role") == "tool":
+                    message["content"] = digest_tool_output(content)
+                elif message.get("role") == "assistant":
+                    message["content"] = digest_assistant_output(content)
+
+        self._apply_summary(conversation)
+
+        if count_conversation_tokens(conversation) > self.budget * self.summary_threshold:
+            self._start_summary(conversation)
+
+    def fit(self, conversation: list[Dict[str, str]]) -> list[Dict[str, str]]:
+        """
+        Get the messages to send, dropping the oldest turns while the conversation is over budget.
+        System messages and the latest turn are always kept.
+
+        Args:
+            conversation (list): The conversation history.
+
+        Returns:
+            list: The messages within the budget, in their original order.
+        """
+        if count_conversation_tokens(conversation) <= self.budget:
+            return conversation
+
+        system, turns = split_turns(conversation)
+        tokens = count_conversation_tokens(conversation)
+        dropped = set()
+        for turn in turns[:-1]:
+            if tokens <= self.budget:
+                break
+            tokens -= count_conversation_tokens(turn)
+            dropped.update(id(message) for message in turn)
+
+        print(f"Context over budget, sending {len(conversation) - len(dropped)} of {len(conversation)} messages")
+        return [message for message in conversation if id(message) not in dropped]
+
+    def _start_summary(self, conversation: list[Dict[str, str]]):
+        system, turns = split_turns(conversation)
+        old_turns = turns[:-self.keep_recent_turns] if self.keep_recent_turns else turns
+        messages = [message for turn in old_turns for message in turn]
+        if not messages:
+            return
+
+        with self._lock:
+            if id(conversation) in self._pending:
+                return
+            summary = next((message for message in system if str(message.get("content")).startswith(SUMMARY_PREFIX)), None)
+            job = {"messages": messages, "previous": summary, "summary": None}
+            self._pending[id(conversation)] = job
+
+        threading.Thread(target=self._summarise, args=(job,), daemon=True).start()
+
+    def _summarise(self, job: dict):
+        transcript = ""
+        if job["previous"]:
+            transcript += job["previous"]["content"].removeprefix(SUMMARY_PREFIX) + "\n\n"
+        for message in job["messages"]:
+            transcript += f"{message['role']}: {message.get('content') or ''}\n"
+
+        try:
+            job["summary"] = provider_router.router.chat(
+                "summarisation",
+                priority=BACKGROUND,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "Summarise the conversation below into a short running summary. Keep the user's goals, preferences, decisions, facts and results of tool use that may matter later. Write plain text, no preamble.",
+                    },
+                    {"role": "user", "content": transcript},
+                ],
+            ).choices[0].message.content
+        except Exception as e:
+            print(f"Error summarising the conversation: {e}")
+            job["summary"] = ""
+
+    def _apply_summary(self, conversation: list[Dict[str, str]]):
+        with self._lock:
+            job = self._pending.get(id(conversation))
+            if job is None or job["summary"] is None:
+                return
+            del self._pending[id(conversation)]
+
+        # The conversation may have been cleared or changed while the summary was generated
+        remaining = [message for message in conversation if message.get("role") != "system"]
+        summarised = job["messages"]
+        if not job["summary"] or any(a is not b for a, b in zip(remaining, summarised)) or len(remaining) < len(summarised):
+            return
+
+        summarised_ids = {id(message) for message in summarised}
+        if job["previous"] is not None:
+            summarised_ids.add(id(job["previous"]))
+        content = SUMMARY_PREFIX + job["summary"].strip()
+        # The stored tool outputs stay readable after the messages naming them are summarised
+        if handles := summary_handles(job):
+            content += f"\n\n{handles_note(handles)}"
+        summary = {"role": "system", "content": content}
+
+        kept = [message for message in conversation if id(message) not in summarised_ids]
+        index = next((index for index, message in enumerate(kept) if message.get("role") != "system"), len(kept))
+        kept.insert(index, summary)
+        conversation[:] = kept
+        print(f"Summarised {len(summarised)} earlier messages")
+
+
+manager = ContextManager()
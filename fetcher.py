@@ -0,0 +1,224 @@
+import asyncio
+import codecs
+import json
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+from cassette import http_session
+from config import *
+from metrics import metrics
+
+# Block elements turned into lines of the page markdown
+BLOCK_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote", "td", "th"]
+# Text of pages that only render with JavaScript
+JAVASCRIPT_PATTERN = re.compile(r"(enable|requires?|turn on) javascript|javascript is (required|disabled)", re.IGNORECASE)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en",
+}
+
+
+# Find the main content of a page
+def main_content(soup):
+    """
+    Find the element holding the main content of a page, readability style: an article or main
+    element with enough text, otherwise the element whose direct paragraphs hold the most text.
+    """
+    for candidate in (soup.find("article"), soup.find("main"), soup.find(attrs={"role": "main"})):
+        if candidate is not None and len(candidate.get_text(" ", strip=True)) >= FETCHER_MIN_CHARS:
+            return candidate
+
+    # Paragraphs count fully for their parent and half for their grandparent
+    scores, elements = Counter(), {}
+    for paragraph in soup.find_all("p"):
+        length = len(paragraph.get_text(" ", strip=True))
+        if length < 25:
+            continue
+        for element, weight in ((paragraph.parent, 1.0), (paragraph.parent and paragraph.parent.parent, 0.5)):
+            if element is not None:
+                scores[id(element)] += length * weight
+                elements[id(element)] = element
+
+    if not scores:
+        return soup.body or soup
+    return elements[scores.most_common(1)[0][0]]
+
+# Check if a block is nested in another block below the root
+def nested_block(element, root) -> bool:
+    for parent in element.parents:
+        if parent is root:
+            return False
+        if parent.name in BLOCK_TAGS:
+            return True
+    return False
+
+# Convert the main content of a page to markdown
+def to_markdown(root) -> str:
+    lines = []
+    for element in root.find_all(BLOCK_TAGS):
+        # Nested blocks, e.g. a paragraph in a list item, are part of their outermost block
+        if nested_block(element, root):
+            continue
+        if element.name == "pre":
+            lines.append(f"```\n{element.get_text().strip()}\n```")
+            continue
+        text = " ".join(element.get_text(" ", strip=True).split())
+        if not text:
+            continue
+        if element.name[0] == "h" and element.name[1:].isdigit():
+            text = f"{'#' * int(element.name[1:])} {text}"
+        elif element.name == "li":
+            text = f"- {text}"
+        elif element.name == "blockquote":
+            text = f"> {text}"
+        lines.append(text)
+    return "\n\n".join(lines)
+
+# Extract the main content of an HTML page
+def extract_page(html: str) -> tuple[str, str]:
+    """
+    Extract the main content of a page, without the tags the scraper excludes.
+
+    Returns:
+        tuple: The HTML and the markdown of the main content.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "template", "svg", "iframe"]):
+        tag.decompose()
+    root = main_content(soup)
+    for tag in root(SCRAPER_EXCLUDED_TAGS):
+        tag.decompose()
+    return str(root), to_markdown(root)
+
+
+class Fetcher:
+    """
+    First tier of the scraper: a plain HTTP GET on the pooled session, reading at most max_bytes,
+    with the main content extracted locally. Pages that come back empty or need JavaScript are left
+    to the browser. The tier that got every page is counted per domain, and domains where the plain
+    fetch keeps failing go straight to the browser.
+    """
+
+    def __init__(self, max_bytes: int = FETCHER_MAX_BYTES, timeout: float = FETCHER_TIMEOUT, enabled: bool = STATIC_FETCH):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.enabled = enabled
+        self.domains: dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def record(self, url: str, tier: str):
+        """
+        Count the outcome of a page for its domain: static, static_failed, browser or failed.
+        """
+        with self._lock:
+            self.domains.setdefault(urlsplit(url).hostname or "", Counter())[tier] += 1
+        metrics.increment(f"fetcher.{tier}")
+
+    def use_static(self, url: str) -> bool:
+        """
+        Check if the plain fetch is worth trying for the domain of a URL.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            stats = self.domains.get(urlsplit(url).hostname or "", Counter())
+        attempts = stats["static"] + stats["static_failed"]
+        return attempts < FETCHER_MIN_ATTEMPTS or stats["static"] / attempts >= FETCHER_MIN_SUCCESS_RATE
+
+    def fetch(self, url: str, cancelled: threading.Event | None = None) -> dict | None:
+        """
+        Fetch a page with a plain HTTP GET and extract its main content.
+
+        Args:
+            url (str): The URL of the page.
+            cancelled (threading.Event): Set when the caller gave up, the download stops at its next chunk.
+
+        Returns:
+            dict: The HTML and markdown of the main content, None if the page needs the browser.
+        """
+        import requests
+
+        try:
+            with http_session().get(url, headers=HEADERS, timeout=self.timeout, stream=True) as response:
+                content_type = response.headers.get("content-type", "")
+                if response.status_code != 200 or "html" not in content_type:
+                    print(f"Plain fetch of {url} got {response.status_code} {content_type}")
+                    self.record(url, "static_failed")
+                    return None
+
+                body = b""
+                for chunk in response.iter_content(chunk_size=65536):
+                    if cancelled is not None and cancelled.is_set():
+                        print(f"Plain fetch of {url} cancelled")
+                        return None
+                    body += chunk
+                    if len(body) >= self.max_bytes:
+                        print(f"Plain fetch of {url} cut off at {len(body)} bytes")
+                        break
+                encoding = (response.encoding if "charset" in content_type.lower() else None) or "utf-8"
+        except requests.exceptions.RequestException as e:
+            print(f"Plain fetch of {url} failed: {e}")
+            self.record(url, "static_failed")
+            return None
+        except Exception as e:
+            # Any other failure, e.g. of a replayed or malformed response, leaves the page to the browser
+            print(f"Plain fetch of {url} failed unexpectedly: {e!r}")
+            self.record(url, "static_failed")
+            return None
+
+        # The charset comes from the server, an unknown one is read as utf-8
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            print(f"Plain fetch of {url} has an unknown charset {encoding}, reading it as utf-8")
+            encoding = "utf-8"
+        try:
+            html, markdown = extract_page(body.decode(encoding, errors="replace"))
+        except Exception as e:
+            print(f"Error extracting {url}: {e!r}")
+            self.record(url, "static_failed")
+            return None
+        if len(markdown) < FETCHER_MIN_CHARS or (len(markdown) < 4 * FETCHER_MIN_CHARS and JAVASCRIPT_PATTERN.search(markdown)):
+            print(f"Plain fetch of {url} found no content, using the browser")
+            self.record(url, "static_failed")
+            return None
+
+        self.record(url, "static")
+        return {"url": url, "html": html, "markdown": markdown}
+
+    async def fetch_async(self, url: str) -> dict | None:
+        """
+        Fetch a page without blocking the event loop, None if the page needs the browser.
+        The fetch runs in a thread, cancelling the caller stops its download at the next chunk.
+        """
+        if not self.use_static(url):
+            return None
+        cancelled = threading.Event()
+        try:
+            return await asyncio.to_thread(self.fetch, url, cancelled)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    def stats(self) -> dict:
+        """
+        Get the number of pages each tier got, per domain.
+        """
+        with self._lock:
+            return {domain: dict(tiers) for domain, tiers in sorted(self.domains.items())}
+
+
+fetcher = Fetcher()
+
+if __name__ == "__main__":
+    import sys
+
+    for url in sys.argv[1:]:
+        page = fetcher.fetch(url)
+        print(page["markdown"][:2000] if page else "Needs the browser.")
+    print(json.dumps(fetcher.stats(), indent=2))
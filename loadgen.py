@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+from aiohttp import ClientSession, web
+
+# Sample requests sent by the virtual users, answered without tools by the local router
+PROMPTS = [
+    "hello there",
+    "thanks a lot",
+    "how are you doing today",
+    "tell me a joke",
+    "what can you do",
+]
+
+# Response returned by the mock provider, valid both as a tool decision and as an agent response
+MOCK_RESPONSE = {
+    "decision": "false",
+    "assistant_response": "This is a mocked answer from the load test provider, streamed in small pieces.",
+    "code": "",
+    "error": "",
+    "points": [],
+    "sources": [],
+}
+
+
+class MockProvider:
+    """
+    OpenAI compatible provider answering every chat completion with MOCK_RESPONSE after a configurable latency.
+    Streamed answers are sent as server-sent events, one chunk every chunk_delay seconds.
+    """
+
+    def __init__(self, latency: float = 0.3, chunk_delay: float = 0.02, chunk_size: int = 8):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.requests = 0
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/v1/chat/completions", self.chat_completions),
+            web.get("/v1/models", self.models),
+        ])
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        content = json.dumps(MOCK_RESPONSE)
+        completion = {"id": f"mock-{self.requests}", "created": int(time.time()), "model": body.get("model", "mock")}
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+
+        if not body.get("stream"):
+            return web.json_response({
+                **completion,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for start in range(0, len(content), self.chunk_size):
+            chunk = {
+                **completion,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "finish_reason": None, "delta": {"content": content[start:start + self.chunk_size]}}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.chunk_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+def percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+async def virtual_user(http: ClientSession, server_url: str, turns: int, latencies: list[float], errors: dict):
+    """
+    Open a session and send a number of turns one after the other, recording the latency of every turn.
+    """
+    async with http.post(f"{server_url}/sessions", json={}) as response:
+        session_id = (await response.json())["session_id"]
+
+    for _ in range(turns):
+        start = time.perf_counter()
+        async with http.post(f"{server_url}/sessions/{session_id}/turns", json={"text": random.choice(PROMPTS)}) as response:
+            await response.read()
+            if response.status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[response.status] = errors.get(response.status, 0) + 1
+
+    await http.delete(f"{server_url}/sessions/{session_id}")
+
+
+async def main(args):
+    # The providers have to point at the mock before the config is imported
+    mock_url = f"http://127.0.0.1:{args.mock_port}/v1"
+    for provider in ("CEREBRAS", "OPENROUTER", "GROQ"):
+        os.environ[f"{provider}_BASE_URL"] = mock_url
+        os.environ[f"{provider}_API_KEY"] = "mock"
+
+    from server import AssistantServer, TurnLimiter
+
+    mock = MockProvider(latency=args.latency)
+    server = AssistantServer(limiter=TurnLimiter(args.max_concurrent, args.max_queued))
+    runners = []
+    for app, port in ((mock.app, args.mock_port), (server.app, args.port)):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        runners.append(runner)
+
+    server_url = f"http://127.0.0.1:{args.port}"
+    latencies: list[float] = []
+    errors: dict[int, int] = {}
+    start = time.perf_counter()
+    async with ClientSession() as http:
+        await asyncio.gather(*(virtual_user(http, server_url, args.turns, latencies, errors) for _ in range(args.users)))
+        async with http.get(f"{server_url}/health") as response:
+            health = await response.json()
+    elapsed = time.perf_counter() - start
+
+    for runner in reversed(runners):
+        await runner.cleanup()
+
+    print(f"Users: {args.users}, turns per user: {args.turns}, provider latency: {args.latency}s")
+    print(f"Completed {len(latencies)} turns in {elapsed:.2f}s ({len(latencies) / elapsed:.2f} turns/s)")
+    if latencies:
+        print(f"Latency p50: {percentile(latencies, 50):.3f}s  p95: {percentile(latencies, 95):.3f}s  p99: {percentile(latencies, 99):.3f}s  mean: {statistics.mean(latencies):.3f}s")
+    if errors:
+        print(f"Errors: {errors}")
+    print(f"Provider requests: {mock.requests}, server: {health}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the assistant server against a mocked provider.")
+    parser.add_argument("--users", type=int, default=20, help="Number of concurrent virtual users.")
+    parser.add_argument("--turns", type=int, default=5, help="Number of turns per user.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mean latency of the mocked provider, in seconds.")
+    parser.add_argument("--max-concurrent", type=int, default=16, help="Turns answered at once by the server.")
+    parser.add_argument("--max-queued", type=int, default=64, help="Turns allowed to wait before the server answers 503.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mock-port", type=int, default=8766)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,34 @@
+import threading
+from collections import Counter
+
+
+class Metrics:
+    """
+    Process wide counters, e.g. cache hits and misses. They live in memory only,
+    the server reports them at /health.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Counter[str] = Counter()
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name: str) -> int:
+        return self._counters[name]
+
+    def snapshot(self, prefix: str = "") -> dict[str, int]:
+        """
+        Get the current value of the counters, optionally only those starting with a prefix.
+        """
+        with self._lock:
+            return {name: value for name, value in sorted(self._counters.items()) if name.startswith(prefix)}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = Metrics()
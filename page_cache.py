@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config import *
+from metrics import metrics
+
+# Query parameters that only track the visitor, dropped from the canonical URL.
+# Only the utm_ family is matched by prefix, e.g. reference= or refresh= are part of the page.
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src"}
+
+# Eviction frees the cache down to this share of its size limit, so the next writes do not scan it again
+EVICT_TO = 0.9
+
+
+# Check if a query parameter only tracks the visitor
+def tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+# Get the canonical form of a URL
+def canonical_url(url: str) -> str:
+    """
+    Normalise a URL so the same page gets the same cache key: lowercase scheme and host,
+    no default port, fragment or tracking parameters, sorted query parameters and no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host += f":{parts.port}"
+    params = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not tracking_param(key))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(params), ""))
+
+# Normalise a query
+def normalise_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class PageCache:
+    """
+    On-disk cache of scraped pages, content addressed by the hash of their key.
+    The page itself is cached by its canonical URL, the output extracted from it by URL and query,
+    so a new question about a cached page only redoes the extraction. Entries expire after the TTL,
+    and the least recently used ones are removed once the cache grows past its size limit.
+    The size is counted on every write, the cache directory is only scanned when it is first written
+    and when the size limit is crossed.
+    """
+
+    def __init__(self, path: str = PAGE_CACHE_PATH, ttl: float = PAGE_CACHE_TTL, max_bytes: int = PAGE_CACHE_MAX_BYTES, enabled: bool = PAGE_CACHE):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # Total size of the entries, None until the cache directory was scanned
+        self._size: int | None = None
+
+    def _file(self, kind: str, key: str) -> Path:
+        return self.path / kind / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _read(self, kind: str, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+        file = self._file(kind, key)
+        try:
+            stat = file.stat()
+            if time.time() - stat.st_mtime > self.ttl:
+                file.unlink(missing_ok=True)
+                self._resize(-stat.st_size)
+                metrics.increment(f"page_cache.{kind}.expired")
+                return None
+            with open(file, mode="r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            metrics.increment(f"page_cache.{kind}.misses")
+            return None
+
+        # Reading an entry marks it as recently used, the TTL counts from when it was written
+        try:
+            os.utime(file, (time.time(), file.stat().st_mtime))
+        except OSError:
+            pass
+        metrics.increment(f"page_cache.{kind}.hits")
+        return entry
+
+    def _write(self, kind: str, key: str, entry: dict):
+        if not self.enabled:
+            return
+        file = self._file(kind, key)
+        try:
+            replaced = file.stat().st_size
+        except OSError:
+            replaced = 0
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            temporary = file.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(temporary, mode="w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temporary, file)
+            written = file.stat().st_size
+        except OSError as e:
+            print(f"Error writing page cache: {e}")
+            return
+        if self._resize(written - replaced):
+            self.evict()
+
+    # Count a change in the size of the cache, returns whether it is over its size limit
+    def _resize(self, delta: int) -> bool:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += delta
+            return self._size > self.max_bytes
+
+    # Get the unexpired entries as (last used, size, file), expired ones are removed
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        files = []
+        for file in self.path.glob("*/*.json"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            if time.time() - stat.st_mtime > self.ttl:
+                file.unlink(missing_ok=True)
+                continue
+            files.append((stat.st_atime, stat.st_size, file))
+        return files
+
+    def evict(self):
+        """
+        Remove the expired entries, then the least recently used ones until the cache is back under EVICT_TO of its size limit.
+        """
+        with self._lock:
+            files = self._entries()
+            size = sum(file_size for _, file_size, _ in files)
+            for _, file_size, file in sorted(files, key=lambda item: item[0]):
+                if size <= self.max_bytes * EVICT_TO:
+                    break
+                file.unlink(missing_ok=True)
+                size -= file_size
+                metrics.increment("page_cache.evictions")
+            # The scan also corrects the counted size, e.g. for entries removed by another process
+            self._size = size
+
+    def get_page(self, url: str) -> dict | None:
+        """
+        Get a cached page by URL, with its cleaned HTML and raw markdown.
+        """
+        return self._read("pages", canonical_url(url))
+
+    def put_page(self, url: str, html: str, markdown: str):
+        self._write("pages", canonical_url(url), {"url": url, "html": html, "markdown": markdown, "time": time.time()})
+
+    def get_extract(self, url: str, query: str) -> str | None:
+        """
+        Get the content extracted from a page for a query.
+        """
+        entry = self._read("extracts", f"{canonical_url(url)}\n{normalise_query(query)}")
+        return entry["content"] if entry else None
+
+    def put_extract(self, url: str, query: str, content: str):
+        self._write("extracts", f"{canonical_url(url)}\n{normalise_query(query)}", {"url": url, "query": query, "content": content, "time": time.time()})
+
+    def stats(self) -> dict:
+        """
+        Get the number and size of the cached pages and extracts.
+        """
+        stats = {}
+        for kind in ("pages", "extracts"):
+            sizes = [file.stat().st_size for file in (self.path / kind).glob("*.json")]
+            stats[kind] = {"entries": len(sizes), "bytes": sum(sizes)}
+        return stats
+
+
+cache = PageCache()
+
+if __name__ == "__main__":
+    print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,338 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import deque
+
+import openai
+
+from clients import get_async_client, get_client, provider_name
+from config import *
+from metrics import metrics
+from rate_limiter import INTERACTIVE, RateLimitTimeout, limiter
+
+# Primary endpoint of every role: (base_url, api_key, model)
+ROLE_ENDPOINTS = {
+    "general": (GENERAL_BASE_URL, GENERAL_API_KEY, GENERAL_MODEL),
+    "fast": (FAST_BASE_URL, FAST_API_KEY, FAST_MODEL),
+    "decision": (DECISION_BASE_URL, DECISION_API_KEY, DECISION_MODEL),
+    "tool": (TOOL_BASE_URL, TOOL_API_KEY, TOOL_MODEL),
+    "summarisation": (SUMMARISATION_BASE_URL, SUMMARISATION_API_KEY, SUMMARISATION_MODEL),
+}
+
+
+# Check if an error should be retried on another provider
+def is_failover_error(error: BaseException) -> bool:
+    """
+    Rate limits, server errors, timeouts and connection failures are retried on the next provider,
+    as are requests that would wait too long for the client side rate limiter.
+    Other errors, e.g. invalid requests, would fail the same way everywhere.
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, RateLimitTimeout)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+# Get the Retry-After delay of an error
+def retry_after(error: BaseException) -> float | None:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+# Close a streamed response that lost the race
+def close_response(response):
+    if hasattr(response, "close"):
+        try:
+            response.close()
+        except Exception:
+            pass
+
+async def close_response_async(response):
+    if hasattr(response, "close"):
+        try:
+            await response.close()
+        except Exception:
+            pass
+
+
+class EndpointStats:
+    """
+    Rolling latency and error history of one provider and model.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.cooldown_until = 0.0
+
+    def record(self, latency: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    def record_censored(self, latency: float):
+        """
+        Record a request cancelled before it answered, which would have taken at least this long.
+        It only counts when it is slower than the p95, so it can raise the latency estimate but never lower it.
+        """
+        p95 = self.percentile(95)
+        if p95 is not None and latency > p95:
+            self.latencies.append(latency)
+
+    def percentile(self, percent: float) -> float | None:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(percent / 100 * len(latencies)))]
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def summary(self) -> dict:
+        return {
+            "requests": len(self.outcomes),
+            "error_rate": round(self.error_rate, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "cooling_down": self.cooling_down,
+        }
+
+
+class ProviderRouter:
+    """
+    Routes the chat completions of a role across its primary and fallback providers.
+
+    Endpoints that recently answered 429/5xx are skipped for a cooldown, and failed requests fail over
+    to the next endpoint right away. When the first endpoint takes longer than its p95 latency, a hedged
+    duplicate request is sent to the next one and whichever answers first is used. For streamed requests
+    the latency is the time until the response starts. Every request first waits for the rate limiter.
+    A request running in a worker thread cannot be cancelled, so the sync API only hedges streamed
+    requests, whose losing stream is closed as soon as it starts. The async API hedges every request.
+    """
+
+    def __init__(self, fallbacks: dict = PROVIDER_FALLBACKS, hedge: bool = HEDGE_REQUESTS):
+        self.fallbacks = fallbacks
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._stats: dict[tuple[str, str], EndpointStats] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider")
+
+    def endpoints(self, role: str) -> list[tuple[str, str, str]]:
+        """
+        Get the endpoints of a role in the order to try them.
+        The primary comes first, endpoints cooling down or mostly failing are moved to the back.
+        """
+        endpoints = [ROLE_ENDPOINTS[role]] + [tuple(endpoint) for endpoint in self.fallbacks.get(role, [])]
+        endpoints = [endpoint for endpoint in dict.fromkeys(endpoints) if endpoint[0]]
+        return sorted(endpoints, key=lambda endpoint: (self.stats_for(endpoint).cooling_down, self.stats_for(endpoint).error_rate > 0.5))
+
+    def stats_for(self, endpoint: tuple[str, str, str]) -> EndpointStats:
+        key = (provider_name(endpoint[0], PROVIDER_LIMITS), endpoint[2])
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = EndpointStats()
+            return self._stats[key]
+
+    def hedge_delay(self, endpoint: tuple[str, str, str]) -> float | None:
+        """
+        Get the time after which a hedged request is sent, None before enough latencies are known.
+        """
+        if not self.hedge:
+            return None
+        p95 = self.stats_for(endpoint).percentile(95)
+        return None if p95 is None else max(p95, HEDGE_MIN_DELAY)
+
+    def _record(self, endpoint: tuple[str, str, str], started: float, error: BaseException | None = None):
+        stats = self.stats_for(endpoint)
+        stats.record(time.perf_counter() - started, error is None)
+        if isinstance(error, openai.RateLimitError):
+            limiter.backoff(endpoint[0], endpoint[2], retry_after(error))
+        if error is not None and is_failover_error(error):
+            stats.cooldown_until = time.monotonic() + (retry_after(error) or PROVIDER_COOLDOWN)
+            metrics.increment("provider_router.failovers")
+
+    def _call(self, endpoint: tuple[str, str, str], kwargs: dict, priority: int):
+        base_url, api_key, model = endpoint
+        limiter.acquire(base_url, model, priority)
+        started = time.perf_counter()
+        try:
+            # Retries are handled by failing over, not by the client
+            response = get_client(base_url, api_key).with_options(max_retries=0).chat.completions.create(model=model, **kwargs)
+        except Exception as e:
+            self._record(endpoint, started, e)
+            raise
+        self._record(endpoint, started)
+        return response
+
+    def chat(self, role: str, priority: int = INTERACTIVE, **kwargs):
+        """
+        Create a chat completion for a role, with failover and hedging.
+        When every endpoint is rate limited, the request is retried after the provider's Retry-After.
+
+        Args:
+            role (str): The role making the request, "general", "decision", "tool" or "summarisation".
+            priority (int): The rate limiter priority, INTERACTIVE or BACKGROUND.
+            **kwargs: The arguments of chat.completions.create, without the model.
+
+        Returns:
+            The chat completion, or the stream when streaming.
+        """
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                return self._chat(role, priority, kwargs)
+            except openai.RateLimitError as e:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                delay = min(retry_after(e) or RATE_LIMIT_BACKOFF, RATE_LIMIT_MAX_WAIT)
+                print(f"{role} request is rate limited, retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+    # Get the time after which the request in flight is hedged, None if it is not hedged
+    def _hedge_after(self, pending: dict, endpoints: list, tried: int, hedged: bool) -> float | None:
+        if hedged or tried >= len(endpoints):
+            return None
+        # After a failover the request in flight is no longer the first endpoint's
+        return self.hedge_delay(next(iter(pending.values())))
+
+    def _chat(self, role: str, priority: int, kwargs: dict):
+        endpoints = self.endpoints(role)
+        # A losing request that is not streamed would run to completion and be billed twice
+        hedgeable = bool(kwargs.get("stream"))
+        pending: dict[concurrent.futures.Future, tuple[str, str, str]] = {}
+        tried = 0
+        hedged = False
+        error = None
+
+        def launch():
+            nonlocal tried
+            pending[self._executor.submit(self._call, endpoints[tried], kwargs, priority)] = endpoints[tried]
+            tried += 1
+
+        launch()
+        while pending:
+            delay = self._hedge_after(pending, endpoints, tried, hedged) if hedgeable else None
+            done, _ = concurrent.futures.wait(pending, timeout=delay, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                print(f"{role} request is slow on {next(iter(pending.values()))[0]}, hedging on {endpoints[tried][0]}")
+                metrics.increment("provider_router.hedges")
+                hedged = True
+                launch()
+                continue
+
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    if not is_failover_error(e):
+                        raise
+                    print(f"{role} request failed on {endpoint[0]}: {e}")
+                    error = e
+                    if not pending and tried < len(endpoints):
+                        launch()
+                    continue
+
+                if endpoint != endpoints[0]:
+                    metrics.increment("provider_router.fallback_answers")
+                # The slower requests are left to finish in the background, their streams are closed
+                for other in pending:
+                    other.add_done_callback(lambda f: f.exception() is None and close_response(f.result()))
+                return response
+
+        raise error
+
+    async def _call_async(self, endpoint: tuple[str, str, str], kwargs: dict, priority: int):
+        base_url, api_key, model = endpoint
+        await limiter.acquire_async(base_url, model, priority)
+        started = time.perf_counter()
+        try:
+            response = await get_async_client(base_url, api_key).with_options(max_retries=0).chat.completions.create(model=model, **kwargs)
+        except asyncio.CancelledError:
+            # The request lost the race, it is neither a success nor a failure
+            self.stats_for(endpoint).record_censored(time.perf_counter() - started)
+            raise
+        except Exception as e:
+            self._record(endpoint, started, e)
+            raise
+        self._record(endpoint, started)
+        return response
+
+    async def chat_async(self, role: str, priority: int = INTERACTIVE, **kwargs):
+        """
+        Async counterpart of chat, the requests that lose the race are cancelled.
+        """
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                return await self._chat_async(role, priority, kwargs)
+            except openai.RateLimitError as e:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                delay = min(retry_after(e) or RATE_LIMIT_BACKOFF, RATE_LIMIT_MAX_WAIT)
+                print(f"{role} request is rate limited, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+    async def _chat_async(self, role: str, priority: int, kwargs: dict):
+        endpoints = self.endpoints(role)
+        pending: dict[asyncio.Task, tuple[str, str, str]] = {}
+        tried = 0
+        hedged = False
+        error = None
+
+        def launch():
+            nonlocal tried
+            pending[asyncio.create_task(self._call_async(endpoints[tried], kwargs, priority))] = endpoints[tried]
+            tried += 1
+
+        launch()
+        try:
+            while pending:
+                delay = self._hedge_after(pending, endpoints, tried, hedged)
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"{role} request is slow on {next(iter(pending.values()))[0]}, hedging on {endpoints[tried][0]}")
+                    metrics.increment("provider_router.hedges")
+                    hedged = True
+                    launch()
+                    continue
+
+                for task in done:
+                    endpoint = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        if not is_failover_error(e):
+                            raise
+                        print(f"{role} request failed on {endpoint[0]}: {e}")
+                        error = e
+                        if not pending and tried < len(endpoints):
+                            launch()
+                        continue
+
+                    if endpoint != endpoints[0]:
+                        metrics.increment("provider_router.fallback_answers")
+                    return response
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await close_response_async(task.result())
+
+        raise error
+
+    def summary(self) -> dict:
+        """
+        Get the latency and error statistics of every endpoint used so far.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        return {f"{provider}/{model}": endpoint.summary() for (provider, model), endpoint in stats.items()}
+
+
+router = ProviderRouter()
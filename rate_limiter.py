@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from clients import provider_name
+from config import *
+from metrics import metrics
+
+# Request priorities, lower goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+# Rate limit exceeded exception
+class RateLimitTimeout(Exception):
+    """
+    Raised when a request waited longer than allowed for its turn.
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at the provider's requests per minute, holding up to the burst size.
+    Requests wait in a priority queue, and only the request at the head of the queue may take a token.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int):
+        self.rate = requests_per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        # No tokens are handed out before this time, set from the provider's Retry-After
+        self.blocked_until = 0.0
+        # Waiting requests as (priority, sequence, tokens)
+        self.waiters: list[tuple[int, int, int]] = []
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, waiter: tuple[int, int, int]) -> float:
+        """
+        Take the waiter's tokens if it is first in line, returns the time to wait before trying again, 0 once taken.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.waiters[0] != waiter:
+            return 0.05
+        tokens = min(waiter[2], self.capacity)
+        if self.tokens < tokens:
+            return (tokens - self.tokens) / self.rate
+        self.tokens -= tokens
+        heapq.heappop(self.waiters)
+        return 0.0
+
+    def remove(self, waiter: tuple[int, int, int]):
+        self.waiters.remove(waiter)
+        heapq.heapify(self.waiters)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class RateLimiter:
+    """
+    Client side rate limiter with one token bucket per provider and model, sized from RATE_LIMITS.
+    Interactive requests are served before background work waiting for the same bucket, and a
+    429 blocks the bucket for the provider's Retry-After.
+    """
+
+    def __init__(self, limits: dict = RATE_LIMITS, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        self.limits = limits
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._buckets: dict[tuple[str, str], TokenBucket | None] = {}
+        self._sequence = itertools.count()
+
+    def bucket(self, base_url: str, model: str) -> TokenBucket | None:
+        """
+        Get the bucket of a provider and model, None if it is not rate limited.
+        Limits are looked up as "provider/model" first, then "provider", then "default".
+        """
+        provider = provider_name(base_url, {key.split("/")[0]: None for key in self.limits})
+        key = (provider, model)
+        if key not in self._buckets:
+            limit = self.limits.get(f"{provider}/{model}") or self.limits.get(provider) or self.limits.get("default")
+            self._buckets[key] = TokenBucket(limit["requests_per_minute"], limit["burst"]) if limit else None
+        return self._buckets[key]
+
+    def acquire(self, base_url: str, model: str, priority: int = INTERACTIVE, tokens: int = 1, timeout: float | None = None):
+        """
+        Wait until a request to the provider and model is allowed.
+
+        Args:
+            base_url (str): The base url of the provider.
+            model (str): The model requested.
+            priority (int): INTERACTIVE or BACKGROUND, lower priorities are served first.
+            tokens (int): The number of requests to reserve.
+            timeout (float): The longest time to wait, defaults to RATE_LIMIT_MAX_WAIT.
+
+        Raises:
+            RateLimitTimeout: If the wait would take longer than the timeout.
+        """
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        with self._condition:
+            bucket = self.bucket(base_url, model)
+            if bucket is None:
+                return
+            waiter = (priority, next(self._sequence), tokens)
+            heapq.heappush(bucket.waiters, waiter)
+            started = time.monotonic()
+            try:
+                while (wait := bucket.try_take(waiter)) > 0:
+                    if time.monotonic() + wait > deadline:
+                        metrics.increment("rate_limiter.timeouts")
+                        raise RateLimitTimeout(f"Rate limit of {base_url} ({model}) would be exceeded for {wait:.1f}s")
+                    self._condition.wait(timeout=wait)
+            finally:
+                # A waiter left behind by a timeout or an interrupt would hold up every later request
+                if waiter in bucket.waiters:
+                    bucket.remove(waiter)
+                self._condition.notify_all()
+        self._record_wait(started)
+
+    async def acquire_async(self, base_url: str, model: str, priority: int = INTERACTIVE, tokens: int = 1, timeout: float | None = None):
+        """
+        Async counterpart of acquire, waits without blocking the event loop.
+        """
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        with self._condition:
+            bucket = self.bucket(base_url, model)
+            if bucket is None:
+                return
+            waiter = (priority, next(self._sequence), tokens)
+            heapq.heappush(bucket.waiters, waiter)
+        started = time.monotonic()
+        try:
+            while True:
+                with self._condition:
+                    wait = bucket.try_take(waiter)
+                    if wait <= 0:
+                        self._condition.notify_all()
+                        break
+                if time.monotonic() + wait > deadline:
+                    metrics.increment("rate_limiter.timeouts")
+                    raise RateLimitTimeout(f"Rate limit of {base_url} ({model}) would be exceeded for {wait:.1f}s")
+                await asyncio.sleep(min(wait, 0.1))
+        except BaseException:
+            with self._condition:
+                if waiter in bucket.waiters:
+                    bucket.remove(waiter)
+                self._condition.notify_all()
+            raise
+        self._record_wait(started)
+
+    def backoff(self, base_url: str, model: str, retry_after: float | None):
+        """
+        Stop handing out requests for a provider and model after it answered 429.
+
+        Args:
+            retry_after (float): The provider's Retry-After in seconds, RATE_LIMIT_BACKOFF if unknown.
+        """
+        with self._condition:
+            bucket = self.bucket(base_url, model)
+            if bucket is not None:
+                bucket.block(retry_after or RATE_LIMIT_BACKOFF)
+            self._condition.notify_all()
+        metrics.increment("rate_limiter.backoffs")
+
+    def _record_wait(self, started: float):
+        waited = time.monotonic() - started
+        if waited > 0.01:
+            metrics.increment("rate_limiter.queued")
+            metrics.increment("rate_limiter.wait_ms", int(waited * 1000))
+
+
+limiter = RateLimiter()
@@ -0,0 +1,111 @@
+import math
+import re
+from collections import Counter
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "be", "it",
+    "this", "that", "my", "me", "i", "you", "your", "can", "could", "would", "please", "what", "how",
+    "do", "does", "given", "based", "from", "as", "at", "by", "if", "get", "give", "tell", "about",
+}
+
+
+# Tokenise a text
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase word tokens, breaking camelCase and snake_case names apart.
+    """
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+# Split a text into chunks
+def split_chunks(text: str, size: int = 600) -> list[str]:
+    """
+    Split text into chunks of about the given size, along paragraphs, then lines, then sentences.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if len(paragraph) <= size:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            if len(line) <= size:
+                pieces.append(line)
+                continue
+            for sentence in re.split(r"(?<=[.!?])\s+", line):
+                pieces += [sentence[start:start + size] for start in range(0, len(sentence), size)]
+
+    # Merge the small pieces back together, up to the chunk size
+    chunks = []
+    for piece in pieces:
+        if not piece.strip():
+            continue
+        if chunks and len(chunks[-1]) + len(piece) + 1 <= size:
+            chunks[-1] += "\n" + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+# Score chunks against a query
+def bm25_scores(query: str, chunks: list[str], k1: float = 1.5, b: float = 0.75) -> list[float]:
+    """
+    Score every chunk against the query with Okapi BM25.
+    """
+    documents = [Counter(tokenize(chunk)) for chunk in chunks]
+    terms = set(tokenize(query))
+    if not documents or not terms:
+        return [0.0] * len(chunks)
+
+    average_length = sum(sum(document.values()) for document in documents) / len(documents) or 1.0
+    frequencies = {term: sum(1 for document in documents if term in document) for term in terms}
+    scores = []
+    for document in documents:
+        length = sum(document.values())
+        score = 0.0
+        for term in terms:
+            if term not in document:
+                continue
+            idf = math.log(1 + (len(documents) - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+            tf = document[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+# Keep the most relevant parts of a text
+def top_chunks(text: str, query: str, max_chars: int, chunk_size: int = 600, separator: str = "\n[...]\n", max_chunks: int | None = None) -> str:
+    """
+    Keep the chunks of the text most relevant to the query, within a character budget.
+    The kept chunks stay in their original order, ties are broken in favour of the earlier chunks.
+
+    Args:
+        text (str): The text to shorten.
+        query (str): What the kept text should be relevant to.
+        max_chars (int): The character budget.
+        max_chunks (int): The number of chunks kept at most.
+
+    Returns:
+        str: The kept chunks, joined by the separator where text was left out.
+    """
+    if len(text) <= max_chars and max_chunks is None:
+        return text
+
+    chunks = split_chunks(text, min(chunk_size, max_chars))
+    scores = bm25_scores(query, chunks)
+    ranked = sorted(range(len(chunks)), key=lambda index: (-scores[index], index))
+
+    kept, used = set(), 0
+    for index in ranked:
+        if max_chunks is not None and len(kept) >= max_chunks:
+            break
+        cost = len(chunks[index]) + len(separator)
+        if used + cost > max_chars:
+            continue
+        kept.add(index)
+        used += cost
+
+    output = ""
+    for index in range(len(chunks)):
+        if index in kept:
+            output += chunks[index] + "\n"
+        elif not output.endswith(separator):
+            output += separator
+    return output.strip()
@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+import systemMsgs as sysmsg
+from config import *
+from metrics import metrics
+from relevance import tokenize
+from tool_router import last_user_message
+
+# Questions whose answer changes over time
+TIME_SENSITIVE_PATTERN = re.compile(
+    r"\b(now|today|tonight|tomorrow|yesterday|current(ly)?|latest|recent(ly)?|news|weather|forecast|time|date|"
+    r"this (morning|evening|week|month|year)|last (week|month|year)|next (week|month|year)|price|stocks?|score)\b",
+    re.IGNORECASE,
+)
+# Questions referring back to earlier turns, their answer depends on the conversation
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|its|that|this|these|those|them|he|she|they|his|her|their|again|more|above|previous)\b", re.IGNORECASE)
+
+
+# Normalise a question
+def normalise(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+# Get the lexical fingerprint of a normalised question
+def fingerprint(text: str) -> frozenset[str]:
+    """
+    Get the character trigrams of a normalised question, used to match reworded questions.
+    """
+    padded = f" {text} "
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
+
+# Get the similarity of two fingerprints
+def similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    """
+    LRU cache of answers to self-contained, general knowledge questions.
+    Questions are matched on their normalised text. A reworded question only matches when it has the
+    same content words in the same order, e.g. it only adds or drops stopwords, and its trigram
+    fingerprint is similar enough. Entries expire after the TTL. Turns that used tools, depend on
+    the time or refer back to the conversation are never cached.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = RESPONSE_CACHE_SIZE,
+            ttl: float = RESPONSE_CACHE_TTL,
+            threshold: float = RESPONSE_CACHE_THRESHOLD,
+        ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+
+        self._lock = threading.Lock()
+        # Entries keyed by (assistant_name, normalised question)
+        self._entries: OrderedDict[tuple[str, str], dict] = OrderedDict()
+
+    def cacheable(self, question: str) -> bool:
+        """
+        Check if the answer to a question may be cached and served from the cache.
+        """
+        normalised = normalise(question)
+        return bool(normalised) and not TIME_SENSITIVE_PATTERN.search(normalised) and not FOLLOW_UP_PATTERN.search(normalised)
+
+    def get(self, conversation: list[Dict[str, str]], assistant_name: str = ASSISTANT_NAME) -> sysmsg.AgentResponse | None:
+        """
+        Get the cached answer to the latest user question.
+
+        Args:
+            conversation (list): The conversation history.
+            assistant_name (str): The name of the assistant profile answering.
+
+        Returns:
+            AgentResponse: The cached response, None on a miss.
+        """
+        question = last_user_message(conversation)
+        if not self.cacheable(question):
+            metrics.increment("response_cache.skipped")
+            return None
+
+        normalised = normalise(question)
+        key = (assistant_name, normalised)
+        # "capital of austria" and "capital of australia", or "5 km to miles" and "5 miles to km", differ in their content words
+        tokens = tuple(tokenize(normalised))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                query = fingerprint(normalised)
+                candidates = [
+                    (similarity(query, candidate["fingerprint"]), candidate_key)
+                    for candidate_key, candidate in self._entries.items()
+                    if candidate_key[0] == assistant_name and candidate["tokens"] == tokens
+                ]
+                score, best = max(candidates, default=(0.0, None))
+                if best is not None and score >= self.threshold:
+                    key, entry = best, self._entries[best]
+
+            if entry is not None and now - entry["time"] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                metrics.increment("response_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+
+        metrics.increment("response_cache.hits")
+        return entry["response"]
+
+    def put(self, conversation: list[Dict[str, str]], response: sysmsg.AgentResponse, assistant_name: str = ASSISTANT_NAME):
+        """
+        Cache the answer to the latest user question, unless the turn used tools.
+
+        Args:
+            conversation (list): The conversation history, including the answered turn.
+            response (AgentResponse): The answer to the question.
+            assistant_name (str): The name of the assistant profile answering.
+        """
+        question = last_user_message(conversation)
+        if response is None or response.error or not response.assistant_response or not self.cacheable(question):
+            return
+
+        # Messages of the answered turn, after the latest user message
+        index = max((index for index, message in enumerate(conversation) if message.get("role") == "user"), default=-1)
+        if any(message.get("role") == "tool" or message.get("tool_calls") for message in conversation[index + 1:]):
+            return
+
+        normalised = normalise(question)
+        with self._lock:
+            self._entries[(assistant_name, normalised)] = {
+                "response": response,
+                "fingerprint": fingerprint(normalised),
+                "tokens": tuple(tokenize(normalised)),
+                "time": time.monotonic(),
+            }
+            self._entries.move_to_end((assistant_name, normalised))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment("response_cache.evictions")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = ResponseCache()
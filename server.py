@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import contextlib
+import time
+import uuid
+
+from aiohttp import WSMsgType, web
+
+import browser_pool
+import provider_router
+from brain import get_response_events_async, greet_me_async
+from clients import close_async_clients
+from config import *
+from fetcher import fetcher
+from metrics import metrics
+
+
+# Session class
+class Session:
+    """
+    A class representing one conversation hosted by the server, with its own history and assistant profile.
+    """
+
+    def __init__(self, assistant: str = ASSISTANT_NAME, user_name: str = "User"):
+        self.id = uuid.uuid4().hex
+        self.assistant = get_assistant_model(assistant)
+        self.user_name = user_name
+        self.conversation: list[dict] = []
+        # Turns of the same session are answered one after the other
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+
+    @property
+    def assistant_name(self) -> str:
+        return self.assistant["name"]
+
+
+class TurnLimiter:
+    """
+    Bounds the number of turns answered at once. Turns wait in a bounded queue, and are turned
+    away once the queue is full or they waited too long, so clients back off while the providers are saturated.
+    """
+
+    def __init__(self, max_concurrent: int = SERVER_MAX_CONCURRENT_TURNS, max_queued: int = SERVER_MAX_QUEUED_TURNS, queue_timeout: float = SERVER_QUEUE_TIMEOUT):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self.completed = 0
+
+    async def acquire(self) -> bool:
+        """
+        Wait for a free slot, returns False if the turn has to be rejected.
+        """
+        if self.queued >= self.max_queued:
+            self.rejected += 1
+            return False
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.queued -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self.completed += 1
+        self.semaphore.release()
+
+    def stats(self) -> dict:
+        return {"active": self.active, "queued": self.queued, "rejected": self.rejected, "completed": self.completed}
+
+
+class AssistantServer:
+    """
+    HTTP and WebSocket entry point hosting many independent assistant sessions on one event loop.
+
+    Routes:
+        POST   /sessions                 Create a session, body: {"assistant": "jarvis", "name": "User", "greet": false}
+        POST   /sessions/{id}/turns      Answer one turn, body: {"text": "..."}
+        GET    /sessions/{id}/ws         WebSocket, send {"text": "..."} and receive "delta", "event" and "done" messages
+        DELETE /sessions/{id}            Close a session
+        GET    /health                   Session and turn statistics
+    """
+
+    def __init__(self, limiter: TurnLimiter | None = None, session_ttl: float = SERVER_SESSION_TTL):
+        self.sessions: dict[str, Session] = {}
+        self.limiter = limiter
+        self.session_ttl = session_ttl
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/sessions", self.create_session),
+            web.post("/sessions/{session_id}/turns", self.turn),
+            web.get("/sessions/{session_id}/ws", self.websocket),
+            web.delete("/sessions/{session_id}", self.close_session),
+            web.get("/health", self.health),
+        ])
+        self.app.on_startup.append(self.on_startup)
+        self.app.on_cleanup.append(self.on_cleanup)
+
+    async def on_startup(self, app: web.Application):
+        # The limiter's semaphore has to be created on the server's event loop
+        self.limiter = self.limiter or TurnLimiter()
+        self._expiry = asyncio.create_task(self.expire_sessions())
+        if PRELOAD_BROWSER:
+            browser_pool.pool.preload()
+
+    async def on_cleanup(self, app: web.Application):
+        self._expiry.cancel()
+        await close_async_clients()
+        await asyncio.to_thread(browser_pool.pool.close)
+
+    async def expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if now - session.last_active > self.session_ttl and not session.lock.locked():
+                    del self.sessions[session_id]
+
+    def get_session(self, request: web.Request) -> Session:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text="Unknown session")
+        session.last_active = time.monotonic()
+        return session
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the limiter's slots for a model call.
+        Raises HTTPServiceUnavailable when the server is saturated.
+        """
+        if not await self.limiter.acquire():
+            raise web.HTTPServiceUnavailable(text="Server busy, retry later", headers={"Retry-After": str(SERVER_RETRY_AFTER)})
+        try:
+            yield
+        finally:
+            self.limiter.release()
+
+    async def answer(self, session: Session, text: str):
+        """
+        Answer one turn of a session, yielding the (field, value) response events.
+        Raises HTTPServiceUnavailable when the server is saturated.
+        """
+        # A turn waiting for the previous turn of its session does not hold a slot meanwhile
+        async with session.lock:
+            async with self.slot():
+                session.conversation.append({"role": "user", "content": text})
+                async for event in get_response_events_async(session.conversation, assistant_name=session.assistant_name):
+                    yield event
+
+    async def read_body(self, request: web.Request) -> dict:
+        """
+        Read the JSON object of a request body, an empty body is an empty object.
+        Raises HTTPBadRequest when the body is not a JSON object.
+        """
+        if not request.can_read_body:
+            return {}
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid JSON body")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="The body must be a JSON object")
+        return body
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        body = await self.read_body(request)
+        try:
+            session = Session(body.get("assistant", ASSISTANT_NAME), body.get("name", "User"))
+        except KeyError:
+            raise web.HTTPBadRequest(text=f"Unknown assistant, choose from: {', '.join(Assistants)}")
+
+        greeting = ""
+        if body.get("greet"):
+            async with self.slot():
+                async for text in greet_me_async(session.user_name, session.assistant_name):
+                    greeting += text
+            session.conversation.append({"role": "assistant", "content": greeting})
+
+        self.sessions[session.id] = session
+        return web.json_response({"session_id": session.id, "assistant": session.assistant_name, "greeting": greeting})
+
+    async def turn(self, request: web.Request) -> web.Response:
+        session = self.get_session(request)
+        body = await self.read_body(request)
+        if not body.get("text"):
+            raise web.HTTPBadRequest(text="Missing text")
+
+        response = {"assistant_response": ""}
+        async for field, value in self.answer(session, body["text"]):
+            if field == "assistant_response":
+                response["assistant_response"] += value
+            else:
+                response[field] = value
+        return web.json_response(response)
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        session = self.get_session(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                body = message.json()
+            except ValueError:
+                body = None
+            text = body.get("text") if isinstance(body, dict) else None
+            if not text:
+                await ws.send_json({"type": "error", "error": "Missing text"})
+                continue
+
+            try:
+                async for field, value in self.answer(session, text):
+                    if field == "assistant_response":
+                        await ws.send_json({"type": "delta", "text": value})
+                    else:
+                        await ws.send_json({"type": "event", "field": field, "value": value})
+                await ws.send_json({"type": "done"})
+            except web.HTTPServiceUnavailable:
+                await ws.send_json({"type": "busy", "retry_after": SERVER_RETRY_AFTER})
+            session.last_active = time.monotonic()
+        return ws
+
+    async def close_session(self, request: web.Request) -> web.Response:
+        session = self.get_session(request)
+        del self.sessions[session.id]
+        return web.json_response({"closed": session.id})
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "sessions": len(self.sessions),
+            "turns": self.limiter.stats(),
+            "providers": provider_router.router.summary(),
+            "browsers": browser_pool.pool.stats(),
+            "fetcher": fetcher.stats(),
+            "metrics": metrics.snapshot(),
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the assistant as a multi-session server.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    web.run_app(AssistantServer().app, host=args.host, port=args.port)
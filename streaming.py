@@ -0,0 +1,258 @@
+import json
+import re
+from typing import Any
+
+import systemMsgs as sysmsg
+
+WHITESPACE = " \t\r\n"
+# End of a sentence: a full stop, question or exclamation mark followed by whitespace, or a line break
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Default values for the AgentResponse fields the model may leave out
+AGENT_RESPONSE_DEFAULTS = {
+    "assistant_response": "",
+    "code": "",
+    "error": "",
+    "points": [],
+    "sources": [],
+}
+
+
+# Parse a complete agent response
+def parse_agent_response(content: str | dict) -> sysmsg.AgentResponse:
+    """
+    Parse an AgentResponse, filling in any fields the model left out.
+
+    Args:
+        content (str | dict): The JSON response from the model, or the already decoded fields.
+
+    Returns:
+        AgentResponse: The validated response.
+    """
+    fields = json.loads(content) if isinstance(content, str) else content
+    if not isinstance(fields, dict):
+        raise ValueError(f"Expected a JSON object, got: {type(fields).__name__}")
+    return sysmsg.AgentResponse.model_validate({**AGENT_RESPONSE_DEFAULTS, **fields})
+
+
+class AgentResponseStream:
+    """
+    Incremental parser for an AgentResponse JSON object arriving in chunks.
+
+    The text field is emitted character by character as soon as its value starts,
+    every other top-level field is emitted once its value is complete.
+    Events are (field, value) tuples, where the value of the text field is the newly decoded text.
+    A response that does not start with a JSON object is plain text, all of it is streamed as the text field.
+    """
+
+    def __init__(self, text_field: str = "assistant_response"):
+        self.text_field = text_field
+        self.buffer = ""
+        self.fields: dict[str, Any] = {}
+
+        self._pos = 0
+        self._state = "start"
+        self._key = ""
+        self._value_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._text = []
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """
+        Feed the next chunk of the response.
+
+        Args:
+            chunk (str): The raw text received from the model.
+
+        Returns:
+            list: The events completed by this chunk.
+        """
+        self.buffer += chunk
+        events = []
+        buffer = self.buffer
+
+        while self._pos < len(buffer) and self._state != "done":
+            char = buffer[self._pos]
+
+            if self._state == "start":
+                if char in WHITESPACE:
+                    self._pos += 1
+                elif char == "{":
+                    self._state = "key"
+                    self._pos += 1
+                elif char == "`":
+                    # A ```json fence around the object is skipped, any other code block is plain text
+                    end = buffer.find("\n", self._pos)
+                    if end == -1:
+                        break
+                    if buffer[self._pos:end].strip() in ("```", "```json"):
+                        self._pos = end + 1
+                    else:
+                        self._state = "plain"
+                else:
+                    self._state = "plain"
+
+            elif self._state == "plain":
+                text = buffer[self._pos:]
+                self._pos = len(buffer)
+                self._text.append(text)
+                events.append((self.text_field, text))
+
+            elif self._state == "key":
+                if char in WHITESPACE or char == ",":
+                    self._pos += 1
+                elif char == "}":
+                    self._state = "done"
+                    self._pos += 1
+                elif char == '"':
+                    end = self._string_end(self._pos + 1)
+                    if end is None:
+                        break
+                    self._key = json.loads(buffer[self._pos:end + 1])
+                    self._pos = end + 1
+                    self._state = "colon"
+                else:
+                    raise ValueError(f"Unexpected character {char!r} in response at position {self._pos}")
+
+            elif self._state == "colon":
+                if char == ":":
+                    self._state = "value"
+                self._pos += 1
+
+            elif self._state == "value":
+                if char in WHITESPACE:
+                    self._pos += 1
+                elif char == '"' and self._key == self.text_field:
+                    self._state = "text"
+                    self._pos += 1
+                else:
+                    self._state = "raw"
+                    self._value_start = self._pos
+                    self._depth = 0
+                    self._in_string = False
+                    self._escaped = False
+
+            elif self._state == "text":
+                if char == '"':
+                    self.fields[self._key] = "".join(self._text)
+                    self._state = "key"
+                    self._pos += 1
+                    continue
+                text, consumed = self._decode_text(self._pos)
+                if not consumed:
+                    break
+                self._pos += consumed
+                self._text.append(text)
+                if events and events[-1][0] == self.text_field:
+                    events[-1] = (self.text_field, events[-1][1] + text)
+                else:
+                    events.append((self.text_field, text))
+
+            elif self._state == "raw":
+                if self._in_string:
+                    if self._escaped:
+                        self._escaped = False
+                    elif char == "\\":
+                        self._escaped = True
+                    elif char == '"':
+                        self._in_string = False
+                elif char == '"':
+                    self._in_string = True
+                elif char in "[{":
+                    self._depth += 1
+                elif char in "]}" and self._depth > 0:
+                    self._depth -= 1
+                elif char in ",}" and self._depth == 0:
+                    value = json.loads(buffer[self._value_start:self._pos])
+                    self.fields[self._key] = value
+                    events.append((self._key, value))
+                    self._state = "key"
+                    continue
+                self._pos += 1
+
+        return events
+
+    def result(self) -> sysmsg.AgentResponse:
+        """
+        Get the complete response once the stream has ended.
+        """
+        if self._state == "plain":
+            return parse_agent_response({self.text_field: "".join(self._text).strip()})
+        try:
+            return parse_agent_response(self.buffer)
+        except Exception as e:
+            print(f"Error validating streamed response: {e}")
+            if self._state == "text":
+                self.fields[self.text_field] = "".join(self._text)
+            return parse_agent_response(self.fields)
+
+    # Find the closing quote of a string starting at the given position
+    def _string_end(self, start: int) -> int | None:
+        escaped = False
+        for index in range(start, len(self.buffer)):
+            char = self.buffer[index]
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                return index
+        return None
+
+    # Decode the next character of the text field, returns the text and the number of characters consumed
+    def _decode_text(self, pos: int) -> tuple[str, int]:
+        buffer = self.buffer
+        if buffer[pos] != "\\":
+            end = pos
+            while end < len(buffer) and buffer[end] not in '"\\':
+                end += 1
+            return buffer[pos:end], end - pos
+
+        if pos + 1 >= len(buffer):
+            return "", 0
+        if buffer[pos + 1] != "u":
+            return json.loads(f'"{buffer[pos:pos + 2]}"'), 2
+
+        # Unicode escapes, surrogate pairs need both halves before they can be decoded
+        if pos + 6 > len(buffer):
+            return "", 0
+        length = 6
+        if 0xD800 <= int(buffer[pos + 2:pos + 6], 16) <= 0xDBFF:
+            if pos + 12 > len(buffer):
+                return "", 0
+            length = 12
+        return json.loads(f'"{buffer[pos:pos + length]}"'), length
+
+
+class SentenceSplitter:
+    """
+    Splits streamed answer text into complete sentences, so they can be spoken while the rest is generated.
+    Short sentences are joined with the next one, to keep the speech from sounding choppy.
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        """
+        Feed the next piece of text, returns the sentences it completed.
+        """
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self.buffer[start:match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return [sentence for sentence in sentences if sentence]
+
+    def flush(self) -> str:
+        """
+        Get the text left once the stream has ended.
+        """
+        rest, self.buffer = self.buffer.strip(), ""
+        return rest
@@ -1,3 +1,4 @@
+import functools
 import json
 from textwrap import dedent
 from typing import Optional
@@ -5,7 +6,7 @@ from typing import Optional
 from pydantic import BaseModel, Field
 
 from config import *
-from tools import tools_list
+from tool_schemas import tools_list
 
 search_operators = dedent(
     """
@@ -52,6 +53,26 @@ search_operators = dedent(
 """
 )
 
+# Render the tool catalogue
+def render_tool_catalogue(tools: list[dict]) -> str:
+    """
+    Render the tool schemas as one compact line per tool, e.g. "- getCurrentWeather(city: string): Get the current weather for a city."
+    The output only depends on the tools, so prompts built from it stay byte-stable between requests.
+    """
+    lines = []
+    for tool in tools:
+        function = tool["function"]
+        parameters = function.get("parameters", {})
+        required = parameters.get("required", [])
+        arguments = ", ".join(
+            f"{name}{'' if name in required else '?'}: {schema.get('type', 'any')}"
+            for name, schema in parameters.get("properties", {}).items()
+        )
+        lines.append(f"- {function['name']}({arguments}): {function.get('description', '').strip()}")
+    return "\n".join(lines)
+
+tool_catalogue = render_tool_catalogue(tools_list)
+
 search_agent_sys_prompt = {
     "role": "system",
     "content": dedent(
@@ -74,26 +95,41 @@ class AgentResponse(BaseModel):
     points: list[str] = Field(description="The summarised response provided by the agent. It displays the detailed explanation/answer in a dense, concise representation.  Default value is an empty list.")
     sources: list[str] = Field(description="The sources or links provided by the agent to support it's response. Default value is an empty list.")
 
-assistant_system_prompt = {
-    "role": "system",
-    "content": dedent(
-        f"""
-        You are {ASSISTANT_NAME}, a highly advanced AI assistant made by Karan. You are professional, efficient, and precise. Your responses are very-short, concise, and to the point unless explicitly asked to elaborate. You emulate an intelligent, resourceful, and capable assistant with a touch of wit and charm when appropriate. 
-        Behavioral Guidelines:
-        Conciseness: Default to brief answers (1-2 sentences) as your answers will be spoken out loud as if you are having a conversation with a human. Expand only if prompted.
-        Tone: Maintain a polite, professional, and confident tone. Add a subtle hint of humor only if the context allows.
-        Clarity: Avoid ambiguity. Provide direct and actionable responses. If confused, ask for clarification.
-        Stopping: If the user hints at stopping the conversation, stop responding.
-        Mode of communication: Default mode of communication is voice. Respond with "MODE:TEXT" if the user wants to switch to text mode. Respond with "MODE:VOICE" if the user wants to switch to voice mode.
-        Shutdown: If the user asks you to stop the system or shutdown, respond with "SHUTDOWN".
-        Conversation Context: If the user wants to clear conversation context, respond with "CLEAR".
-        Always be resourceful, offering alternatives or suggestions when appropriate.
-        Use plaintext and avoid using markdown or rich text(**bold**, *italics*, #heading, etc) for your responses.
-        You have got access to the following tools: \n{tools_list}
-        ONLY USE THE GIVEN JSON SCHEMA FOR YOUR RESPONSE: {json.dumps(AgentResponse.model_json_schema(), indent=2)}
+# Assistant system prompt
+@functools.lru_cache(maxsize=None)
+def get_assistant_system_prompt(assistant_name: str = ASSISTANT_NAME) -> dict:
     """
-    ),
-}
+    Get the system prompt for an assistant profile. The prompt is built once per name, so it stays byte-stable.
+    """
+    return {
+        "role": "system",
+        "content": dedent(
+            f"""
+            You are {assistant_name}, a highly advanced AI assistant made by Karan. You are professional, efficient, and precise. Your responses are very-short, concise, and to the point unless explicitly asked to elaborate. You emulate an intelligent, resourceful, and capable assistant with a touch of wit and charm when appropriate. 
+            Behavioral Guidelines:
+            Conciseness: Default to brief answers (1-2 sentences) as your answers will be spoken out loud as if you are having a conversation with a human. Expand only if prompted.
+            Tone: Maintain a polite, professional, and confident tone. Add a subtle hint of humor only if the context allows.
+            Clarity: Avoid ambiguity. Provide direct and actionable responses. If confused, ask for clarification.
+            Stopping: If the user hints at stopping the conversation, stop responding.
+            Mode of communication: Default mode of communication is voice. Respond with "MODE:TEXT" if the user wants to switch to text mode. Respond with "MODE:VOICE" if the user wants to switch to voice mode.
+            Shutdown: If the user asks you to stop the system or shutdown, respond with "SHUTDOWN".
+            Conversation Context: If the user wants to clear conversation context, respond with "CLEAR".
+            Always be resourceful, offering alternatives or suggestions when appropriate.
+            Use plaintext and avoid using markdown or rich text(**bold**, *italics*, #heading, etc) for your responses.
+            You have got access to the following tools: \n{tool_catalogue}
+            ONLY USE THE GIVEN JSON SCHEMA FOR YOUR RESPONSE: {json.dumps(AgentResponse.model_json_schema(), indent=2)}
+        """
+        ),
+    }
+
+assistant_system_prompt = get_assistant_system_prompt(ASSISTANT_NAME)
+
+# Added to the system prompt of the fast model in the model cascade
+cascade_confidence_prompt = dedent(
+    """
+    Confidence: Start your JSON response with a "confidence" field before every other field, a number between 0 and 1 of how sure you are that your answer is correct and complete. Report a low confidence if the request needs careful reasoning, expert knowledge or information you may not have.
+    """
+)
 
 # Decision class
 class Decision(BaseModel):
@@ -107,7 +143,7 @@ tool_use_check_system_prompt = {
     "content": dedent(
         "Your sole task is to decide if using a tool is necessary for a given user request. "
         "### **Available Tools:**  "
-        f"{tools_list} "
+        f"\n{tool_catalogue}\n"
         "#### Respond 'true' if:"
         "0. The user requests for real-time data, external references, or data which might change frequently and would thus require the use of web search. "
         "1. The request explicitly mentions to use the tool functionality (e.g., accessing external data, generating content, or analyzing inputs, reading from or writing to or editing files, etc). "
@@ -129,8 +165,7 @@ tool_use_results_system_prompt = {
     "role": "system",
     "content": dedent(
         f"You are a highly capable AI assistant designed to provide accurate, comprehensive, and efficient responses to user queries. "
-        "You have access to the following tools, which you can use to enhance the quality of your responses:\n\n"
-        f"### Available Tools:\n{tools_list}\n\n"
+        "You have access to the provided tools, which you can use to enhance the quality of your responses.\n\n"
         "### How to Approach Queries:\n"
         "1. **Understand the Query:** Carefully analyze the user's request to ensure you fully grasp the intent and context. If the query is ambiguous, request clarification.\n\n"
         "2. **Determine Tool Usage:**\n"
@@ -0,0 +1,123 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import brain
+from brain import ToolAutoAnswer
+
+
+def chunk(content=None, tool_calls=None, finish_reason=None):
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+
+def tool_call(index, name="", arguments="", id=None):
+    return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_plain_text_answer_with_braces():
+    answer = ToolAutoAnswer()
+    assert answer.feed_chunk(chunk("Write {name} ")) == []
+    events = answer.feed_chunk(chunk("in braces.", finish_reason="stop"))
+    assert events == [("assistant_response", "Write {name} "), ("assistant_response", "in braces.")]
+    assert answer.tool_calls == []
+    assert answer.result().assistant_response == "Write {name} in braces."
+
+
+def test_text_before_tool_calls_is_not_an_answer():
+    answer = ToolAutoAnswer()
+    answer.feed_chunk(chunk("Let me look that up."))
+    answer.feed_chunk(chunk(tool_calls=[tool_call(0, "searchWeb", '{"query": ', id="call_1")]))
+    answer.feed_chunk(chunk(tool_calls=[tool_call(0, arguments='"weather"}')]))
+    assert answer.feed_chunk(chunk(finish_reason="tool_calls")) == []
+    assert answer.release() == []
+    assert [(call.id, call.function.name, call.function.arguments) for call in answer.tool_calls] == [
+        ("call_1", "searchWeb", '{"query": "weather"}')
+    ]
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeRouter:
+    """
+    Answers every role with a scripted response, the same way for the sync and the async API.
+    """
+
+    def __init__(self, use_tools: bool):
+        self.use_tools = use_tools
+
+    def message(self, role: str, kwargs: dict):
+        if role == "decision":
+            return SimpleNamespace(content=json.dumps({"decision": str(self.use_tools).lower()}), tool_calls=None)
+        if role == "tool" and (kwargs["tool_choice"] == "required" or self.use_tools and not any(m.get("role") == "tool" for m in kwargs["messages"])):
+            return SimpleNamespace(content=None, tool_calls=[tool_call(0, "missingTool", "{}", id="call_1")])
+        answer = {"assistant_response": f"Answer from the {role} model. It is done.", "points": ["a point"]}
+        if role == "fast":
+            answer["confidence"] = 0.9
+        return SimpleNamespace(content=json.dumps(answer), tool_calls=None)
+
+    def response(self, role: str, kwargs: dict):
+        message = self.message(role, kwargs)
+        if not kwargs.get("stream"):
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        if message.tool_calls:
+            return FakeStream([chunk(tool_calls=message.tool_calls, finish_reason="tool_calls")])
+        content = message.content
+        return FakeStream([chunk(content[index:index + 7]) for index in range(0, len(content), 7)] + [chunk(finish_reason="stop")])
+
+    def chat(self, role, priority=None, **kwargs):
+        return self.response(role, kwargs)
+
+    async def chat_async(self, role, priority=None, **kwargs):
+        return self.response(role, kwargs)
+
+
+@pytest.mark.parametrize("stream", [True, False])
+@pytest.mark.parametrize("single_pass", [True, False])
+@pytest.mark.parametrize("use_tools", [True, False])
+def test_sync_and_async_pipelines_are_equivalent(monkeypatch, tmp_path, stream, single_pass, use_tools):
+    monkeypatch.setattr(brain.provider_router, "router", FakeRouter(use_tools))
+    monkeypatch.setattr(brain, "auto_tool_choice", lambda base_url: single_pass)
+    monkeypatch.setattr(brain, "LOCAL_ROUTER", False)
+    monkeypatch.setattr(brain.cascade, "log_path", tmp_path / "cascade.jsonl")
+
+    def question():
+        return [{"role": "user", "content": "What is the weather like in Paris today?"}]
+
+    sync_conversation = question()
+    sync_events = list(brain.get_response_events(sync_conversation, stream=stream))
+
+    async def run_async(conversation):
+        return [event async for event in brain.get_response_events_async(conversation, stream=stream)]
+
+    async_conversation = question()
+    async_events = asyncio.run(run_async(async_conversation))
+
+    assert "".join(value for field, value in sync_events if field == "assistant_response").startswith("Answer from the")
+    assert any(message["role"] == "tool" for message in sync_conversation) == use_tools
+    assert async_events == sync_events
+    assert async_conversation == sync_conversation
@@ -0,0 +1,70 @@
+import gzip
+import http.server
+import threading
+
+import pytest
+
+from cassette import cassette, http_session
+
+
+@pytest.fixture
+def replay(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    cassette.use("record", str(path), "zero")
+    yield path
+    cassette.use("off")
+
+
+@pytest.fixture
+def server():
+    body = gzip.compress(b"<html><body>" + b"<p>page text</p>" * 2000 + b"</body></html>")
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/page"
+    httpd.shutdown()
+
+
+def read_streamed(url: str, max_bytes: int | None = None) -> bytes:
+    body = b""
+    with http_session().get(url, stream=True, timeout=5) as response:
+        for chunk in response.iter_content(chunk_size=1024):
+            body += chunk
+            if max_bytes and len(body) >= max_bytes:
+                break
+    return body
+
+
+def test_replayed_response_streams(replay):
+    cassette.save("GET", "https://example.com/", None, 200, {"Content-Type": "text/html", "Content-Encoding": "gzip"}, 0.01, [(0.01, b"<p>one</p>"), (0.02, b"<p>two</p>")])
+    cassette.use("replay", str(replay), "zero")
+
+    assert read_streamed("https://example.com/") == b"<p>one</p><p>two</p>"
+    response = http_session().get("https://example.com/", timeout=5)
+    assert response.text == "<p>one</p><p>two</p>"
+
+
+def test_recording_keeps_what_the_caller_read(replay, server):
+    live = read_streamed(server, max_bytes=4096)
+    assert 4096 <= len(live) < 32000
+
+    cassette.use("replay", str(replay), "zero")
+    assert read_streamed(server) == live
+
+
+def test_recording_whole_responses(replay, server):
+    live = http_session().get(server, timeout=5).content
+    cassette.use("replay", str(replay), "zero")
+    assert http_session().get(server, timeout=5).content == live
@@ -0,0 +1,27 @@
+from context import ContextManager, digest_tool_output
+from tool_output import handles_note, output_handles
+
+NOTE = '\n\n[Output shortened. Call fetchToolOutput with handle "searchWeb-1a2b3c4d" and a query to read other parts of it.]'
+
+
+def test_digest_keeps_the_handle_of_a_stored_output():
+    digest = digest_tool_output("x" * 5000 + NOTE, max_chars=100)
+    assert len(digest) < 400
+    assert output_handles(digest) == ["searchWeb-1a2b3c4d"]
+
+
+def test_summary_keeps_the_handles_of_summarised_tool_outputs():
+    manager = ContextManager(keep_recent_turns=1)
+    previous = {"role": "system", "content": "Summary of the earlier conversation:\nOld.\n\n" + handles_note(["readFile-00aa11bb"])}
+    conversation = [
+        previous,
+        {"role": "user", "content": "Search the web"},
+        {"role": "assistant", "content": "", "tool_calls": [{"id": "1", "type": "function", "function": {"name": "searchWeb", "arguments": "{}"}}]},
+        {"role": "tool", "tool_call_id": "1", "content": "results" + NOTE},
+        {"role": "user", "content": "Thanks"},
+    ]
+    manager._pending[id(conversation)] = {"messages": conversation[1:4], "previous": previous, "summary": "The user searched the web."}
+    manager._apply_summary(conversation)
+
+    assert [message["role"] for message in conversation] == ["system", "user"]
+    assert output_handles(conversation[0]["content"]) == ["readFile-00aa11bb", "searchWeb-1a2b3c4d"]
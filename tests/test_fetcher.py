@@ -0,0 +1,52 @@
+import pytest
+
+from cassette import cassette, http_session
+from config import FETCHER_MIN_CHARS
+from fetcher import Fetcher
+
+ARTICLE = "<html><head><title>Page</title></head><body><nav>Menu</nav><article><h1>Title</h1>" + "<p>A paragraph of the article with enough words in it to count.</p>" * 20 + "</article></body></html>"
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    cassette.use("record", str(path), "zero")
+    yield path
+    cassette.use("off")
+
+
+def test_fetch_replayed_page(recorded):
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    cassette.save("GET", "https://example.com/article", None, 200, headers, 0.01, [(0.01, ARTICLE[:300].encode()), (0.02, ARTICLE[300:].encode())])
+    cassette.use("replay", str(recorded), "zero")
+
+    page = Fetcher(enabled=True).fetch("https://example.com/article")
+    assert page is not None
+    assert page["markdown"].startswith("# Title")
+    assert len(page["markdown"]) >= FETCHER_MIN_CHARS
+    assert "Menu" not in page["markdown"]
+
+
+def test_fetch_unknown_charset(recorded):
+    headers = {"Content-Type": "text/html; charset=x-unknown"}
+    cassette.save("GET", "https://example.com/charset", None, 200, headers, 0.01, [(0.01, ARTICLE.encode())])
+    cassette.use("replay", str(recorded), "zero")
+
+    assert Fetcher(enabled=True).fetch("https://example.com/charset") is not None
+
+
+def test_fetch_failure_leaves_page_to_browser(recorded, monkeypatch):
+    recorded.write_text("")
+    cassette.use("replay", str(recorded), "zero")
+    fetcher = Fetcher(enabled=True)
+
+    # Nothing recorded: a transport error
+    assert fetcher.fetch("https://example.com/missing") is None
+
+    # Any other failure of the response
+    def broken(*args, **kwargs):
+        raise AttributeError("'NoneType' object has no attribute 'close'")
+
+    monkeypatch.setattr(http_session(), "get", broken)
+    assert fetcher.fetch("https://example.com/broken") is None
+    assert fetcher.stats()["example.com"]["static_failed"] == 2
@@ -0,0 +1,25 @@
+from page_cache import PageCache
+
+
+def test_writes_only_evict_past_the_size_limit(tmp_path, monkeypatch):
+    cache = PageCache(path=str(tmp_path), max_bytes=2000)
+    evictions = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: (evictions.append(1), evict()))
+
+    for index in range(5):
+        cache.put_page(f"https://example.com/{index}", "", "x" * 100)
+    assert evictions == []
+
+    for index in range(5, 30):
+        cache.put_page(f"https://example.com/{index}", "", "x" * 100)
+    assert 0 < len(evictions) < 25
+    assert cache.stats()["pages"]["bytes"] <= 2000
+    assert cache.get_page("https://example.com/29")["markdown"] == "x" * 100
+
+
+def test_rewriting_an_entry_counts_its_new_size(tmp_path):
+    cache = PageCache(path=str(tmp_path), max_bytes=10_000)
+    cache.put_page("https://example.com/", "", "x" * 100)
+    cache.put_page("https://example.com/", "", "x" * 300)
+    assert cache._size == cache.stats()["pages"]["bytes"]
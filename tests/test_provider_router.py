@@ -0,0 +1,48 @@
+import time
+
+import openai
+
+from provider_router import ProviderRouter
+
+PRIMARY = ("https://primary.example/v1", "key", "model")
+SECOND = ("https://second.example/v1", "key", "model")
+THIRD = ("https://third.example/v1", "key", "model")
+
+
+def make_router(monkeypatch, calls: list, answers: dict):
+    router = ProviderRouter(fallbacks={}, hedge=True)
+    monkeypatch.setattr(router, "endpoints", lambda role: [PRIMARY, SECOND, THIRD])
+
+    def call(endpoint, kwargs, priority):
+        calls.append(endpoint)
+        delay, answer = answers[endpoint]
+        time.sleep(delay)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(router, "_call", call)
+    return router
+
+
+def test_requests_that_are_not_streamed_are_not_hedged(monkeypatch):
+    calls = []
+    router = make_router(monkeypatch, calls, {PRIMARY: (0.3, "primary")})
+    monkeypatch.setattr(router, "hedge_delay", lambda endpoint: 0.05)
+    assert router._chat("general", 0, {"messages": []}) == "primary"
+    assert calls == [PRIMARY]
+
+
+def test_hedge_delay_follows_the_endpoint_in_flight(monkeypatch):
+    calls, delays = [], []
+    failure = openai.APIConnectionError(request=None)
+    router = make_router(monkeypatch, calls, {PRIMARY: (0.0, failure), SECOND: (0.3, "second"), THIRD: (0.0, "third")})
+
+    def hedge_delay(endpoint):
+        delays.append(endpoint)
+        return 0.05
+
+    monkeypatch.setattr(router, "hedge_delay", hedge_delay)
+    assert router._chat("general", 0, {"messages": [], "stream": True}) == "third"
+    assert calls == [PRIMARY, SECOND, THIRD]
+    assert delays[-1] == SECOND
@@ -0,0 +1,43 @@
+import pytest
+
+from config import RESPONSE_CACHE_THRESHOLD
+from response_cache import ResponseCache, fingerprint, normalise, similarity
+from systemMsgs import AgentResponse
+
+
+def cached(question: str) -> ResponseCache:
+    cache = ResponseCache()
+    conversation = [{"role": "user", "content": question}]
+    cache.put(conversation, AgentResponse(assistant_response=f"Answer to {question}", code="", error="", points=[], sources=[]))
+    return cache
+
+
+def lookup(cache: ResponseCache, question: str):
+    return cache.get([{"role": "user", "content": question}])
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("convert 5 km to miles", "convert 5 miles to km"),
+    ("what is the capital of australia", "what is the capital of austria"),
+    ("who wrote the hobbit", "who wrote the rabbit"),
+    ("how many legs does a spider have", "how many legs does a spider need"),
+    ("what is 12 times 4", "what is 12 times 14"),
+])
+def test_near_misses_are_not_served(stored, asked):
+    assert lookup(cached(stored), asked) is None
+
+
+def test_near_misses_used_to_score_above_the_threshold():
+    # The trigram similarity alone cannot tell these apart
+    stored, asked = normalise("what is the capital of australia"), normalise("what is the capital of austria")
+    assert similarity(fingerprint(stored), fingerprint(asked)) >= RESPONSE_CACHE_THRESHOLD
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What is the capital of France?", "what is the capital of france"),
+    ("what is the capital of france", "what is capital of france"),
+])
+def test_rewordings_are_served(stored, asked):
+    response = lookup(cached(stored), asked)
+    assert response is not None
+    assert response.assistant_response == f"Answer to {stored}"
@@ -0,0 +1,62 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+
+
+async def fake_greet(name, assistant_name):
+    yield f"Hello {name}."
+
+
+async def fake_events(conversation, assistant_name=None):
+    yield "assistant_response", "Answer."
+
+
+def run(test, monkeypatch, limiter=None):
+    monkeypatch.setattr(server, "greet_me_async", fake_greet)
+    monkeypatch.setattr(server, "get_response_events_async", fake_events)
+
+    async def main():
+        app = server.AssistantServer(limiter=limiter)
+        async with TestClient(TestServer(app.app)) as client:
+            await test(app, client)
+
+    asyncio.run(main())
+
+
+def test_invalid_bodies_are_bad_requests(monkeypatch):
+    async def test(app, client):
+        for body in ("not json", "[1, 2]", '"text"'):
+            response = await client.post("/sessions", data=body, headers={"Content-Type": "application/json"})
+            assert response.status == 400
+        session = await (await client.post("/sessions")).json()
+        response = await client.post(f"/sessions/{session['session_id']}/turns", data="[]")
+        assert response.status == 400
+
+    run(test, monkeypatch)
+
+
+def test_greeting_waits_for_the_turn_limiter(monkeypatch):
+    async def test(app, client):
+        app.limiter.max_queued = 0
+        response = await client.post("/sessions", json={"greet": True})
+        assert response.status == 503
+        assert app.sessions == {}
+
+    run(test, monkeypatch)
+
+
+def test_queued_turn_does_not_hold_a_slot(monkeypatch):
+    async def test(app, client):
+        app.limiter = server.TurnLimiter(max_concurrent=1, max_queued=5, queue_timeout=1)
+        session = await (await client.post("/sessions")).json()
+        async with app.sessions[session["session_id"]].lock:
+            waiting = asyncio.create_task(client.post(f"/sessions/{session['session_id']}/turns", json={"text": "Hi"}))
+            await asyncio.sleep(0.1)
+            assert app.limiter.stats()["active"] == 0
+            assert app.limiter.stats()["queued"] == 0
+        response = await waiting
+        assert (await response.json())["assistant_response"] == "Answer."
+
+    run(test, monkeypatch)
@@ -0,0 +1,29 @@
+from streaming import AgentResponseStream, SentenceSplitter
+
+
+def test_sentences_are_emitted_as_they_complete():
+    splitter = SentenceSplitter()
+    assert splitter.feed("The capital of France") == []
+    assert splitter.feed(" is Paris. It has") == ["The capital of France is Paris."]
+    assert splitter.feed(" about two million people.\nAsk me") == ["It has about two million people."]
+    assert splitter.flush() == "Ask me"
+
+
+def test_short_sentences_are_joined():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Sure. Yes. That is right. ") == ["Sure. Yes. That is right."]
+    assert splitter.flush() == ""
+
+
+def test_plain_text_with_braces_is_streamed():
+    parser = AgentResponseStream()
+    assert parser.feed("Use a dict like ") == [("assistant_response", "Use a dict like ")]
+    assert parser.feed('{"a": 1} here.') == [("assistant_response", '{"a": 1} here.')]
+    assert parser.result().assistant_response == 'Use a dict like {"a": 1} here.'
+
+
+def test_fenced_json_is_parsed():
+    parser = AgentResponseStream()
+    events = parser.feed('```json\n{"assistant_response": "Hi", "points": ["a"]}\n```')
+    assert events == [("assistant_response", "Hi"), ("points", ["a"])]
+    assert parser.result().points == ["a"]
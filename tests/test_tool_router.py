@@ -0,0 +1,24 @@
+import json
+
+import systemMsgs as sysmsg
+from brain import format_agent_response
+from tool_router import asked_question
+
+
+def conversation(content: str):
+    return [{"role": "assistant", "content": content}, {"role": "user", "content": "yes"}]
+
+
+def test_question_in_a_formatted_response_with_sources():
+    response = sysmsg.AgentResponse(assistant_response="Should I search the web for it?", code="", error="", points=["a point."], sources=["https://example.com"])
+    assert asked_question(conversation(format_agent_response(response)))
+
+
+def test_sources_ending_with_a_question_mark_are_not_a_question():
+    response = sysmsg.AgentResponse(assistant_response="Here it is.", code="", error="", points=[], sources=["https://example.com/?"])
+    assert not asked_question(conversation(format_agent_response(response)))
+
+
+def test_question_in_a_json_response():
+    assert asked_question(conversation(json.dumps({"assistant_response": "Want more?", "points": ["x"]})))
+    assert not asked_question(conversation(json.dumps({"assistant_response": "Done.", "sources": ["why?"]})))
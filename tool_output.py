@@ -0,0 +1,114 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from config import *
+from metrics import metrics
+from relevance import top_chunks
+
+# Handle of a stored output, as the shortened output and compacted conversations name it
+HANDLE_PATTERN = re.compile(r'handle "([\w-]+)"')
+
+
+class ToolOutputStore:
+    """
+    Keeps the full output of the tool calls that were shortened, so the model can read more of it by handle.
+    The least recently used outputs are dropped once the store is full.
+    """
+
+    def __init__(self, max_entries: int = TOOL_OUTPUT_STORE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._outputs: OrderedDict[str, str] = OrderedDict()
+
+    def put(self, name: str, output: str) -> str:
+        """
+        Store a tool output, returns its handle.
+        """
+        handle = f"{name}-{hashlib.sha256(output.encode()).hexdigest()[:8]}"
+        with self._lock:
+            self._outputs[handle] = output
+            self._outputs.move_to_end(handle)
+            while len(self._outputs) > self.max_entries:
+                self._outputs.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> str | None:
+        with self._lock:
+            output = self._outputs.get(handle)
+            if output is not None:
+                self._outputs.move_to_end(handle)
+            return output
+
+
+store = ToolOutputStore()
+
+
+# Get the handles of the stored outputs mentioned in a text
+def output_handles(text: str) -> list[str]:
+    return list(dict.fromkeys(HANDLE_PATTERN.findall(text)))
+
+# Note telling the model how to read stored outputs, kept when the conversation is compacted
+def handles_note(handles: list[str]) -> str:
+    listed = ", ".join(f'handle "{handle}"' for handle in handles)
+    return f"[Stored tool outputs: {listed}. Call fetchToolOutput with a handle and a query to read them.]"
+
+# Get the character cap of a tool
+def output_cap(name: str) -> int:
+    return TOOL_OUTPUT_CAPS.get(name, TOOL_OUTPUT_MAX_CHARS)
+
+# Cap a tool output before it enters the conversation
+def cap_tool_output(name: str, output: str, query: str) -> str:
+    """
+    Shorten a tool output to the tool's character cap, keeping the passages most relevant to the query.
+    The full output is kept in the store, and the shortened output tells the model its handle.
+
+    Args:
+        name (str): The name of the tool.
+        output (str): The output of the tool.
+        query (str): The request the tool was called for.
+
+    Returns:
+        str: The output as it goes into the conversation.
+    """
+    cap = output_cap(name)
+    # Outputs read back from the store are already within the cap
+    if name == "fetchToolOutput" or len(output) <= cap:
+        return output
+
+    metrics.increment("tool_output.capped")
+    metrics.increment("tool_output.chars_dropped", len(output) - cap)
+    handle = store.put(name, output)
+    note = (
+        f"\n\n[Output shortened from {len(output)} characters to the passages most relevant to the request. "
+        f"Call fetchToolOutput with handle \"{handle}\" and a query to read other parts of it.]"
+    )
+    kept = top_chunks(output, query, cap - len(note))
+    print(f"Shortened the output of {name} from {len(output)} to {len(kept)} characters, stored as {handle}")
+    return kept + note
+
+# Fetch more of a shortened tool output
+def fetchToolOutput(handle: str, query: str = "", offset: int = 0) -> str:
+    """
+    Read a stored tool output, either the passages relevant to a query or the text from an offset.
+
+    Args:
+        handle (str): The handle of the stored output.
+        query (str): What to look for in the output.
+        offset (int): The character offset to read from, when no query is given.
+    """
+    output = store.get(handle)
+    metrics.increment("tool_output.fetches")
+    if output is None:
+        return f"No stored output with handle \"{handle}\"."
+
+    cap = output_cap("fetchToolOutput")
+    if query:
+        return top_chunks(output, query, cap)
+
+    offset = max(0, int(offset))
+    text = output[offset:offset + cap]
+    if offset + cap < len(output):
+        text += f"\n\n[{len(output) - offset - cap} more characters, continue from offset {offset + cap}.]"
+    return text
@@ -0,0 +1,63 @@
+import asyncio
+import importlib
+import threading
+import time
+from collections.abc import Mapping
+
+from tool_schemas import tools_list
+
+
+class ToolRegistry(Mapping):
+    """
+    The tool implementations by name. The tool names come from the schemas, the tools module
+    is only imported when a tool is first called, so a chat that uses no tools never loads it.
+    """
+
+    def __init__(self, module: str = "tools", schemas: list[dict] = tools_list):
+        self.module_name = module
+        self.names = [tool["function"]["name"] for tool in schemas]
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def module(self):
+        """
+        The tools module, imported on first use.
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    self._module = importlib.import_module(self.module_name)
+                    print(f"Loaded the tools in {time.perf_counter() - started:.2f}s")
+        return self._module
+
+    def __getitem__(self, name: str):
+        if name not in self.names:
+            raise KeyError(name)
+        return self.module.tools_dict[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    async def call_async(self, name: str, **arguments):
+        """
+        Call a tool without blocking the event loop, importing the tools in a worker thread if needed.
+        """
+        module = self._module or await asyncio.to_thread(lambda: self.module)
+        return await module.callToolAsync(name, **arguments)
+
+    def preload(self):
+        """
+        Import the tools in the background, e.g. once the assistant is idle.
+        """
+        threading.Thread(target=lambda: self.module, daemon=True).start()
+
+
+registry = ToolRegistry()
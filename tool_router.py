@@ -0,0 +1,251 @@
+import datetime
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from config import *
+from context import digest_assistant_output
+from relevance import tokenize
+from tool_schemas import (filesystem_tools, internet_tools, tools_list,
+                          vision_tools)
+
+# Patterns that clearly need a tool
+TOOL_PATTERNS = {
+    "getCurrentWeather": r"\b(weather|temperature outside|forecast|is it (going to )?(rain|snow)ing)\b",
+    "getCurrentDateTime": r"\b(what(?:'s| is)? the (time|date|day)|current (time|date)|time is it|today'?s date)\b",
+    "deepSearch": r"\b(search (for|the web|online)|look ?up|google|browse|latest|news|headlines|stock price|who won)\b",
+    "searchYoutube": r"\b(youtube|videos? (of|about|on))\b",
+    "searchSpotify": r"\b(spotify|play (me )?(a |some |the )?(song|music|album|playlist))\b",
+    "openBrowser": r"\b(open|visit|go to)\b.*(\b(link|url|website)\b|https?://\S+|www\.\S+)",
+    "getClipboardText": r"\b(clipboard|i (just )?copied|copied text)\b",
+    "analyseScreen": r"\b(my screen|the screen|screenshot|on my display|what am i looking at)\b",
+    "webcamCapture": r"\b(webcam|camera|what do you see|can you see me)\b",
+    "checkInternetConnectivity": r"\b(internet|wifi|wi-fi)\b.*\b(connect\w*|working|up|down|available)\b|\b(am i|are we) (online|connected)\b",
+    "codeAgent": r"\b(write|generate|create) (a |some |the )?(\w+ )?(code|script|program|function|class)\b",
+    "filesystem": (
+        r"\b(create|make|read|open|show|clear|empty|edit|update|append|write|save|list|delete|discuss)\b.*\b(files?|folders?|director(y|ies))\b"
+        r"|\b(my|this|that|the) (files?|folders?|director(y|ies))\b(?! system)|\bscratchpad\b|\b\w+\.(txt|md|py|json|csv|js|html|css)\b"
+    ),
+}
+
+# Patterns that clearly do not need a tool.
+# Yes, no, ok and sure are left out, they usually answer an offer to use a tool.
+CHAT_PATTERNS = [
+    r"(hi|hello|hey|yo|hiya|good (morning|afternoon|evening|night))( there)?( \w+)?",
+    r"(thanks|thank you|thank you so much|thanks a lot|cheers|cool|great|nice|awesome|perfect|got it)( \w+)?",
+    r"(bye|goodbye|see you|see ya|good night|talk (to you )?later)( \w+)?",
+    r"how are you( doing)?( today)?|how'?s it going|what'?s up|who are you|what'?s your name|what can you do",
+    r"(tell me a joke|make me laugh|you'?re (funny|great|awesome|smart))",
+]
+
+
+# Tool categories, the tools outside of every category are always offered
+TOOL_CATEGORIES = {
+    "filesystem": filesystem_tools,
+    "internet": internet_tools,
+    "vision": vision_tools,
+}
+
+
+# Route decision class
+class RouteDecision(BaseModel):
+    """
+    A class representing the decision of the local tool router.
+    """
+    decision: bool = Field(description="True if a tool is to be used.")
+    confidence: float = Field(description="The confidence of the router in its decision, between 0 and 1.")
+    reason: str = Field(description="What the decision was based on.")
+    tools: list[str] = Field(default_factory=list, description="The tools matched by the request.")
+
+
+# Get the latest user message
+def last_user_message(conversation: list[Dict[str, str]]) -> str:
+    for message in reversed(conversation):
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return ""
+
+# Get the spoken answer of an assistant message
+def assistant_answer(content: str) -> str:
+    """
+    Get the assistant_response of an assistant message, which holds the formatted agent response,
+    or the raw JSON one, followed by its points, code and sources.
+    """
+    content = content.strip()
+    if content.startswith("{"):
+        try:
+            fields = json.loads(content)
+        except json.JSONDecodeError:
+            return content
+        return str(fields.get("assistant_response") or "") if isinstance(fields, dict) else content
+    return digest_assistant_output(content)
+
+# Check if the assistant ended its latest message with a question
+def asked_question(conversation: list[Dict[str, str]]) -> bool:
+    for message in reversed(conversation):
+        if message.get("role") == "assistant" and isinstance(message.get("content"), str) and message["content"].strip():
+            return assistant_answer(message["content"]).strip().endswith("?")
+        if message.get("role") == "user" and message is not conversation[-1]:
+            return False
+    return False
+
+
+class ToolRouter:
+    """
+    Local, rule based router deciding if a request needs a tool without calling the decision model.
+    Clear cases are decided by keyword patterns, the rest by the lexical overlap with the tool
+    names and descriptions. Uncertain decisions are left to the decision model.
+    """
+
+    def __init__(self, tools: list[dict] = tools_list, log_path: str = ROUTER_LOG_PATH):
+        self.tools = tools
+        self.log_path = Path(log_path)
+        self._lock = threading.Lock()
+        self.patterns = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in TOOL_PATTERNS.items()}
+        self.chat_patterns = [re.compile(rf"^\s*({pattern})\s*[.!?]*\s*$", re.IGNORECASE) for pattern in CHAT_PATTERNS]
+
+        # Vocabulary of every tool, built from its name, description and parameter descriptions
+        self.vocabulary: dict[str, set[str]] = {}
+        for tool in tools:
+            function = tool["function"]
+            text = f"{function['name']} {function.get('description', '')}"
+            for parameter in function.get("parameters", {}).get("properties", {}).values():
+                text += f" {parameter.get('description', '')}"
+            self.vocabulary[function["name"]] = set(tokenize(text))
+
+        # Category of every tool, the "filesystem" pattern stands for the whole category
+        self.categories = {"filesystem": "filesystem"}
+        for category, category_tools in TOOL_CATEGORIES.items():
+            for tool in category_tools:
+                self.categories[tool["function"]["name"]] = category
+
+    def route(self, conversation: list[Dict[str, str]]) -> RouteDecision:
+        """
+        Decide if the latest user request needs a tool.
+
+        Args:
+            conversation (list): The conversation history.
+
+        Returns:
+            RouteDecision: The decision along with the router's confidence.
+        """
+        text = last_user_message(conversation)
+        if not text.strip():
+            return RouteDecision(decision=False, confidence=0.0, reason="no user message")
+
+        # A reply to a question of the assistant, e.g. an offer to search, is left to the decision model
+        if not asked_question(conversation):
+            for pattern in self.chat_patterns:
+                if pattern.match(text):
+                    return RouteDecision(decision=False, confidence=0.95, reason="conversational")
+
+        matched = [name for name, pattern in self.patterns.items() if pattern.search(text)]
+        if matched:
+            confidence = min(0.99, 0.85 + 0.05 * (len(matched) - 1))
+            return RouteDecision(decision=True, confidence=confidence, reason="keyword", tools=matched)
+
+        # Lexical overlap with the tool descriptions
+        tokens = set(tokenize(text))
+        if not tokens:
+            return RouteDecision(decision=False, confidence=0.5, reason="no content words")
+        scores = {name: len(tokens & vocabulary) / len(tokens) for name, vocabulary in self.vocabulary.items()}
+        best_tool, best_score = max(scores.items(), key=lambda item: item[1])
+        if best_score >= 0.5:
+            return RouteDecision(decision=True, confidence=0.5 + best_score / 2, reason="lexical", tools=[best_tool])
+
+        # Nothing in common with any tool, but factual questions may still need fresh data
+        confidence = 0.75 if len(tokens) <= 3 and best_score == 0 else 0.6 - best_score
+        return RouteDecision(decision=False, confidence=confidence, reason="lexical")
+
+    def select_tools(self, conversation: list[Dict[str, str]], recent_turns: int = TOOL_SUBSET_RECENT_TURNS) -> list[dict]:
+        """
+        Select the tool schemas relevant to the latest request, by category.
+        A category is picked when the request matches one of its tools, or when one of its tools
+        was used in the recent turns. Uncategorised tools are always included, and the full list
+        is returned when no category matches.
+
+        Args:
+            conversation (list): The conversation history.
+            recent_turns (int): The number of latest user turns whose tool usage is taken into account.
+
+        Returns:
+            list: The selected tool schemas, in the order of the full tool list.
+        """
+        text = last_user_message(conversation)
+        names = [name for name, pattern in self.patterns.items() if pattern.search(text)]
+
+        tokens = set(tokenize(text))
+        if tokens:
+            names += [name for name, vocabulary in self.vocabulary.items() if len(tokens & vocabulary) / len(tokens) >= 0.5]
+
+        # Tools called during the recent turns, including the current one
+        turns = 0
+        for message in reversed(conversation):
+            if message.get("role") == "user":
+                turns += 1
+                if turns > recent_turns:
+                    break
+            for tool in message.get("tool_calls") or []:
+                names.append(tool["function"]["name"])
+
+        selected = {self.categories[name] for name in names if name in self.categories}
+        if not selected:
+            return self.tools
+
+        tools = [tool for tool in self.tools if self.categories.get(tool["function"]["name"], "general") in selected | {"general"}]
+        print(f"Offering {len(tools)} of {len(self.tools)} tools ({', '.join(sorted(selected))})")
+        return tools
+
+    def log(self, conversation: list[Dict[str, str]], route: RouteDecision, llm_decision: Optional[bool] = None):
+        """
+        Append a routing decision to the router log, alongside the decision model's verdict when known.
+        """
+        record = {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "text": last_user_message(conversation),
+            "decision": route.decision,
+            "confidence": round(route.confidence, 3),
+            "reason": route.reason,
+            "tools": route.tools,
+            "llm_decision": llm_decision,
+        }
+        try:
+            with self._lock:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log_path, mode="a", encoding="utf-8") as file:
+                    file.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing router log: {e}")
+
+
+# Compare the router log against the decision model
+def router_agreement(log_path: str = ROUTER_LOG_PATH) -> dict:
+    """
+    Summarise how often the local router agreed with the decision model.
+
+    Returns:
+        dict: The number of compared decisions and the agreement rate, overall and per reason.
+    """
+    compared: dict[str, list[bool]] = {}
+    with open(log_path, mode="r", encoding="utf-8") as file:
+        for line in file:
+            record = json.loads(line)
+            if record.get("llm_decision") is None:
+                continue
+            compared.setdefault(record["reason"], []).append(record["decision"] == record["llm_decision"])
+
+    total = [agreed for results in compared.values() for agreed in results]
+    summary = {"compared": len(total), "agreement": sum(total) / len(total) if total else None}
+    for reason, results in compared.items():
+        summary[reason] = {"compared": len(results), "agreement": sum(results) / len(results)}
+    return summary
+
+
+router = ToolRouter()
+
+if __name__ == "__main__":
+    print(json.dumps(router_agreement(), indent=2))
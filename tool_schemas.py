@@ -0,0 +1,376 @@
+# Tool schemas, kept apart from the implementations so they can be offered to the models
+# without importing the tools and their dependencies
+
+# Default number of pages scraped by deepSearch
+NUMBER_OF_URLS_TO_SCRAPE = 5
+
+# Tool definitions
+deep_search_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'deepSearch',
+        'description': 'Perform a web search for the given query and get the top result.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'query': {
+                    'type': 'string',
+                    'description': 'The query to search for on the internet.'
+                },
+                'num_results': {
+                    'type': 'integer',
+                    'description': f'The number of search results to return. Default value is {NUMBER_OF_URLS_TO_SCRAPE}.'
+                },
+            },
+            'required': ['query', 'num_results']
+        }
+    }
+}
+
+open_browser_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'openBrowser',
+        'description': 'Open a link in the web browser.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'link': {
+                    'type': 'string',
+                    'description': 'The link to open in the web browser.'
+                },
+            },
+            'required': ['link']
+        }
+    }
+}
+
+search_youtube_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'searchYoutube',
+        'description': 'Search for music or videos on YouTube based on the given query.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'query': {
+                    'type': 'string',
+                    'description': 'The search query to find videos on YouTube.'
+                },
+            },
+            'required': ['query']
+        }
+    }
+}
+
+search_spotify_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'searchSpotify',
+        'description': 'Search for the song name or artist on Spotify based on the given query.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'query': {
+                    'type': 'string',
+                    'description': 'The search query to find music on Spotify.'
+                },
+            },
+            'required': ['query']
+        }
+    }
+}
+
+get_clipboard_text_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'getClipboardText',
+        'description': 'Get the mosty recent copied text from the clipboard.',
+    },
+}
+
+check_internet_connectivity_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'checkInternetConnectivity',
+        'description': 'Check if the system is connected to the internet',
+    },
+}
+
+get_current_date_time_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'getCurrentDateTime',
+        'description': 'Get the current date and time in a human-readable format.',
+    }
+}
+
+get_current_weather_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'getCurrentWeather',
+        'description': 'Get the current weather for a city.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'city': {
+                    'type': 'string',
+                    'description': 'The city to get the weather for.'
+                },
+            },
+            'required': ['city']
+        }
+    }
+}
+
+check_screen_contents = {
+    'type': 'function',
+    'function': {
+        'name': 'analyseScreen',
+        'description': 'Take a screenshot and analyze the contents of the user\'s screen.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'prompt': {
+                    'type': 'string',
+                    'description': 'A prompt to guide the vision model in analyzing the screenshot.'
+                },
+            },
+            'required': ['prompt']
+        }
+    }
+}
+
+webcam_capture_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'webcamCapture',
+        'description': 'Capture an image from the webcam and analyze the contents.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'prompt': {
+                    'type': 'string',
+                    'description': 'A prompt to guide the vision model in analyzing the webcam image.'
+                },
+            },
+            'required': ['prompt']
+        }
+    }
+}
+
+create_file_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'create_file',
+        'description': 'Create a file with the given content.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'file_path': {
+                    'type': 'string',
+                    'description': 'The path to the file to create, of the form "directory/filename.extension".'
+                },
+                'content': {
+                    'type': 'string',
+                    'description': 'The content to write to the file.'
+                },
+            },
+            'required': ['file_path', 'content']
+        }
+    }
+}
+
+read_file_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'read_file',
+        'description': 'Read the contents of a file.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'file_path': {
+                    'type': 'string',
+                    'description': 'The path to the file to read, of the form "directory/filename.extension".'
+                },
+            },
+            'required': ['file_path']
+        }
+    }
+}
+
+clear_file_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'clear_file',
+        'description': 'Clear the contents of a file.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'file_path': {
+                    'type': 'string',
+                    'description': 'The path to the file to clear, of the form "directory/filename.extension".'
+                },
+            },
+            'required': ['file_path']
+        }
+    }
+}
+
+edit_file_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'edit_file',
+        'description': 'Edit a file by replacing the original content with the new content.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'file_path': {
+                    'type': 'string',
+                    'description': 'The path to the file to edit, of the form "directory/filename.extension".'
+                },
+                'original_content': {
+                    'type': 'string',
+                    'description': 'The exact original content to replace in the file.'
+                },
+                'new_content': {
+                    'type': 'string',
+                    'description': 'The new content to write to the file.'
+                },
+            },
+        }
+    }
+}
+
+discuss_file_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'discuss_file',
+        'description': 'Discuss the contents of a file based on a query.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'file_path': {
+                    'type': 'string',
+                    'description': 'The path to the file to discuss.'
+                },
+                'query': {
+                    'type': 'string',
+                    'description': 'The query to discuss.'
+                },
+            },
+            'required': ['file_path', 'query']
+        }
+    }
+}
+
+list_files_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'list_files',
+        'description': 'List the files in a directory.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'directory': {
+                    'type': 'string',
+                    'description': 'The directory to list the files in, leave empty for the current directory.'
+                },
+            },
+        }
+    }
+}
+
+code_agent_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'codeAgent',
+        'description': 'Generate code for a given user prompt.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'prompt': {
+                    'type': 'string',
+                    'description': 'The prompt stating the detailed user\'s requirements of what they want the code for.'
+                },
+            },
+            'required': ['prompt']
+        }
+    }
+}
+
+fetch_tool_output_tool = {
+    'type': 'function',
+    'function': {
+        'name': 'fetchToolOutput',
+        'description': 'Read more of a tool output that was shortened, using the handle given in the shortened output.', 
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'handle': {
+                    'type': 'string',
+                    'description': 'The handle of the shortened output.'
+                },
+                'query': {
+                    'type': 'string',
+                    'description': 'What to look for in the output, leave empty to read it from the offset.'
+                },
+                'offset': {
+                    'type': 'integer',
+                    'description': 'The character offset to read from when no query is given. Default value is 0.'
+                },
+            },
+            'required': ['handle']
+        }
+    }
+}
+
+
+# list of tools
+tools_list = [
+    check_internet_connectivity_tool, 
+    deep_search_tool, 
+    search_youtube_tool, 
+    search_spotify_tool, 
+    check_screen_contents, 
+    webcam_capture_tool, 
+    code_agent_tool, 
+    open_browser_tool, 
+    get_current_weather_tool, 
+    get_clipboard_text_tool, 
+    get_current_date_time_tool, 
+    create_file_tool, 
+    read_file_tool, 
+    clear_file_tool, 
+    edit_file_tool, 
+    discuss_file_tool, 
+    list_files_tool, 
+    fetch_tool_output_tool, 
+    ]
+
+# List of tools by category
+# fs tools
+filesystem_tools = [
+    create_file_tool, 
+    read_file_tool, 
+    clear_file_tool, 
+    edit_file_tool, 
+    discuss_file_tool, 
+    list_files_tool,
+]
+
+# internet tools
+internet_tools = [
+    deep_search_tool, 
+    check_internet_connectivity_tool, 
+    get_current_weather_tool, 
+    open_browser_tool, 
+    search_youtube_tool, 
+    search_spotify_tool, 
+]
+
+# vision tools
+vision_tools = [
+    check_screen_contents,
+    webcam_capture_tool,
+]
@@ -1,6 +1,5 @@
 import asyncio
 import base64
-import datetime
 import json
 import os
 import socket
@@ -9,46 +8,32 @@ from pathlib import Path
 from textwrap import dedent
 from urllib.parse import quote
 
-import cv2
-import pyperclip
-import requests
-from crawl4ai import (AsyncWebCrawler, BrowserConfig, CacheMode,
-                      CrawlerRunConfig, LLMExtractionStrategy)
-from crawl4ai.async_configs import LlmConfig
-from crawl4ai.content_filter_strategy import LLMContentFilter
-from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 from dotenv import load_dotenv
-from openai import OpenAI
-from PIL import ImageGrab
 
+import browser_pool
+import page_cache
+import provider_router
 import systemMsgs as sysmsg
+from cassette import http_session
+from clients import get_client
 from config import *
+from fetcher import fetcher
+from rate_limiter import RateLimitTimeout, limiter
+from relevance import top_chunks
+from tool_output import fetchToolOutput
+from tool_schemas import *
 from utils import *
 
 load_dotenv()
 
 # Constants
+# The directories are created by the tools writing to them
 working_directory = Path("./work_dir").resolve()
 temp_directory = Path("./work_dir/temp").resolve()
 SCRATCHPAD_PATH = Path("./work_dir/scratchpad.md").resolve()
 
-working_directory.mkdir(parents=True, exist_ok=True)
-temp_directory.mkdir(parents=True, exist_ok=True)
-
 
 ## General Functions
-# Check current time
-def getCurrentDateTime():
-    """
-    Get the current time in a human-readable format.
-
-    Returns:
-        str: The current time as a string.
-    """
-
-    now = datetime.datetime.now()
-    return now.strftime("%I:%M %p, %d %B %Y")
-
 # Check internet connectivity
 def checkInternetConnectivity():
     """
@@ -76,7 +61,7 @@ def getCurrentWeather(city:str) -> str:
 
     city_encoded = city.replace(" ", "+")
     base_url = f"http://wttr.in/{city_encoded}?format=j1"
-    response = requests.get(base_url, timeout=10)
+    response = http_session().get(base_url, timeout=10)
     data = response.json()
 
     current_stats = {}
@@ -130,21 +115,106 @@ def getCurrentWeather(city:str) -> str:
 
 
 ## Web Scraper Functions
+# Markdown settings of the scraped pages
+SCRAPER_MARKDOWN_OPTIONS = {
+    "body_width": 100,
+    "ignore_emphasis": True,
+    "ignore_links": True,
+    "ignore_images": True,
+    "escape_html": True,
+}
+
+# Crawl settings of the scraper
+def scraper_run_config(content_filter=None, extraction_strategy=None):
+    from crawl4ai import CacheMode, CrawlerRunConfig
+    from crawl4ai.markdown_generation_strategy import \
+        DefaultMarkdownGenerator
+
+    return CrawlerRunConfig(
+        extraction_strategy=extraction_strategy,
+        markdown_generator=DefaultMarkdownGenerator(content_filter=content_filter, options=SCRAPER_MARKDOWN_OPTIONS),
+        exclude_social_media_links=True,
+        keep_data_attributes=False,
+        process_iframes=False,
+        remove_overlay_elements=True,
+        excluded_tags=SCRAPER_EXCLUDED_TAGS,
+        # crawl4ai's own cache stays off, pages and extracted content are cached by page_cache
+        cache_mode=CacheMode.BYPASS,
+    )
+
+# Extract the passages of a page relevant to a query, without model calls
+def local_extraction(page: dict, query: str):
+    if not page["markdown"].strip():
+        return "Could not find any content on the page.", False
+    return top_chunks(page["markdown"], query, SCRAPER_LOCAL_MAX_CHARS, max_chunks=SCRAPER_LOCAL_TOP_K), True
+
 # Scraper helper function
-async def scraper_helper(url: str, query: str):
+async def scraper_helper(url: str, query: str, page: dict | None = None, crawler=None):
+    """
+    Scrape a URL and extract the content relevant to the query.
+    Static pages are fetched with a plain HTTP GET, the rest are rendered in the browser.
+    The relevant passages are ranked locally, or extracted by the scraper model in the "llm" extraction mode.
+
+    Args:
+        url (str): The URL to scrape.
+        query (str): The query the content is extracted for.
+        page (dict): The already fetched page, with its HTML and markdown.
+        crawler (AsyncWebCrawler): The crawler to scrape with, one of the browser pool's if not given.
+
+    Returns:
+        tuple: The extracted content and whether the scrape succeeded.
+    """
+    # The same question about the same page is answered from the page cache, without a browser.
+    # The cache reads and writes files and the local extraction ranks passages, both run in worker threads.
+    if (cached := await asyncio.to_thread(page_cache.cache.get_extract, url, query)) is not None:
+        print(f"Extracted content of {url} found in the page cache.")
+        return cached, True
+
+    page = page or await asyncio.to_thread(page_cache.cache.get_page, url)
+    if page is None and (page := await fetcher.fetch_async(url)):
+        await asyncio.to_thread(page_cache.cache.put_page, url, page["html"], page["markdown"])
+    if page and SCRAPER_EXTRACTION_MODE == "local":
+        return await asyncio.to_thread(local_extraction, page, query)
+    if crawler is not None:
+        return await browser_scrape(url, query, page, crawler=crawler)
+    return await browser_pool.pool.run_async(browser_scrape, url, query, page)
+
+# Scrape a URL in the browser
+async def browser_scrape(url: str, query: str, page: dict | None, crawler):
+    """
+    Render a page in the browser, or extract an already fetched page, after the page cache was checked.
+
+    Args:
+        url (str): The URL to scrape.
+        query (str): The query the content is extracted for.
+        page (dict): The fetched or cached page, None if the browser has to render it.
+        crawler (AsyncWebCrawler): The crawler to scrape with.
+
+    Returns:
+        tuple: The extracted content and whether the scrape succeeded.
+    """
+    # The local mode only needs the rendered page's markdown
+    if SCRAPER_EXTRACTION_MODE == "local":
+        if page is None:
+            result = await crawler.arun(url=url, config=scraper_run_config())
+            fetcher.record(url, "browser" if result.success else "failed")
+            if not result.success:
+                print(f"Error in scraping: {result.error_message}")
+                return "Could not scrape the URL.", False
+            page = {"html": result.cleaned_html or "", "markdown": result.markdown.raw_markdown}
+            await asyncio.to_thread(page_cache.cache.put_page, url, page["html"], page["markdown"])
+        return await asyncio.to_thread(local_extraction, page, query)
+
+    # crawl4ai takes seconds to import, it is only loaded once a page is scraped
+    from crawl4ai import LLMExtractionStrategy
+    from crawl4ai.async_configs import LlmConfig
+    from crawl4ai.content_filter_strategy import LLMContentFilter
+
     instruction = dedent(f"""
                          Extract information relevant to \"{query}\".
                          Include key concepts, explanations, examples, and essential details.
                          Format the output as a clean structured markdown with proper headers. Remove any unnecessary information.""")
 
-    browser_config = BrowserConfig(
-        user_agent_mode="random",
-        text_mode=True,
-        light_mode=True,
-        extra_args=["--disable-extensions", "--disable-infobars", "--disable-dev-tools", "--window-size=1920x1080"],
-        # verbose=True,
-    )
-
     llm_config = LlmConfig(
             provider=f"{SCRAPER_PROVIDER}/{SCRAPER_MODEL}",
             api_token=SCRAPER_API_KEY,
@@ -169,72 +239,64 @@ async def scraper_helper(url: str, query: str):
         # verbose=True,
     )
 
-    markdown_generator = DefaultMarkdownGenerator(
-        content_filter=llm_filter,
-        options={
-            "body_width": 100,
-            "ignore_emphasis": True,
-            "ignore_links": True,
-            "ignore_images": True,
-            "escape_html": True,
-        }
-    )
-
-    crawl_config = CrawlerRunConfig(
-        extraction_strategy=llm_strategy,
-        markdown_generator=markdown_generator,
-        exclude_social_media_links=True,
-        keep_data_attributes=False,
-        process_iframes=False,
-        remove_overlay_elements=True,
-        excluded_tags=["form", "header", "footer", "script", "style", "nav", "img", "a"],
-        cache_mode=CacheMode.BYPASS,
-    )
+    crawl_config = scraper_run_config(content_filter=llm_filter, extraction_strategy=llm_strategy)
 
-    async with AsyncWebCrawler(config=browser_config) as crawler:
-        result = await crawler.arun(url=url, config=crawl_config)
-
-        if result.success:
-            print("Scraping successful.")
-            try:
-                extracted_content = result.extracted_content
-                print("\nContent extracted successfully.")
-                response = json.loads(extracted_content)
-
-                result = ""
-                for item in response:
-                    error = item.get("error", None)
-                    if error == "true":
-                        print(f"Error in item: {item.get("index")}")
-                        continue
-                    content = item.get("content", "")
-                    if isinstance(content, list):
-                        content = " ".join(content)
-                    elif isinstance(content, str):
-                        content = content.strip()
-                    if content:
-                        result += content + "\n"
-                    else:
-                        print(f"No content found in item: {item.get("index")}")
-                        continue
-                
-                result = result.strip()
-                print("\nContent parsed successfully.")
-                print("Content length: ", len(result))
-
-                print("---")
-                llm_filter.show_usage()
-                llm_strategy.show_usage()
-                print("---")
-                print("\n")
-
-                return result, True
-            except (json.JSONDecodeError, KeyError, IndexError) as e:
-                print(f"Error parsing JSON response: {e}")
-                return "Could not parse the extracted content.", False
-        else:
-            print(f"Error in scraping: {result.error_message}")
-            return "Could not scrape the URL.", False
+    # crawl4ai makes the extraction and filter requests itself, so they are reserved up front
+    try:
+        await limiter.acquire_async(SCRAPER_BASE_URL, SCRAPER_MODEL, tokens=SCRAPER_CALLS_PER_PAGE)
+    except RateLimitTimeout as e:
+        print(f"Error in scraping: {e}")
+        return "Could not scrape the URL.", False
+
+    # A fetched or cached page is only extracted, without rendering it
+    result = await crawler.arun(url=f"raw:{page['html']}" if page else url, config=crawl_config)
+    if page is None:
+        fetcher.record(url, "browser" if result.success else "failed")
+    if result.success:
+        print("Scraping successful.")
+        if page is None:
+            await asyncio.to_thread(page_cache.cache.put_page, url, result.cleaned_html or "", result.markdown.raw_markdown)
+        try:
+            extracted_content = result.extracted_content
+            print("\nContent extracted successfully.")
+            response = json.loads(extracted_content)
+
+            result = ""
+            for item in response:
+                error = item.get("error", None)
+                if error == "true":
+                    print(f"Error in item: {item.get("index")}")
+                    continue
+                content = item.get("content", "")
+                if isinstance(content, list):
+                    content = " ".join(content)
+                elif isinstance(content, str):
+                    content = content.strip()
+                if content:
+                    result += content + "\n"
+                else:
+                    print(f"No content found in item: {item.get("index")}")
+                    continue
+            
+            result = result.strip()
+            if result:
+                await asyncio.to_thread(page_cache.cache.put_extract, url, query, result)
+            print("\nContent parsed successfully.")
+            print("Content length: ", len(result))
+
+            print("---")
+            llm_filter.show_usage()
+            llm_strategy.show_usage()
+            print("---")
+            print("\n")
+
+            return result, True
+        except (json.JSONDecodeError, KeyError, IndexError) as e:
+            print(f"Error parsing JSON response: {e}")
+            return "Could not parse the extracted content.", False
+    else:
+        print(f"Error in scraping: {result.error_message}")
+        return "Could not scrape the URL.", False
 
 # Scrape URL function
 def scrapeURL(url: str, query: str):
@@ -242,7 +304,6 @@ def scrapeURL(url: str, query: str):
     return result
 
 # Web browse function
-NUMBER_OF_URLS_TO_SCRAPE = 5
 def deepSearch(query: str, num_results: int = NUMBER_OF_URLS_TO_SCRAPE):
     """
     Perform a deep search, scraping mutiple urls.
@@ -254,6 +315,11 @@ def deepSearch(query: str, num_results: int = NUMBER_OF_URLS_TO_SCRAPE):
     Returns:
         str: A detailed analysis on the query.
     """
+    return asyncio.run(deepSearchAsync(query, num_results))
+
+# Web browse function, async implementation
+async def deepSearchAsync(query: str, num_results: int = NUMBER_OF_URLS_TO_SCRAPE):
+    import requests
 
     if isinstance(num_results, str):
         try:
@@ -278,66 +344,81 @@ def deepSearch(query: str, num_results: int = NUMBER_OF_URLS_TO_SCRAPE):
     }
     try:
         print("Scraping the web...\n")
-        response = requests.get(EngineURL, params=params, timeout=10)
+        response = await asyncio.to_thread(http_session().get, EngineURL, params=params, timeout=10)
     except requests.exceptions.RequestException as e:
         print(f"Error in deepSearch: {e}")
         return "An error occurred while browsing the web."
 
     results = response.json()['results']
-    web_results: list[dict] = []
-    num_res = 0
-    try:
-        for result in results:
-            if num_res >= num_results:
-                break
+    if not results:
+        return "No results found on the web."
+
+    # Every candidate is scraped concurrently with the pooled browsers, the remaining scrapes are cancelled once enough pages succeeded
+    semaphore = asyncio.Semaphore(SCRAPER_CONCURRENCY)
+
+    async def scrape(rank: int, result: dict):
+        async with semaphore:
             url = result['url']
-            title = result['title']
-            category = result['category']
-            print()
-            print(f"URL: {url}")
-            print(f"Title: {title}")
-            web_content, access = scrapeURL(url=url, query=query)
+            print(f"Scraping {url} ({result['title']})")
+            try:
+                web_content, access = await asyncio.wait_for(scraper_helper(url=url, query=query), timeout=SCRAPER_URL_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"Scraping timed out: {url}")
+                return rank, result, None
             if not access:
                 print(f"Error in scraping URL: {url}")
-                continue
+                return rank, result, None
             print(f"Scraped content length: {len(web_content)}")
-            print(f"Content: {web_content[:200]}...")
 
             if len(web_content) > 50000:
-                client = OpenAI(base_url=SUMMARISATION_BASE_URL, api_key=SUMMARISATION_API_KEY)
-                web_content = client.chat.completions.create(
-                    model=SUMMARISATION_MODEL,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": f"Extract and summarise only the relevant information from the given content which answers or completely fulfills the query: {query}. Structure the output in a clean markdown format with proper headers. Remove any unnecessary information."
-                        },
-                        {
-                            "role": "user",
-                            "content": f"CONTENT: {web_content}"
-                        }
-                    ],
-                ).choices[0].message.content
+                web_content = await summariseWebContent(web_content, query)
+            return rank, result, web_content
 
-            web_results.append(f"TITLE: {result['title']}\n--URL: {url}\n---\n{web_content}---\n\n")
-
-            # web_results.append(
-            #     {
-            #         "title": title,
-            #         "url": url,
-            #         "content": web_content,
-            #         "category": category
-            #     }
-            # )
-
-            num_res += 1
-    except Exception as e:
-        print(f"Error in deepSearch: {e}")
-        return "An error occurred while browsing the web."
-    
-    print(f"{num_res} Results found.")
+    pages = []
+    tasks = [asyncio.create_task(scrape(rank, result)) for rank, result in enumerate(results)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            try:
+                rank, result, web_content = await task
+            except Exception as e:
+                print(f"Error in scraping: {e}")
+                continue
+            if web_content is not None:
+                pages.append((rank, result, web_content))
+            if len(pages) >= num_results:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Pages are listed in the order of the search results
+    web_results = [
+        f"TITLE: {result['title']}\n--URL: {result['url']}\n---\n{web_content}---\n\n"
+        for rank, result, web_content in sorted(pages, key=lambda page: page[0])
+    ]
+    print(f"{len(web_results)} Results found.")
     return web_results
 
+# Summarise long web content
+async def summariseWebContent(web_content: str, query: str) -> str:
+    # The provider router's pooled sync clients are shared with every other caller, whichever event loop this runs in
+    response = await asyncio.to_thread(
+        provider_router.router.chat,
+        "summarisation",
+        messages=[
+            {
+                "role": "system",
+                "content": f"Extract and summarise only the relevant information from the given content which answers or completely fulfills the query: {query}. Structure the output in a clean markdown format with proper headers. Remove any unnecessary information."
+            },
+            {
+                "role": "user",
+                "content": f"CONTENT: {web_content}"
+            }
+        ],
+    )
+    return response.choices[0].message.content
+
 # Web search function
 def webSearch(query: str, engines: list[str], num_results: int = 10):
     """
@@ -348,6 +429,7 @@ def webSearch(query: str, engines: list[str], num_results: int = 10):
         engines (list): The search engines to use. Options are "brave", "duckduckgo", "google", "bing", "arxiv", "github".
         num_results (int): The number of search results to return. Default is 10.
     """
+    import requests
 
     try:
         if isinstance(num_results, str):
@@ -367,7 +449,7 @@ def webSearch(query: str, engines: list[str], num_results: int = 10):
         }
         try:
             print("Searching the web...\n")
-            response = requests.get(EngineURL, params=params, timeout=10)
+            response = http_session().get(EngineURL, params=params, timeout=10)
         except requests.exceptions.RequestException as e:
             print(f"Error in deepSearch: {e}")
             return "Could not get web results."
@@ -460,6 +542,8 @@ def getClipboardText():
     Get the text from the clipboard.
     """
 
+    import pyperclip
+
     clipboard_content = pyperclip.paste()
     if isinstance(clipboard_content, str):
         return clipboard_content
@@ -477,6 +561,8 @@ def analyseScreen(prompt: str):
         prompt (str): The prompt to guide the vision model.
     """
 
+    from PIL import ImageGrab
+
     try:
         path = f"{temp_directory}/ss.png"
         path = Path(path)
@@ -500,6 +586,8 @@ def webcamCapture(prompt: str):
         prompt (str): The prompt to guide the vision model.
     """
 
+    import cv2
+
     try:
         webcam = cv2.VideoCapture(0)
         if not webcam.isOpened():
@@ -536,7 +624,8 @@ def visionPrompt(prompt: str, imgpath: str):
     base64image = encode_image(imgpath)
     try:
         print(f"Using : {VISION_MODEL}")
-        client = OpenAI(base_url=VISION_BASE_URL, api_key=VISION_API_KEY)
+        limiter.acquire(VISION_BASE_URL, VISION_MODEL)
+        client = get_client(VISION_BASE_URL, VISION_API_KEY)
         response = client.chat.completions.create(
             model=VISION_MODEL,
             messages=[
@@ -570,7 +659,8 @@ def codeAgent(prompt: str):
     Generate code snippets based on a prompt.
     """
     system_prompt = sysmsg.code_agent_system_prompt.copy()    
-    client = OpenAI(base_url=CODE_BASE_URL, api_key=CODE_API_KEY)
+    limiter.acquire(CODE_BASE_URL, CODE_MODEL)
+    client = get_client(CODE_BASE_URL, CODE_API_KEY)
     response = client.chat.completions.create(
         model=CODE_MODEL,
         messages=[
@@ -683,9 +773,8 @@ def discuss_file(file_path: str, query: str):
 
     try:
         content = read_file(file_path)
-        client = OpenAI(base_url=SUMMARISATION_BASE_URL, api_key=SUMMARISATION_API_KEY)
-        response = client.chat.completions.create(
-            model=SUMMARISATION_MODEL,
+        response = provider_router.router.chat(
+            "summarisation",
             messages=[
                 sysmsg.file_discussion_system_prompt,                                                      # type: ignore
                 {"role": "user", "content": f"File: {file_path}\nQuery: {query}\nContent: {content}"},
@@ -704,6 +793,7 @@ def list_files(directory: str = "") -> list[str]:
         directory: The directory to list files in
     """
     try:
+        working_directory.mkdir(parents=True, exist_ok=True)
         path = str(working_directory.resolve()) + "/" + directory
         files = os.listdir(path)
         print(f"Files in {path}: {files}")
@@ -713,350 +803,6 @@ def list_files(directory: str = "") -> list[str]:
         return ["Error listing files."]
 
 
-# Tool definitions
-deep_search_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'deepSearch',
-        'description': 'Perform a web search for the given query and get the top result.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'query': {
-                    'type': 'string',
-                    'description': 'The query to search for on the internet.'
-                },
-                'num_results': {
-                    'type': 'integer',
-                    'description': f'The number of search results to return. Default value is {NUMBER_OF_URLS_TO_SCRAPE}.'
-                },
-            },
-            'required': ['query', 'num_results']
-        }
-    }
-}
-
-open_browser_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'openBrowser',
-        'description': 'Open a link in the web browser.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'link': {
-                    'type': 'string',
-                    'description': 'The link to open in the web browser.'
-                },
-            },
-            'required': ['link']
-        }
-    }
-}
-
-search_youtube_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'searchYoutube',
-        'description': 'Search for music or videos on YouTube based on the given query.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'query': {
-                    'type': 'string',
-                    'description': 'The search query to find videos on YouTube.'
-                },
-            },
-            'required': ['query']
-        }
-    }
-}
-
-search_spotify_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'searchSpotify',
-        'description': 'Search for the song name or artist on Spotify based on the given query.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'query': {
-                    'type': 'string',
-                    'description': 'The search query to find music on Spotify.'
-                },
-            },
-            'required': ['query']
-        }
-    }
-}
-
-get_clipboard_text_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'getClipboardText',
-        'description': 'Get the mosty recent copied text from the clipboard.',
-    },
-}
-
-check_internet_connectivity_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'checkInternetConnectivity',
-        'description': 'Check if the system is connected to the internet',
-    },
-}
-
-get_current_date_time_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'getCurrentDateTime',
-        'description': 'Get the current date and time in a human-readable format.',
-    }
-}
-
-get_current_weather_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'getCurrentWeather',
-        'description': 'Get the current weather for a city.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'city': {
-                    'type': 'string',
-                    'description': 'The city to get the weather for.'
-                },
-            },
-            'required': ['city']
-        }
-    }
-}
-
-check_screen_contents = {
-    'type': 'function',
-    'function': {
-        'name': 'analyseScreen',
-        'description': 'Take a screenshot and analyze the contents of the user\'s screen.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'prompt': {
-                    'type': 'string',
-                    'description': 'A prompt to guide the vision model in analyzing the screenshot.'
-                },
-            },
-            'required': ['prompt']
-        }
-    }
-}
-
-webcam_capture_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'webcamCapture',
-        'description': 'Capture an image from the webcam and analyze the contents.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'prompt': {
-                    'type': 'string',
-                    'description': 'A prompt to guide the vision model in analyzing the webcam image.'
-                },
-            },
-            'required': ['prompt']
-        }
-    }
-}
-
-create_file_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'create_file',
-        'description': 'Create a file with the given content.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'file_path': {
-                    'type': 'string',
-                    'description': 'The path to the file to create, of the form "directory/filename.extension".'
-                },
-                'content': {
-                    'type': 'string',
-                    'description': 'The content to write to the file.'
-                },
-            },
-            'required': ['file_path', 'content']
-        }
-    }
-}
-
-read_file_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'read_file',
-        'description': 'Read the contents of a file.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'file_path': {
-                    'type': 'string',
-                    'description': 'The path to the file to read, of the form "directory/filename.extension".'
-                },
-            },
-            'required': ['file_path']
-        }
-    }
-}
-
-clear_file_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'clear_file',
-        'description': 'Clear the contents of a file.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'file_path': {
-                    'type': 'string',
-                    'description': 'The path to the file to clear, of the form "directory/filename.extension".'
-                },
-            },
-            'required': ['file_path']
-        }
-    }
-}
-
-edit_file_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'edit_file',
-        'description': 'Edit a file by replacing the original content with the new content.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'file_path': {
-                    'type': 'string',
-                    'description': 'The path to the file to edit, of the form "directory/filename.extension".'
-                },
-                'original_content': {
-                    'type': 'string',
-                    'description': 'The exact original content to replace in the file.'
-                },
-                'new_content': {
-                    'type': 'string',
-                    'description': 'The new content to write to the file.'
-                },
-            },
-        }
-    }
-}
-
-discuss_file_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'discuss_file',
-        'description': 'Discuss the contents of a file based on a query.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'file_path': {
-                    'type': 'string',
-                    'description': 'The path to the file to discuss.'
-                },
-                'query': {
-                    'type': 'string',
-                    'description': 'The query to discuss.'
-                },
-            },
-            'required': ['file_path', 'query']
-        }
-    }
-}
-
-list_files_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'list_files',
-        'description': 'List the files in a directory.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'directory': {
-                    'type': 'string',
-                    'description': 'The directory to list the files in, leave empty for the current directory.'
-                },
-            },
-        }
-    }
-}
-
-code_agent_tool = {
-    'type': 'function',
-    'function': {
-        'name': 'codeAgent',
-        'description': 'Generate code for a given user prompt.', 
-        'parameters': {
-            'type': 'object',
-            'properties': {
-                'prompt': {
-                    'type': 'string',
-                    'description': 'The prompt stating the detailed user\'s requirements of what they want the code for.'
-                },
-            },
-            'required': ['prompt']
-        }
-    }
-}
-
-
-# list of tools
-tools_list = [
-    check_internet_connectivity_tool, 
-    deep_search_tool, 
-    search_youtube_tool, 
-    search_spotify_tool, 
-    check_screen_contents, 
-    webcam_capture_tool, 
-    code_agent_tool, 
-    open_browser_tool, 
-    get_current_weather_tool, 
-    get_clipboard_text_tool, 
-    get_current_date_time_tool, 
-    create_file_tool, 
-    read_file_tool, 
-    clear_file_tool, 
-    edit_file_tool, 
-    discuss_file_tool, 
-    list_files_tool, 
-    ]
-
-# List of tools by category
-# fs tools
-filesystem_tools = [
-    create_file_tool, 
-    read_file_tool, 
-    clear_file_tool, 
-    edit_file_tool, 
-    discuss_file_tool, 
-    list_files_tool,
-]
-
-# internet tools
-internet_tools = [
-    deep_search_tool, 
-    check_internet_connectivity_tool, 
-    get_current_weather_tool, 
-    open_browser_tool, 
-    search_youtube_tool, 
-    search_spotify_tool, 
-]
-
-# vision tools
-vision_tools = [
-    check_screen_contents,
-    webcam_capture_tool,
-]
-
 # Dictionary of tools
 tools_dict = {
     'checkInternetConnectivity': checkInternetConnectivity,
@@ -1076,8 +822,30 @@ tools_dict = {
     'edit_file': edit_file,
     'discuss_file': discuss_file,
     'list_files': list_files,
+    'fetchToolOutput': fetchToolOutput,
 }
 
+# Tools with a native async implementation, the rest run in worker threads when called from an event loop
+async_tools_dict = {
+    'deepSearch': deepSearchAsync,
+}
+
+# Call a tool from an event loop
+async def callToolAsync(name: str, **arguments):
+    """
+    Call a tool without blocking the event loop.
+
+    Args:
+        name (str): The name of the tool.
+        **arguments: The arguments for the tool.
+
+    Returns:
+        The output of the tool.
+    """
+    if function := async_tools_dict.get(name):
+        return await function(**arguments)
+    return await asyncio.to_thread(tools_dict[name], **arguments)
+
 if __name__ == "__main__":
     # Example usage
     while True:
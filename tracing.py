@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+import contextvars
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from config import *
+
+# Trace of the turn being handled, threads without it fall back to the latest started trace
+_current: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """
+    The spans of one conversation turn, from the wake word to the first audio played.
+    Points in time, e.g. the wake word, are spans without a duration.
+    """
+
+    def __init__(self, **attributes):
+        self.id = uuid.uuid4().hex[:12]
+        self.started = datetime.datetime.now()
+        self.attributes = attributes
+        self.spans: list[dict] = []
+        self.written = False
+        self.audio_started = False
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float, **attributes):
+        with self._lock:
+            self.spans.append({"name": name, "start": start, "end": end, **({"attributes": attributes} if attributes else {})})
+
+    def record(self) -> dict:
+        """
+        Get the trace as a JSON record, with span times in milliseconds from the first span.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        origin = spans[0]["start"] if spans else 0.0
+        return {
+            "turn_id": self.id,
+            "time": self.started.isoformat(timespec="seconds"),
+            **({"attributes": self.attributes} if self.attributes else {}),
+            "total_ms": round((max(span["end"] for span in spans) - origin) * 1000, 1) if spans else 0.0,
+            "spans": [
+                {
+                    "name": span["name"],
+                    "start_ms": round((span["start"] - origin) * 1000, 1),
+                    "duration_ms": round((span["end"] - span["start"]) * 1000, 1),
+                    **({"attributes": span["attributes"]} if "attributes" in span else {}),
+                }
+                for span in spans
+            ],
+        }
+
+
+class Tracer:
+    """
+    Collects the spans of every turn and writes each finished turn to a rotating JSONL file.
+    Spans recorded while no turn is traced are dropped. A spoken turn is kept open until its
+    audio starts, or until the next wake word if it never plays.
+    """
+
+    def __init__(self, path: str = TRACE_PATH, enabled: bool = TRACING):
+        self.enabled = enabled
+        self.path = Path(path)
+        self._latest: Trace | None = None
+        self._pending: Trace | None = None
+        self._logger: logging.Logger | None = None
+        self._lock = threading.Lock()
+
+    def _get_logger(self) -> logging.Logger:
+        if self._logger is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            logger = logging.getLogger(f"tracing.{self.path}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(self.path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def current(self) -> Trace | None:
+        return _current.get() or self._latest
+
+    def start_turn(self, **attributes) -> Trace | None:
+        """
+        Start tracing a new turn, the previous turn is finished and written unless it waits for its audio.
+        """
+        if not self.enabled:
+            return None
+        self.end_turn()
+        trace = Trace(**attributes)
+        _current.set(trace)
+        self._latest = trace
+        return trace
+
+    def end_turn(self, trace: Trace | None = None):
+        """
+        Write a turn to the trace file, the current turn by default. A turn is only written once.
+        """
+        trace = trace or self.current()
+        if trace is None:
+            return
+        with self._lock:
+            if self._latest is trace:
+                self._latest = None
+            if self._pending is trace:
+                self._pending = None
+        if _current.get() is trace:
+            _current.set(None)
+        with trace._lock:
+            if trace.written:
+                return
+            trace.written = True
+        if trace.spans:
+            try:
+                self._get_logger().info(json.dumps(trace.record()))
+            except OSError as e:
+                print(f"Error writing trace: {e}")
+
+    def await_audio(self) -> Trace | None:
+        """
+        Detach the current turn once it is handled, so the next turn does not write it.
+        It is written right away if its audio already started, otherwise by audio_started,
+        or by end_pending if its audio never starts.
+        """
+        trace = self.current()
+        if trace is None:
+            return None
+        self.end_pending()
+        with self._lock:
+            if self._latest is trace:
+                self._latest = None
+            started = trace.audio_started
+            self._pending = None if started else trace
+        if _current.get() is trace:
+            _current.set(None)
+        if started:
+            self.end_turn(trace)
+        return trace
+
+    def audio_started(self, trace: Trace):
+        """
+        Mark the first audio played for a turn, from the audio thread. A detached turn is written.
+        """
+        self.mark_once("audio_played", trace=trace)
+        with self._lock:
+            trace.audio_started = True
+            detached = self._pending is trace
+        if detached:
+            self.end_turn(trace)
+
+    def end_pending(self):
+        """
+        Write the turn still waiting for its audio, e.g. at the next wake word.
+        """
+        if trace := self._pending:
+            self.end_turn(trace)
+
+    def mark(self, name: str, trace: Trace | None = None, **attributes):
+        """
+        Record a point in time of a turn, the current turn by default.
+        """
+        if trace := trace or self.current():
+            now = time.perf_counter()
+            trace.add(name, now, now, **attributes)
+
+    def mark_once(self, name: str, trace: Trace | None = None, **attributes):
+        """
+        Record a point in time of a turn, the current turn by default, unless it was already recorded.
+        """
+        if (trace := trace or self.current()) and not any(span["name"] == name for span in trace.spans):
+            self.mark(name, trace=trace, **attributes)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Record the duration of a block of code in the current turn.
+        """
+        trace = self.current()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if trace is not None:
+                trace.add(name, start, time.perf_counter(), **attributes)
+
+
+tracer = Tracer()
+
+
+## Report
+# Read the trace file and its backups
+def read_traces(path: str = TRACE_PATH) -> list[dict]:
+    path = Path(path)
+    files = [Path(f"{path}.{index}") for index in range(TRACE_BACKUPS, 0, -1)] + [path]
+    traces = []
+    for file in files:
+        if not file.exists():
+            continue
+        with open(file, mode="r", encoding="utf-8") as lines:
+            traces += [json.loads(line) for line in lines if line.strip()]
+    return traces
+
+def percentile(values: list[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+# Print the latency waterfall of a turn
+def print_waterfall(trace: dict, width: int = 60):
+    total = trace["total_ms"] or 1.0
+    print(f"Turn {trace['turn_id']} at {trace['time']}, {trace['total_ms']:.0f}ms")
+    for span in trace["spans"]:
+        offset = int(span["start_ms"] / total * width)
+        length = max(1, int(span["duration_ms"] / total * width))
+        bar = "|" if span["duration_ms"] == 0 else "█" * length
+        print(f"  {span['name'][:24]:<24} {' ' * offset}{bar:<{width - offset + 1}} {span['start_ms']:8.0f}ms +{span['duration_ms']:.0f}ms")
+    print()
+
+# Print the latency percentiles of every span
+def print_percentiles(traces: list[dict]):
+    starts: dict[str, list[float]] = {}
+    durations: dict[str, list[float]] = {}
+    for trace in traces:
+        for span in trace["spans"]:
+            starts.setdefault(span["name"], []).append(span["start_ms"])
+            durations.setdefault(span["name"], []).append(span["duration_ms"])
+
+    print(f"{len(traces)} turns, total p50: {percentile([t['total_ms'] for t in traces], 50):.0f}ms  p95: {percentile([t['total_ms'] for t in traces], 95):.0f}ms")
+    print(f"{'span':<24} {'count':>6} {'at p50':>9} {'at p95':>9} {'took p50':>9} {'took p95':>9}")
+    for name in sorted(starts, key=lambda name: percentile(starts[name], 50)):
+        print(
+            f"{name[:24]:<24} {len(starts[name]):>6} "
+            f"{percentile(starts[name], 50):>7.0f}ms {percentile(starts[name], 95):>7.0f}ms "
+            f"{percentile(durations[name], 50):>7.0f}ms {percentile(durations[name], 95):>7.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the latency of the traced turns.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="Print latency waterfalls and percentiles.")
+    report.add_argument("--path", default=TRACE_PATH, help="The trace file.")
+    report.add_argument("--last", type=int, default=5, help="Number of latest turns to draw waterfalls for.")
+    args = parser.parse_args()
+
+    traces = read_traces(args.path)
+    if not traces:
+        print(f"No traces found at {args.path}")
+    else:
+        for trace in traces[-args.last:] if args.last else []:
+            print_waterfall(trace)
+        print_percentiles(traces)
@@ -2,6 +2,7 @@ from openai import OpenAI
 import pyaudio
 import threading
 import io
+import queue
 import time
 
 class tts():
@@ -12,6 +13,8 @@ class tts():
             response_format: str = "pcm",
             base_url: str = "http://localhost:8880/v1",
             api_key: str = "not-needed",
+            on_first_byte=None,
+            on_audio_start=None,
         ):
 
         self.voice = voice
@@ -19,6 +22,9 @@ class tts():
         self.base_url = base_url
         self.response_format = response_format
         self.speed = speed
+        # Callbacks for the first audio received from the server, and the first audio played
+        self.on_first_byte = on_first_byte
+        self.on_audio_start = on_audio_start
         self.client = OpenAI(
             api_key=self.api_key,
             base_url=self.base_url,
@@ -39,8 +45,9 @@ class tts():
         self.playback_thread = None
         self.current_position = 0
     
-    def start(self, text: str):
-        """Start tts playback of the given text"""
+    def start(self, text, on_first_byte=None, on_audio_start=None):
+        """Start tts playback of the given text, or of the sentences of an iterable as they arrive.
+        The callbacks default to the ones of the speaker"""
         # Stop any existing playback
         self.stop()
         
@@ -52,13 +59,17 @@ class tts():
         self.current_position = 0
         
         # Start playback in a new thread
-        self.playback_thread = threading.Thread(target=self._playback_thread, args=(text,))
+        texts = [text] if isinstance(text, str) else text
+        self.playback_thread = threading.Thread(
+            target=self._playback_thread,
+            args=(texts, on_first_byte or self.on_first_byte, on_audio_start or self.on_audio_start),
+        )
         self.playback_thread.daemon = True
         self.playback_thread.start()
     
-    def _playback_thread(self, text: str):
-        """Worker thread to handle audio streaming and buffering"""
-        # First, get the complete audio stream and store it
+    def _synthesize(self, text: str, on_first_byte=None):
+        """Get the complete audio of a text, None if playback was stopped"""
+        audio_buffer = io.BytesIO()
         with self.client.audio.speech.with_streaming_response.create(
             model="kokoro",
             voice=self.voice,
@@ -68,24 +79,60 @@ class tts():
         ) as response:
             for chunk in response.iter_bytes(chunk_size=1024):
                 if self.stop_requested:
-                    return
-                self.audio_buffer.write(chunk)
-        
-        # Reset buffer position for playback
-        self.audio_buffer.seek(0)
-        audio_data = self.audio_buffer.getvalue()
+                    return None
+                if on_first_byte and audio_buffer.tell() == 0:
+                    on_first_byte()
+                audio_buffer.write(chunk)
+        return audio_buffer.getvalue()
+    
+    def _synthesis_thread(self, texts, audio: queue.Queue, on_first_byte=None):
+        """Worker thread synthesizing the texts in order, so the next one is ready when the current one is played"""
+        try:
+            for text in texts:
+                if self.stop_requested:
+                    break
+                if not text.strip():
+                    continue
+                data = self._synthesize(text, on_first_byte)
+                # The first byte is only reported for the first text
+                on_first_byte = None
+                if data is None:
+                    break
+                audio.put(data)
+        except Exception as e:
+            print(f"Error in tts: {e}")
+        finally:
+            audio.put(None)
+    
+    def _playback_thread(self, texts, on_first_byte=None, on_audio_start=None):
+        """Worker thread to handle audio streaming and buffering"""
+        audio = queue.Queue()
+        threading.Thread(target=self._synthesis_thread, args=(texts, audio, on_first_byte), daemon=True).start()
         buffer_size = 1024
         
-        # Play the audio
-        while self.current_position < len(audio_data) and not self.stop_requested:
-            if not self.is_paused:
-                end_pos = min(self.current_position + buffer_size, len(audio_data))
-                chunk = audio_data[self.current_position:end_pos]
-                self.player.write(chunk)
-                self.current_position = end_pos
-            else:
-                # When paused, sleep briefly to avoid CPU hogging
-                time.sleep(0.1)
+        while not self.stop_requested:
+            try:
+                audio_data = audio.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if audio_data is None:
+                break
+            self.audio_buffer = io.BytesIO(audio_data)
+            self.current_position = 0
+            
+            # Play the audio
+            while self.current_position < len(audio_data) and not self.stop_requested:
+                if not self.is_paused:
+                    end_pos = min(self.current_position + buffer_size, len(audio_data))
+                    chunk = audio_data[self.current_position:end_pos]
+                    self.player.write(chunk)
+                    if on_audio_start and self.current_position == 0:
+                        on_audio_start()
+                        on_audio_start = None
+                    self.current_position = end_pos
+                else:
+                    # When paused, sleep briefly to avoid CPU hogging
+                    time.sleep(0.1)
         
         # Mark as not playing when done
         if not self.stop_requested:
@@ -115,9 +162,9 @@ class tts():
         if self.is_playing and self.is_paused:
             self.is_paused = False
 
-    def speak(self, text: str):
-        """Speak the given text"""
-        self.start(text)
+    def speak(self, text, on_first_byte=None, on_audio_start=None):
+        """Speak the given text, or the sentences of an iterable as they arrive"""
+        self.start(text, on_first_byte=on_first_byte, on_audio_start=on_audio_start)
 
     def shutdown(self):
         """Shutdown the tts system"""
@@ -1,3 +1,18 @@
+import datetime
+
+
+# Check current time
+def getCurrentDateTime():
+    """
+    Get the current time in a human-readable format.
+
+    Returns:
+        str: The current time as a string.
+    """
+
+    now = datetime.datetime.now()
+    return now.strftime("%I:%M %p, %d %B %Y")
+
 def HumanMessage(content: str) -> dict:
     """Creates a human message dictionary for the chat model."""
     return {